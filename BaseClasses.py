@@ -8,10 +8,10 @@ import secrets
 import warnings
 from argparse import Namespace
 from collections import Counter, deque, defaultdict
-from collections.abc import Collection, MutableSequence
+from collections.abc import Collection, KeysView, MutableSequence
 from enum import IntEnum, IntFlag
-from typing import (AbstractSet, Any, Callable, ClassVar, Dict, Iterable, Iterator, List, Literal, Mapping, NamedTuple,
-                    Optional, Protocol, Set, Tuple, Union, TYPE_CHECKING, Literal, overload)
+from typing import (AbstractSet, Any, Callable, ClassVar, Dict, FrozenSet, Iterable, Iterator, List, Literal, Mapping,
+                    NamedTuple, Optional, Protocol, Set, Tuple, Union, TYPE_CHECKING, Literal, overload)
 import dataclasses
 
 from typing_extensions import NotRequired, TypedDict
@@ -718,11 +718,232 @@ class MultiWorld():
 PathValue = Tuple[str, Optional["PathValue"]]
 
 
+class PlayerLayers(dict):
+    """
+    Maps players to their part of a CollectionState, like their prog_items or reachable regions.
+
+    Copying a CollectionState shares the per-player values between both states instead of copying them, so each state
+    only copies the values of those players it actually accesses afterwards. A player's value is copied when it is first
+    looked up, since callers can mutate it after a lookup.
+    """
+    __slots__ = ("shared",)
+    shared: Dict[int, Any]
+    """values that are shared with other states and may not be mutated"""
+
+    def __init__(self, shared: Dict[int, Any]) -> None:
+        super().__init__()
+        self.shared = shared
+
+    def share(self) -> Dict[int, Any]:
+        """Marks all current values as shared and returns them. Accessing a player afterwards copies their value."""
+        if dict.__len__(self):
+            shared = self.shared.copy()
+            shared.update(dict.items(self))
+            dict.clear(self)
+            self.shared = shared
+        return self.shared
+
+    def _materialize_all(self) -> None:
+        if self.shared:
+            values = {player: self[player] for player in self.shared}
+            values.update(dict.items(self))
+            dict.clear(self)
+            dict.update(self, values)
+            self.shared = {}
+
+    def _peek(self, player: int) -> Any:
+        """Returns the value of a player without copying it, so it must not be mutated."""
+        return dict.__getitem__(self, player) if dict.__contains__(self, player) else self.shared[player]
+
+    def _players(self) -> List[int]:
+        # in the order they would have after materializing
+        return [*self.shared, *(player for player in dict.keys(self) if player not in self.shared)]
+
+    def __missing__(self, player: int) -> Any:
+        value = self.shared[player].copy()
+        self[player] = value
+        return value
+
+    def __contains__(self, player: object) -> bool:
+        return dict.__contains__(self, player) or player in self.shared
+
+    def get(self, player: int, default: Any = None) -> Any:
+        return self[player] if player in self else default
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._players())
+
+    def __len__(self) -> int:
+        return len(self.shared.keys() | dict.keys(self))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        if len(self) != len(other):
+            return False
+        if isinstance(other, PlayerLayers):
+            return all(player in other and self._peek(player) == other._peek(player) for player in self._players())
+        return all(player in other and self._peek(player) == other[player] for player in self._players())
+
+    def __ne__(self, other: object) -> bool:
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return repr({player: self._peek(player) for player in self._players()})
+
+    def keys(self) -> KeysView[int]:
+        return KeysView(self)
+
+    # values and items can be mutated by the caller, so they copy the values of all players
+
+    def values(self):
+        self._materialize_all()
+        return super().values()
+
+    def items(self):
+        self._materialize_all()
+        return super().items()
+
+    def copy(self) -> Dict[int, Any]:
+        self._materialize_all()
+        return dict(super().items())
+
+
+class _TrackedCounter(Counter):
+    """
+    A player's prog_items for worlds using incremental reachability, recording the item names written since the last
+    update of reachable regions, so only the blocked entrances depending on those have to be checked again.
+    """
+    changed: Set[str]
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.changed = set()
+        super().__init__(*args, **kwargs)
+
+    def __setitem__(self, item: str, count: int) -> None:
+        self.changed.add(item)
+        super().__setitem__(item, count)
+
+    def __delitem__(self, item: str) -> None:
+        self.changed.add(item)
+        super().__delitem__(item)
+
+    def clear(self) -> None:
+        self.changed.update(self)
+        super().clear()
+
+    # the methods below may write without going through __setitem__ and __delitem__
+
+    def update(self, iterable: Any = None, /, **kwargs: int) -> None:
+        if iterable is not None and not isinstance(iterable, Mapping):
+            iterable = tuple(iterable)
+        if iterable is not None:
+            self.changed.update(iterable)
+        self.changed.update(kwargs)
+        super().update(iterable, **kwargs)
+
+    def subtract(self, iterable: Any = None, /, **kwargs: int) -> None:
+        if iterable is not None and not isinstance(iterable, Mapping):
+            iterable = tuple(iterable)
+        if iterable is not None:
+            self.changed.update(iterable)
+        self.changed.update(kwargs)
+        super().subtract(iterable, **kwargs)
+
+    def setdefault(self, item: str, default: int = 0) -> int:
+        if item not in self:
+            self.changed.add(item)
+        return super().setdefault(item, default)
+
+    def pop(self, item: str, *default: Any) -> Any:
+        if item in self:
+            self.changed.add(item)
+        return super().pop(item, *default)
+
+    def popitem(self) -> Tuple[str, int]:
+        item, count = super().popitem()
+        self.changed.add(item)
+        return item, count
+
+    def copy(self) -> _TrackedCounter:
+        copy = _TrackedCounter()
+        dict.update(copy, self)
+        copy.changed = self.changed.copy()
+        return copy
+
+
+class _ItemLookupRecorder:
+    """
+    Stand-in for a player's prog_items while their blocked entrances are evaluated, recording which item names the
+    access rules look up. Lookups and writes go to the player's actual prog_items. Rules that iterate over the items
+    or use them in other ways instead of looking them up by name are flagged as opaque, as their dependencies can't be
+    known.
+    """
+    __slots__ = ("prog_items", "lookups", "opaque")
+    prog_items: Counter[str]
+    lookups: Set[str]
+    opaque: bool
+
+    def __init__(self, prog_items: Counter[str]) -> None:
+        self.prog_items = prog_items
+        self.reset()
+
+    def reset(self) -> None:
+        self.lookups = set()
+        self.opaque = False
+
+    def __getitem__(self, item: str) -> int:
+        self.lookups.add(item)
+        return self.prog_items[item]
+
+    def get(self, item: str, default: Any = None) -> Any:
+        self.lookups.add(item)
+        return self.prog_items.get(item, default)
+
+    def __contains__(self, item: object) -> bool:
+        self.lookups.add(item)  # type: ignore[arg-type]
+        return item in self.prog_items
+
+    def __setitem__(self, item: str, count: int) -> None:
+        self.prog_items[item] = count
+
+    def __delitem__(self, item: str) -> None:
+        del self.prog_items[item]
+
+    def __iter__(self) -> Iterator[str]:
+        self.opaque = True
+        return iter(self.prog_items)
+
+    def __len__(self) -> int:
+        self.opaque = True
+        return len(self.prog_items)
+
+    def __eq__(self, other: object) -> bool:
+        self.opaque = True
+        return self.prog_items == other
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __getattr__(self, name: str) -> Any:
+        # any other Counter method, like items() or total()
+        self.opaque = True
+        return getattr(self.prog_items, name)
+
+
 class CollectionState():
     prog_items: Dict[int, Counter[str]]
     multiworld: MultiWorld
     reachable_regions: Dict[int, Set[Region]]
     blocked_connections: Dict[int, Set[Entrance]]
+    entrance_dependencies: Dict[int, Dict[Entrance, FrozenSet[str]]]
+    """For worlds using incremental reachability: the item names each blocked entrance's rule looked up when it last
+    failed. A blocked entrance only has to be checked again once the count of one of those items changed."""
+    reachability_checkpoints: Dict[int, int]
+    """For worlds using incremental reachability: the number of reachable regions at the end of the last update of
+    reachable regions. prog_items records the item names changed since then."""
     advancements: Set[Location]
     path: Dict[Union[Region, Entrance], PathValue]
     locations_checked: Set[Location]
@@ -730,13 +951,19 @@ class CollectionState():
     allow_partial_entrances: bool
     additional_init_functions: List[Callable[[CollectionState, MultiWorld], None]] = []
     additional_copy_functions: List[Callable[[CollectionState, CollectionState], CollectionState]] = []
+    player_layered_attributes: ClassVar[Tuple[str, ...]] = (
+        "prog_items", "reachable_regions", "blocked_connections", "entrance_dependencies"
+    )
+    """per-player attributes that are stored as PlayerLayers, so that copies only copy the players they access"""
 
     def __init__(self, parent: MultiWorld, allow_partial_entrances: bool = False):
         assert parent.worlds, "CollectionState created without worlds initialized in parent"
-        self.prog_items = {player: Counter() for player in parent.get_all_ids()}
+        self.prog_items = PlayerLayers({player: Counter() for player in parent.get_all_ids()})
         self.multiworld = parent
-        self.reachable_regions = {player: set() for player in parent.get_all_ids()}
-        self.blocked_connections = {player: set() for player in parent.get_all_ids()}
+        self.reachable_regions = PlayerLayers({player: set() for player in parent.get_all_ids()})
+        self.blocked_connections = PlayerLayers({player: set() for player in parent.get_all_ids()})
+        self.entrance_dependencies = PlayerLayers({player: {} for player in parent.get_all_ids()})
+        self.reachability_checkpoints = {}
         self.advancements = set()
         self.path = {}
         self.locations_checked = set()
@@ -752,20 +979,53 @@ class CollectionState():
         self.stale[player] = False
         world: AutoWorld.World = self.multiworld.worlds[player]
         reachable_regions = self.reachable_regions[player]
-        queue = deque(self.blocked_connections[player])
         start: Region = world.get_region(world.origin_region_name)
+        incremental = world.incremental_reachability and world.explicit_indirect_conditions
+
+        if incremental and not isinstance(self.prog_items[player], _TrackedCounter):
+            # incremental reachability was enabled after this state was created
+            self.prog_items[player] = _TrackedCounter(self.prog_items[player])
+            self.reachability_checkpoints.pop(player, None)
 
         # init on first call - this can't be done on construction since the regions don't exist yet
         if start not in reachable_regions:
+            queue = deque(self.blocked_connections[player])
             reachable_regions.add(start)
             self.blocked_connections[player].update(start.exits)
             queue.extend(start.exits)
+            self.entrance_dependencies[player] = {}
+        elif incremental:
+            queue = self._get_invalidated_connections(player)
+        else:
+            queue = deque(self.blocked_connections[player])
 
-        if world.explicit_indirect_conditions:
+        if incremental:
+            self._update_reachable_regions_incremental(player, queue)
+        elif world.explicit_indirect_conditions:
             self._update_reachable_regions_explicit_indirect_conditions(player, queue)
         else:
             self._update_reachable_regions_auto_indirect_conditions(player, queue)
 
+    def _get_invalidated_connections(self, player: int) -> deque:
+        """Returns the blocked connections of `player` whose access rules may have changed since the last update."""
+        blocked_connections = self.blocked_connections[player]
+        checkpoint_region_count = self.reachability_checkpoints.get(player, None)
+        if checkpoint_region_count is None:
+            return deque(blocked_connections)
+        if checkpoint_region_count != len(self.reachable_regions[player]):
+            # regions were made reachable from outside, e.g. by entrance randomization, so any indirect condition may
+            # have changed
+            return deque(blocked_connections)
+
+        changed_items = self.prog_items[player].changed
+        dependencies = self.entrance_dependencies[player]
+        queue = deque()
+        for connection in blocked_connections:
+            connection_dependencies = dependencies.get(connection, None)
+            if connection_dependencies is None or not connection_dependencies.isdisjoint(changed_items):
+                queue.append(connection)
+        return queue
+
     def _update_reachable_regions_explicit_indirect_conditions(self, player: int, queue: deque):
         reachable_regions = self.reachable_regions[player]
         blocked_connections = self.blocked_connections[player]
@@ -790,6 +1050,49 @@ class CollectionState():
                     if new_entrance in blocked_connections and new_entrance not in queue:
                         queue.append(new_entrance)
 
+    def _update_reachable_regions_incremental(self, player: int, queue: deque):
+        reachable_regions = self.reachable_regions[player]
+        blocked_connections = self.blocked_connections[player]
+        dependencies = self.entrance_dependencies[player]
+        player_prog_items: _TrackedCounter = self.prog_items[player]
+        # the queue holds all entrances depending on the changes so far, changes during the update are kept for the next
+        player_prog_items.changed = set()
+        recorder = _ItemLookupRecorder(player_prog_items)
+        self.prog_items[player] = recorder  # type: ignore[assignment]
+        try:
+            # run BFS on the given connections, and keep track of those blocked by missing items,
+            # as well as which items they were missing
+            while queue:
+                connection = queue.popleft()
+                new_region = connection.connected_region
+                if new_region in reachable_regions:
+                    blocked_connections.remove(connection)
+                    dependencies.pop(connection, None)
+                    continue
+                recorder.reset()
+                if connection.can_reach(self):
+                    dependencies.pop(connection, None)
+                    if self.allow_partial_entrances and not new_region:
+                        continue
+                    assert new_region, f"tried to search through an Entrance \"{connection}\" with no connected Region"
+                    reachable_regions.add(new_region)
+                    blocked_connections.remove(connection)
+                    blocked_connections.update(new_region.exits)
+                    queue.extend(new_region.exits)
+                    self.path[new_region] = (new_region.name, self.path.get(connection, None))
+
+                    # Retry connections if the new region can unblock them
+                    for new_entrance in self.multiworld.indirect_connections.get(new_region, set()):
+                        if new_entrance in blocked_connections and new_entrance not in queue:
+                            queue.append(new_entrance)
+                elif recorder.opaque:
+                    dependencies.pop(connection, None)
+                else:
+                    dependencies[connection] = frozenset(recorder.lookups)
+        finally:
+            self.prog_items[player] = player_prog_items
+        self.reachability_checkpoints[player] = len(reachable_regions)
+
     def _update_reachable_regions_auto_indirect_conditions(self, player: int, queue: deque):
         reachable_regions = self.reachable_regions[player]
         blocked_connections = self.blocked_connections[player]
@@ -817,11 +1120,14 @@ class CollectionState():
 
     def copy(self) -> CollectionState:
         ret = CollectionState(self.multiworld)
-        ret.prog_items = {player: counter.copy() for player, counter in self.prog_items.items()}
-        ret.reachable_regions = {player: region_set.copy() for player, region_set in
-                                 self.reachable_regions.items()}
-        ret.blocked_connections = {player: entrance_set.copy() for player, entrance_set in
-                                   self.blocked_connections.items()}
+        for attribute in self.player_layered_attributes:
+            layers = getattr(self, attribute)
+            if not isinstance(layers, PlayerLayers):
+                # replaced from outside, so wrap it to not mutate the values shared with the copy
+                layers = PlayerLayers(dict(layers))
+                setattr(self, attribute, layers)
+            setattr(ret, attribute, PlayerLayers(layers.share()))
+        ret.reachability_checkpoints = self.reachability_checkpoints.copy()
         ret.advancements = self.advancements.copy()
         ret.path = self.path.copy()
         ret.locations_checked = self.locations_checked.copy()
@@ -1094,19 +1400,20 @@ class CollectionState():
     def count_group(self, item_name_group: str, player: int) -> int:
         """Returns the cumulative count of items from an item group present in state."""
         player_prog_items = self.prog_items[player]
-        return sum(
-            player_prog_items[item_name]
-            for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]
-        )
+        total = 0
+        for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]:
+            total += player_prog_items[item_name]
+        return total
 
     def count_group_unique(self, item_name_group: str, player: int) -> int:
         """Returns the cumulative count of items from an item group present in state.
         Ignores duplicates of the same item."""
         player_prog_items = self.prog_items[player]
-        return sum(
-            player_prog_items[item_name] > 0
-            for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]
-        )
+        total = 0
+        for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]:
+            if player_prog_items[item_name] > 0:
+                total += 1
+        return total
 
     # Item related
     def collect(self, item: Item, prevent_sweep: bool = False, location: Optional[Location] = None) -> bool:
@@ -1139,6 +1446,8 @@ class CollectionState():
             # invalidate caches, nothing can be trusted anymore now
             self.reachable_regions[item.player] = set()
             self.blocked_connections[item.player] = set()
+            self.entrance_dependencies[item.player] = {}
+            self.reachability_checkpoints.pop(item.player, None)
             self.stale[item.player] = True
 
     def remove_item(self, item: str, player: int, count: int = 1) -> None:
@@ -33,6 +33,41 @@ def sweep_from_pool(base_state: CollectionState, itempool: typing.Sequence[Item]
     return new_state
 
 
+class LocationReachabilityCache:
+    """
+    Caches which locations are reachable in a state that doesn't change, so that placing several items against the same
+    state only evaluates each location's access rule once.
+    """
+    state: CollectionState
+    reachable: typing.Dict[Location, bool]
+
+    def __init__(self, state: CollectionState) -> None:
+        self.state = state
+        self.reachable = {}
+
+    def can_fill(self, location: Location, item: Item, check_access: bool = True) -> bool:
+        """Same as `location.can_fill(self.state, item, check_access)`."""
+        state = self.state
+        if not check_access or type(location).can_fill is not Location.can_fill:
+            # overridden can_fill may change reachability depending on the item, so it can't be cached
+            return location.can_fill(state, item, check_access)
+        if not location.can_fill(state, item, False):
+            return False
+        reachable = self.reachable.get(location, None)
+        if reachable is None:
+            reachable = self.reachable[location] = location.can_reach(state)
+        if reachable:
+            return True
+        # unreachable locations can only be filled through always_allow, same as in Location.can_fill
+        return (location.always_allow(state, item)
+                and item.name not in state.multiworld.worlds[item.player].options.non_local_items)
+
+
+def _get_sweep_horizon(reachable_items: typing.Dict[int, typing.Deque[Item]]) -> int:
+    """Number of fill_restrictive iterations a sweep checkpoint is used for: until half the longest deque is placed."""
+    return (max(len(items) for items in reachable_items.values()) + 1) // 2
+
+
 def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locations: typing.List[Location],
                      item_pool: typing.List[Item], single_player_placement: bool = False, lock: bool = False,
                      swap: bool = True, on_place: typing.Optional[typing.Callable[[Location], None]] = None,
@@ -63,6 +98,13 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
     total = min(len(item_pool), len(locations))
     placed = 0
 
+    # Items are placed from the end of each deque in `reachable_items`, so the items at the start of the deques stay in
+    # the pool for a while. A state that has swept with only those items collected is kept as a checkpoint to sweep
+    # from, so that each iteration does not have to collect the whole pool and sweep from `base_state` again.
+    sweep_checkpoint: typing.Optional[CollectionState] = None
+    sweep_checkpoint_items: typing.Set[int] = set()
+    sweep_checkpoint_uses = 0
+
     while any(reachable_items.values()) and locations:
         if one_item_per_player:
             # grab one item per player
@@ -82,11 +124,33 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
                     del item_pool[-p]
                     break
 
-        maximum_exploration_state = sweep_from_pool(
-            base_state, item_pool + unplaced_items, multiworld.get_filled_locations(item.player)
-            if single_player_placement else None)
+        if not sweep_checkpoint_uses:
+            # the next `horizon` iterations take at most `horizon` more items from the end of each deque
+            horizon = _get_sweep_horizon(reachable_items)
+            checkpoint_items = [checkpoint_item for items in reachable_items.values()
+                                for checkpoint_item in itertools.islice(items, max(0, len(items) - horizon))]
+            sweep_checkpoint_items = {id(checkpoint_item) for checkpoint_item in checkpoint_items}
+            sweep_checkpoint = None
+            if checkpoint_items:
+                sweep_checkpoint = sweep_from_pool(
+                    base_state, checkpoint_items,
+                    multiworld.get_filled_locations(item.player) if single_player_placement else None)
+            sweep_checkpoint_uses = horizon + 1
+        sweep_checkpoint_uses -= 1
+
+        if sweep_checkpoint:
+            maximum_exploration_state = sweep_from_pool(
+                sweep_checkpoint, [pool_item for pool_item in itertools.chain(item_pool, unplaced_items)
+                                   if id(pool_item) not in sweep_checkpoint_items],
+                multiworld.get_filled_locations(item.player) if single_player_placement else None)
+        else:
+            maximum_exploration_state = sweep_from_pool(
+                base_state, item_pool + unplaced_items, multiworld.get_filled_locations(item.player)
+                if single_player_placement else None)
 
         has_beaten_game = multiworld.has_beaten_game(maximum_exploration_state)
+        # one item per player is placed against the same state, so reachability of locations can be shared between them
+        reachability_cache = LocationReachabilityCache(maximum_exploration_state)
 
         while items_to_place:
             # if we have run out of locations to fill,break out of this loop
@@ -107,7 +171,7 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
 
             for i, location in enumerate(locations):
                 if (not single_player_placement or location.player == item_to_place.player) \
-                        and location.can_fill(maximum_exploration_state, item_to_place, perform_access_check):
+                        and reachability_cache.can_fill(location, item_to_place, perform_access_check):
                     # popping by index is faster than removing by content,
                     spot_to_fill = locations.pop(i)
                     # skipping a scan for the element
@@ -180,6 +244,8 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
                             reachable_items[placed_item.player].appendleft(
                                 placed_item)
                             item_pool.append(placed_item)
+                            # the checkpoint may have collected placed_item from its previous location
+                            sweep_checkpoint_uses = 0
 
                             # cleanup at the end to hopefully get better errors
                             cleanup_required = True
@@ -57,6 +57,9 @@ def mystery_argparse(argv: list[str] | None = None):
     parser.add_argument("--spoiler_only", action="store_true",
                         help="Skips generation assertion and multidata, outputting only a spoiler log. "
                              "Intended for debugging and testing purposes.")
+    parser.add_argument("--profile_report", default=None,
+                        help="Write a JSON report of the time and memory spent per stage, world and player, "
+                             "and of the slowest access rules, to this path. Slows down generation.")
     args = parser.parse_args(argv)
 
     if args.skip_output and args.spoiler_only:
@@ -1,8 +1,13 @@
 import collections
 from collections.abc import Mapping
 import concurrent.futures
+import contextlib
+import io
 import logging
+import multiprocessing
 import os
+import pickle
+import shutil
 import tempfile
 import time
 from typing import Any
@@ -15,6 +20,7 @@ from Fill import FillError, balance_multiworld_progression, distribute_items_res
     parse_planned_blocks, distribute_planned_blocks, resolve_early_locations_for_planned
 from NetUtils import convert_to_base_types
 from Options import StartInventoryPool
+from Profiler import CallTimings, GenerationProfile, add_calls, collect_calls, profile_stage
 from Utils import __version__, output_path, restricted_dumps, version_tuple
 from settings import get_settings
 from worlds import AutoWorld
@@ -22,8 +28,108 @@ from worlds.generic.Rules import exclusion_rules, locality_rules
 
 __all__ = ["main"]
 
+_worker_multiworld: MultiWorld | None = None
+"""The multiworld being generated, inherited by forked worker processes."""
+
+
+def _init_worker_process(multiworld: MultiWorld) -> None:
+    global _worker_multiworld
+    _worker_multiworld = multiworld
+
+
+class _WorldStatePickler(pickle.Pickler):
+    """Pickles the attributes of a world, referring to the multiworld and the worlds instead of copying them."""
+
+    def persistent_id(self, obj: Any) -> Any:
+        if obj is _worker_multiworld:
+            return "multiworld"
+        if isinstance(obj, AutoWorld.World):
+            return obj.player
+        return None
+
+
+class _WorldStateUnpickler(pickle.Unpickler):
+    multiworld: MultiWorld
+
+    def __init__(self, file: io.BytesIO, multiworld: MultiWorld) -> None:
+        super().__init__(file)
+        self.multiworld = multiworld
+
+    def persistent_load(self, pid: Any) -> Any:
+        if pid == "multiworld":
+            return self.multiworld
+        return self.multiworld.worlds[pid]
+
+
+def _generate_early_in_process(player: int) -> tuple[bytes, CallTimings | None]:
+    assert _worker_multiworld
+    with collect_calls() as calls:
+        AutoWorld.call_single(_worker_multiworld, "generate_early", player)
+    world_state = io.BytesIO()
+    _WorldStatePickler(world_state).dump(_worker_multiworld.worlds[player].__dict__)
+    return world_state.getvalue(), calls
+
+
+def _generate_early(multiworld: MultiWorld) -> None:
+    """Calls generate_early of all worlds, using forked worker processes for the worlds that support it."""
+    processes = get_settings().generator.generate_early_processes
+    process_players = [player for player in multiworld.player_ids
+                       if multiworld.worlds[player].generate_early_in_process] \
+        if processes and "fork" in multiprocessing.get_all_start_methods() else []
+    if not process_players:
+        AutoWorld.call_all(multiworld, "generate_early")
+        return
+
+    with profile_stage("generate_early"), concurrent.futures.ProcessPoolExecutor(
+            min(processes, len(process_players)), multiprocessing.get_context("fork"),
+            initializer=_init_worker_process, initargs=(multiworld,)) as pool:
+        # the workers are forked on submit, before the other worlds change anything
+        futures = {player: pool.submit(_generate_early_in_process, player) for player in process_players}
+        for player in multiworld.player_ids:
+            if player not in futures:
+                AutoWorld.call_single(multiworld, "generate_early", player)
+        for player, future in futures.items():
+            data, calls = future.result()
+            add_calls(calls)
+            world = multiworld.worlds[player]
+            world_state = _WorldStateUnpickler(io.BytesIO(data), multiworld).load()
+            # the multiworld keeps a reference to the random of each world, so only its state is taken over
+            world.random.setstate(world_state.pop("random").getstate())
+            world.__dict__.update(world_state)
+        AutoWorld.call_stage(multiworld, "generate_early")
+
+
+def _generate_output_in_process(player: int, output_directory: str) -> CallTimings | None:
+    assert _worker_multiworld
+    with collect_calls() as calls:
+        AutoWorld.call_single(_worker_multiworld, "generate_output", player, output_directory)
+    return calls
+
+
+def _move_to_archive(zf: zipfile.ZipFile, output_directory: str) -> None:
+    """Moves the files of output_directory into zf. Files that are already compressed are stored as they are."""
+    for file in os.scandir(output_directory):
+        if file.name.endswith(".archipelago") or zipfile.is_zipfile(file.path):
+            zf.write(file.path, arcname=file.name, compress_type=zipfile.ZIP_STORED)
+        else:
+            zf.write(file.path, arcname=file.name)
+    shutil.rmtree(output_directory)
+
 
 def main(args, seed=None, baked_server_options: dict[str, object] | None = None):
+    profile_report: str | None = getattr(args, "profile_report", None)
+    if not profile_report:
+        return _main(args, seed, baked_server_options)
+
+    profile = GenerationProfile()
+    with profile.enable():
+        multiworld = _main(args, seed, baked_server_options)
+    profile.write(profile_report, multiworld)
+    logging.info(f"Wrote profile report to {profile_report}")
+    return multiworld
+
+
+def _main(args, seed=None, baked_server_options: dict[str, object] | None = None):
     if not baked_server_options:
         baked_server_options = get_settings().server_options.as_dict()
     assert isinstance(baked_server_options, dict)
@@ -73,7 +179,7 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     if not args.skip_output and not args.spoiler_only:
         AutoWorld.call_stage(multiworld, "assert_generate")
 
-    AutoWorld.call_all(multiworld, "generate_early")
+    _generate_early(multiworld)
 
     logger.info('')
 
@@ -185,9 +291,10 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
         multiworld._all_state = None
 
     logger.info("Running Item Plando.")
-    resolve_early_locations_for_planned(multiworld)
-    distribute_planned_blocks(multiworld, [x for player in multiworld.plando_item_blocks
-                                           for x in multiworld.plando_item_blocks[player]])
+    with profile_stage("item_plando"):
+        resolve_early_locations_for_planned(multiworld)
+        distribute_planned_blocks(multiworld, [x for player in multiworld.plando_item_blocks
+                                               for x in multiworld.plando_item_blocks[player]])
 
     logger.info('Running Pre Main Fill.')
 
@@ -195,15 +302,17 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
 
     logger.info(f'Filling the multiworld with {len(multiworld.itempool)} items.')
 
-    if multiworld.algorithm == 'flood':
-        flood_items(multiworld)  # different algo, biased towards early game progress items
-    elif multiworld.algorithm == 'balanced':
-        distribute_items_restrictive(multiworld, get_settings().generator.panic_method)
+    with profile_stage("fill"):
+        if multiworld.algorithm == 'flood':
+            flood_items(multiworld)  # different algo, biased towards early game progress items
+        elif multiworld.algorithm == 'balanced':
+            distribute_items_restrictive(multiworld, get_settings().generator.panic_method)
 
     AutoWorld.call_all(multiworld, 'post_fill')
 
     if multiworld.players > 1 and not args.skip_prog_balancing:
-        balance_multiworld_progression(multiworld)
+        with profile_stage("progression_balancing"):
+            balance_multiworld_progression(multiworld)
     else:
         logger.info("Progression balancing skipped.")
 
@@ -220,7 +329,8 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     if args.spoiler_only:
         if args.spoiler > 1:
             logger.info('Calculating playthrough.')
-            multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
+            with profile_stage("playthrough"):
+                multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
 
         multiworld.spoiler.to_file(output_path('%s_Spoiler.txt' % outfilebase))
         logger.info('Done. Skipped multidata modification. Total time: %s', time.perf_counter() - start)
@@ -230,20 +340,42 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     with output as temp_dir:
         output_players = [player for player in multiworld.player_ids if AutoWorld.World.generate_output.__code__
                           is not multiworld.worlds[player].generate_output.__code__]
-        with concurrent.futures.ThreadPoolExecutor(len(output_players) + 2) as pool:
+        output_processes = get_settings().generator.output_processes
+        process_output_players = [player for player in output_players if multiworld.worlds[player].output_in_process] \
+            if output_processes and "fork" in multiprocessing.get_all_start_methods() else []
+        thread_output_players = [player for player in output_players if player not in process_output_players]
+        # CPU-bound output, like rom patching, runs in forked workers instead of threads to not be limited by the GIL
+        process_pool = concurrent.futures.ProcessPoolExecutor(
+            min(output_processes, len(process_output_players)), multiprocessing.get_context("fork"),
+            initializer=_init_worker_process, initargs=(multiworld,)) \
+            if process_output_players else contextlib.nullcontext()
+        # each output task writes into its own directory, so its files can be moved into the archive once it is done
+        output_directories: dict[concurrent.futures.Future[Any], str] = {}
+
+        def submit_output(executor: concurrent.futures.Executor, name: str, fn, *args) -> None:
+            output_directory = os.path.join(temp_dir, name)
+            os.mkdir(output_directory)
+            output_directories[executor.submit(fn, *args, output_directory)] = output_directory
+
+        with contextlib.ExitStack() as output_stage, process_pool, \
+                concurrent.futures.ThreadPoolExecutor(len(thread_output_players) + 2) as pool:
+            output_stage.enter_context(profile_stage("output"))
+            # submit to the process pool first, so the workers are forked before any output threads are started
+            for player in process_output_players:
+                submit_output(process_pool, str(player), _generate_output_in_process, player)
+
             check_accessibility_task = pool.submit(multiworld.fulfills_accessibility)
 
-            output_file_futures = [pool.submit(AutoWorld.call_stage, multiworld, "generate_output", temp_dir)]
-            for player in output_players:
+            submit_output(pool, "stage", AutoWorld.call_stage, multiworld, "generate_output")
+            for player in thread_output_players:
                 # skip starting a thread for methods that say "pass".
-                output_file_futures.append(
-                    pool.submit(AutoWorld.call_single, multiworld, "generate_output", player, temp_dir))
+                submit_output(pool, str(player), AutoWorld.call_single, multiworld, "generate_output", player)
 
             # collect ER hint info
             er_hint_data: dict[int, dict[int, str]] = {}
             AutoWorld.call_all(multiworld, 'extend_hint_information', er_hint_data)
 
-            def write_multidata():
+            def write_multidata(output_directory: str):
                 import NetUtils
                 from NetUtils import HintStatus
                 slot_data: dict[int, Mapping[str, Any]] = {}
@@ -352,36 +484,48 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
 
                 serialized_multidata = zlib.compress(restricted_dumps(multidata), 9)
 
-                with open(os.path.join(temp_dir, f'{outfilebase}.archipelago'), 'wb') as f:
+                with open(os.path.join(output_directory, f'{outfilebase}.archipelago'), 'wb') as f:
                     f.write(bytes([3]))  # version of format
                     f.write(serialized_multidata)
 
-            output_file_futures.append(pool.submit(write_multidata))
+            submit_output(pool, "multidata", write_multidata)
             if not check_accessibility_task.result():
                 if not multiworld.can_beat_game():
                     raise FillError("Game appears as unbeatable. Aborting.", multiworld=multiworld)
                 else:
                     logger.warning("Location Accessibility requirements not fulfilled.")
 
-            # retrieve exceptions via .result() if they occurred.
-            for i, future in enumerate(concurrent.futures.as_completed(output_file_futures), start=1):
-                if i % 10 == 0 or i == len(output_file_futures):
-                    logger.info(f'Generating output files ({i}/{len(output_file_futures)}).')
-                future.result()
-
-        if args.spoiler > 1:
-            logger.info('Calculating playthrough.')
-            multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
-
-        if args.spoiler:
-            multiworld.spoiler.to_file(os.path.join(temp_dir, '%s_Spoiler.txt' % outfilebase))
-
-        zipfilename = output_path(f"AP_{multiworld.seed_name}.zip")
-        logger.info(f"Creating final archive at {zipfilename}")
-        with zipfile.ZipFile(zipfilename, mode="w", compression=zipfile.ZIP_DEFLATED,
-                             compresslevel=9) as zf:
-            for file in os.scandir(temp_dir):
-                zf.write(file.path, arcname=file.name)
+            zipfilename = output_path(f"AP_{multiworld.seed_name}.zip")
+            logger.info(f"Creating final archive at {zipfilename}")
+            # output files are moved into the archive as they are done, instead of all of them at the end
+            try:
+                with zipfile.ZipFile(zipfilename, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+                    # retrieve exceptions via .result() if they occurred.
+                    for i, future in enumerate(concurrent.futures.as_completed(output_directories), start=1):
+                        if i % 10 == 0 or i == len(output_directories):
+                            logger.info(f'Generating output files ({i}/{len(output_directories)}).')
+                        result = future.result()
+                        if isinstance(result, CallTimings):
+                            # profiled calls of a worker process
+                            add_calls(result)
+                        _move_to_archive(zf, output_directories[future])
+                    # all output is done, the playthrough is measured as its own stage
+                    output_stage.close()
+
+                    if args.spoiler > 1:
+                        logger.info('Calculating playthrough.')
+                        with profile_stage("playthrough"):
+                            multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
+
+                    if args.spoiler:
+                        spoiler_path = os.path.join(temp_dir, '%s_Spoiler.txt' % outfilebase)
+                        multiworld.spoiler.to_file(spoiler_path)
+                        zf.write(spoiler_path, arcname=os.path.basename(spoiler_path))
+            except BaseException:
+                # don't leave an incomplete archive behind
+                if os.path.exists(zipfilename):
+                    os.remove(zipfilename)
+                raise
 
     logger.info('Done. Enjoy. Total Time: %s', time.perf_counter() - start)
     return multiworld
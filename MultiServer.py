@@ -29,6 +29,7 @@ ModuleUpdate.update()
 if typing.TYPE_CHECKING:
     import ssl
     from NetUtils import ServerConnection
+    from ServerMetrics import RoomMetrics
 
 import colorama
 import websockets
@@ -127,6 +128,11 @@ modify_functions = {
 }
 
 
+encoded_game_packages: typing.Dict[str, str] = {}
+"""Encoded data packages of games by checksum, shared by all rooms of the process."""
+max_encoded_game_packages = 1024
+
+
 def get_saving_second(seed_name: str, interval: int = 60) -> int:
     # save at expected times so other systems using savegame can expect it
     # represents the target second of the auto_save_interval at which to save
@@ -228,9 +234,17 @@ class Context:
     hints_used: typing.Dict[typing.Tuple[int, int], int]
     groups: typing.Dict[int, typing.Set[int]]
     save_version = 2
+    journaled_keys: typing.ClassVar[typing.FrozenSet[str]] = frozenset(
+        ("received_items", "location_checks", "hints", "stored_data"))
+    """Parts of the save that journal records only contain the changes of."""
     stored_data: typing.Dict[str, object]
     read_data: typing.Dict[str, object]
     stored_data_notification_clients: typing.Dict[str, typing.Set[Client]]
+    stored_data_notification_prefixes: typing.Dict[str, typing.Set[Client]]
+    """Clients notified of all keys starting with a prefix, registered by a SetNotify key ending in "*"."""
+    game_slots: typing.Dict[str, typing.Set[int]]
+    tagged_clients: typing.Dict[typing.Tuple[int, str], typing.Set[Client]]
+    """Authenticated clients by team and tag, to route Bounce packets."""
     slot_info: typing.Dict[int, NetworkSlot]
     generator_version = Version(0, 0, 0)
     checksums: typing.Dict[str, str]
@@ -270,7 +284,11 @@ class Context:
         self.password = password
         self.server = None
         self.countdown_timer = 0
-        self.received_items = {}
+        self.received_items: typing.Dict[typing.Tuple[int, int, bool], typing.List[NetworkItem]] = {}
+        self.new_items_slots: typing.Set[team_slot] = set()
+        self.new_items_scheduled = False
+        self.new_checks: typing.Dict[team_slot, typing.Set[int]] = {}
+        self.new_checks_scheduled = False
         self.start_inventory = {}
         self.name_aliases: typing.Dict[team_slot, str] = {}
         self.location_checks = collections.defaultdict(set)
@@ -278,6 +296,8 @@ class Context:
         self.location_check_points = location_check_points
         self.hints_used = collections.defaultdict(int)
         self.hints: typing.Dict[team_slot, typing.Set[Hint]] = collections.defaultdict(set)
+        # (team, finding_player, location) -> the hints for that location, as stored for the finding player
+        self.hints_by_location: typing.Dict[typing.Tuple[int, int, int], typing.Set[Hint]] = {}
         self.release_mode: str = release_mode
         self.remaining_mode: str = remaining_mode
         self.collect_mode: str = collect_mode
@@ -297,6 +317,17 @@ class Context:
         self.auto_save_interval = 60  # in seconds
         self.auto_saver_thread: typing.Optional[threading.Thread] = None
         self.save_dirty = False
+        self.save_revision: int = 0
+        """Incremented for each save, which records it, so the readers of saves can tell them apart."""
+        self.journal_saves = False
+        self.journal_filename: typing.Optional[str] = None
+        self._journal_size = 0
+        self._snapshot_size = 0
+        self._journaled_received_items: typing.Dict[typing.Tuple[int, int, bool], int] = {}
+        self._journaled_location_checks: typing.Dict[team_slot, int] = {}
+        self.changed_hint_keys: typing.Set[team_slot] = set()
+        """Slots whose hints changed since they were last journaled."""
+        self.changed_stored_data_keys: typing.Set[str] = set()
         self.tags = ['AP']
         self.games: typing.Dict[int, str] = {}
         self.minimum_client_versions: typing.Dict[int, Version] = {}
@@ -306,8 +337,14 @@ class Context:
         self.random = random.Random()
         self.stored_data = {}
         self.stored_data_notification_clients = collections.defaultdict(weakref.WeakSet)
+        self.stored_data_notification_prefixes = collections.defaultdict(weakref.WeakSet)
+        self._notification_prefix_lengths: typing.Set[int] = set()
+        self.game_slots = {}
+        self.tagged_clients = collections.defaultdict(weakref.WeakSet)
         self.read_data = {}
         self.spheres = []
+        self.sphere_index: typing.Dict[typing.Tuple[int, int], int] = {}
+        self.metrics: typing.Optional[RoomMetrics] = None
 
         # init empty to satisfy linter, I suppose
         self.gamespackage = {}
@@ -343,20 +380,25 @@ class Context:
 
     def _init_game_data(self):
         for game_name, game_package in self.gamespackage.items():
-            if "checksum" in game_package:
-                self.checksums[game_name] = game_package["checksum"]
-            for item_name, item_id in game_package["item_name_to_id"].items():
-                self.item_names[game_name][item_id] = item_name
-            for location_name, location_id in game_package["location_name_to_id"].items():
-                self.location_names[game_name][location_id] = location_name
-            self.all_item_and_group_names[game_name] = \
-                set(game_package["item_name_to_id"]) | set(self.item_name_groups[game_name])
-            self.all_location_and_group_names[game_name] = \
-                set(game_package["location_name_to_id"]) | set(self.location_name_groups.get(game_name, []))
-
+            self._init_game(game_name, game_package)
+        self._add_archipelago_names(game_name for game_name in self.gamespackage if game_name != "Archipelago")
+
+    def _init_game(self, game_name: str, game_package: dict):
+        if "checksum" in game_package:
+            self.checksums[game_name] = game_package["checksum"]
+        for item_name, item_id in game_package["item_name_to_id"].items():
+            self.item_names[game_name][item_id] = item_name
+        for location_name, location_id in game_package["location_name_to_id"].items():
+            self.location_names[game_name][location_id] = location_name
+        self.all_item_and_group_names[game_name] = \
+            set(game_package["item_name_to_id"]) | set(self.item_name_groups[game_name])
+        self.all_location_and_group_names[game_name] = \
+            set(game_package["location_name_to_id"]) | set(self.location_name_groups.get(game_name, []))
+
+    def _add_archipelago_names(self, games: typing.Iterable[str]):
         archipelago_item_names = self.item_names["Archipelago"]
         archipelago_location_names = self.location_names["Archipelago"]
-        for game in [game_name for game_name in self.gamespackage if game_name != "Archipelago"]:
+        for game in games:
             # Add Archipelago items and locations to each data package.
             self.item_names[game].update(archipelago_item_names)
             self.location_names[game].update(archipelago_location_names)
@@ -371,7 +413,7 @@ class Context:
     async def send_msgs(self, endpoint: Endpoint, msgs: typing.Iterable[dict]) -> bool:
         if not endpoint.socket or not endpoint.socket.open:
             return False
-        msg = self.dumper(msgs)
+        msg = self.encode_msgs(msgs)
         try:
             await endpoint.socket.send(msg)
         except websockets.ConnectionClosed:
@@ -379,11 +421,40 @@ class Context:
             await self.disconnect(endpoint)
             return False
         else:
+            if self.metrics:
+                self.metrics.count_sent(msg, 1, [sent["cmd"] for sent in msgs])
             if self.log_network:
                 self.logger.info(f"Outgoing message: {msg}")
             return True
 
-    async def send_encoded_msgs(self, endpoint: Endpoint, msg: str) -> bool:
+    def encode_msgs(self, msgs: typing.Iterable[typing.Dict[str, typing.Any]]) -> str:
+        if not self.metrics:
+            return self.dumper(msgs)
+        start = time.perf_counter()
+        data = self.dumper(msgs)
+        self.metrics.encode_time.observe(time.perf_counter() - start)
+        return data
+
+    def get_encoded_game_package(self, game: str) -> str:
+        """Get the encoded data package of a game, reusing the encoding of the same checksum across rooms."""
+        game_package = self.gamespackage[game]
+        checksum = game_package.get("checksum", None)
+        if checksum is None:
+            return self.dumper(game_package)
+        encoded = encoded_game_packages.get(checksum, None)
+        if encoded is None:
+            if len(encoded_game_packages) >= max_encoded_game_packages:
+                # evict the oldest entry, likely a custom data package of a room that has since closed
+                encoded_game_packages.pop(next(iter(encoded_game_packages)), None)
+            encoded = encoded_game_packages[checksum] = self.dumper(game_package)
+        return encoded
+
+    def get_encoded_data_package(self, games: typing.Iterable[str]) -> str:
+        """Get an encoded DataPackage packet of the games, assembled from their encoded data packages."""
+        return '[{"cmd":"DataPackage","data":{"games":{' + ",".join(
+            f"{self.dumper(game)}:{self.get_encoded_game_package(game)}" for game in games) + "}}}]"
+
+    async def send_encoded_msgs(self, endpoint: Endpoint, msg: str, cmds: typing.Sequence[str] = ()) -> bool:
         if not endpoint.socket or not endpoint.socket.open:
             return False
         try:
@@ -393,11 +464,14 @@ class Context:
             await self.disconnect(endpoint)
             return False
         else:
+            if self.metrics:
+                self.metrics.count_sent(msg, 1, cmds)
             if self.log_network:
                 self.logger.info(f"Outgoing message: {msg}")
             return True
 
-    async def broadcast_send_encoded_msgs(self, endpoints: typing.Iterable[Endpoint], msg: str) -> bool:
+    async def broadcast_send_encoded_msgs(self, endpoints: typing.Iterable[Endpoint], msg: str,
+                                          cmds: typing.Sequence[str] = ()) -> bool:
         sockets = []
         for endpoint in endpoints:
             if endpoint.socket and endpoint.socket.open:
@@ -408,19 +482,21 @@ class Context:
             self.logger.exception("Exception during broadcast_send_encoded_msgs")
             return False
         else:
+            if self.metrics:
+                self.metrics.count_sent(msg, len(sockets), cmds)
             if self.log_network:
                 self.logger.info(f"Outgoing broadcast: {msg}")
             return True
 
     def broadcast_all(self, msgs: typing.List[dict]):
         msg_is_text = all(msg["cmd"] == "PrintJSON" for msg in msgs)
-        data = self.dumper(msgs)
+        data = self.encode_msgs(msgs)
         endpoints = (
             endpoint
             for endpoint in self.endpoints
             if endpoint.auth and not (msg_is_text and endpoint.no_text)
         )
-        async_start(self.broadcast_send_encoded_msgs(endpoints, data))
+        async_start(self.broadcast_send_encoded_msgs(endpoints, data, [msg["cmd"] for msg in msgs]))
 
     def broadcast_text_all(self, text: str, additional_arguments: dict = {}):
         self.logger.info("Notice (all): %s" % text)
@@ -428,25 +504,74 @@ class Context:
 
     def broadcast_team(self, team: int, msgs: typing.List[dict]):
         msg_is_text = all(msg["cmd"] == "PrintJSON" for msg in msgs)
-        data = self.dumper(msgs)
+        data = self.encode_msgs(msgs)
         endpoints = (
             endpoint
             for endpoint in itertools.chain.from_iterable(self.clients[team].values())
             if not (msg_is_text and endpoint.no_text)
         )
-        async_start(self.broadcast_send_encoded_msgs(endpoints, data))
+        async_start(self.broadcast_send_encoded_msgs(endpoints, data, [msg["cmd"] for msg in msgs]))
 
     def broadcast(self, endpoints: typing.Iterable[Client], msgs: typing.List[dict]):
-        msgs = self.dumper(msgs)
-        async_start(self.broadcast_send_encoded_msgs(endpoints, msgs))
+        data = self.encode_msgs(msgs)
+        async_start(self.broadcast_send_encoded_msgs(endpoints, data, [msg["cmd"] for msg in msgs]))
 
     async def disconnect(self, endpoint: Client):
         if endpoint in self.endpoints:
             self.endpoints.remove(endpoint)
+        self.remove_client_tags(endpoint)
         if endpoint.slot and endpoint in self.clients[endpoint.team][endpoint.slot]:
             self.clients[endpoint.team][endpoint.slot].remove(endpoint)
         await on_client_disconnected(self, endpoint)
 
+    def set_client_tags(self, client: Client, tags: typing.List[str]):
+        """Sets the tags of an authenticated client and indexes them for Bounce routing."""
+        self.remove_client_tags(client)
+        client.tags = tags
+        for tag in tags:
+            self.tagged_clients[client.team, tag].add(client)
+
+    def remove_client_tags(self, client: Client):
+        """Removes a client from the Bounce tag index, such as before it changes team or disconnects."""
+        if client.team is None:
+            return
+        for tag in client.tags:
+            clients = self.tagged_clients.get((client.team, tag), None)
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self.tagged_clients[client.team, tag]
+
+    def get_bounce_targets(self, team: int, games: typing.Iterable[str], tags: typing.Iterable[str],
+                           slots: typing.Iterable[int]) -> typing.Set[Client]:
+        """Get the clients of a team matching any of the games, tags or slots of a Bounce packet."""
+        team_clients = self.clients.get(team, {})
+        targets: typing.Set[Client] = set()
+        for slot in itertools.chain(slots, *(self.game_slots.get(game, ()) for game in games)):
+            targets.update(team_clients.get(slot, ()))
+        for tag in tags:
+            targets.update(self.tagged_clients.get((team, tag), ()))
+        return targets
+
+    def add_notification_client(self, key: str, client: Client):
+        """Registers a client to be notified of changes to a key, or to all keys with a prefix if it ends in "*"."""
+        if key.endswith("*"):
+            prefix = key[:-1]
+            self.stored_data_notification_prefixes[prefix].add(client)
+            self._notification_prefix_lengths.add(len(prefix))
+        else:
+            self.stored_data_notification_clients[key].add(client)
+
+    def get_notification_clients(self, key: str) -> typing.Set[Client]:
+        """Get the clients to notify of a change to a key, including those registered to a prefix of it."""
+        targets: typing.Set[Client] = set(self.stored_data_notification_clients.get(key, ()))
+        if self.stored_data_notification_prefixes:
+            prefixes = self.stored_data_notification_prefixes
+            for length in self._notification_prefix_lengths:
+                if length <= len(key):
+                    targets.update(prefixes.get(key[:length], ()))
+        return targets
+
     def notify_client(self, client: Client, text: str, additional_arguments: dict = {}):
         if not client.auth or client.no_text:
             return
@@ -507,6 +632,9 @@ class Context:
 
         self.slot_info = decoded_obj["slot_info"]
         self.games = {slot: slot_info.game for slot, slot_info in self.slot_info.items()}
+        self.game_slots = {}
+        for slot, game in self.games.items():
+            self.game_slots.setdefault(game, set()).add(slot)
         self.groups = {slot: set(slot_info.group_members) for slot, slot_info in self.slot_info.items()
                        if slot_info.type == SlotType.group}
 
@@ -540,6 +668,7 @@ class Context:
 
         for slot, hints in decoded_obj["precollected_hints"].items():
             self.hints[0, slot].update(hints)
+        self.index_hints()
 
         # declare slots that aren't players as done
         for slot, slot_info in self.slot_info.items():
@@ -570,6 +699,7 @@ class Context:
 
         # sorted access spheres
         self.spheres = decoded_obj.get("spheres", [])
+        self.sphere_index = NetUtils.get_sphere_index(self.spheres)
 
     # saving
 
@@ -585,18 +715,118 @@ class Context:
         return False
 
     def _save(self, exit_save: bool = False) -> bool:
+        start = time.perf_counter()
         try:
-            # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
-            encoded_save = pickle.dumps(self.get_save())
-            with open(self.save_filename, "wb") as f:
-                f.write(zlib.compress(encoded_save))
+            if self.journal_saves and not exit_save and self._journal_size < max(self._snapshot_size, 65536):
+                size = self._append_journal()
+            else:
+                size = self._write_snapshot()
         except Exception as e:
             self.logger.exception(e)
             return False
         else:
+            if self.metrics:
+                self.metrics.observe_save(time.perf_counter() - start, size)
             return True
 
-    def init_save(self, enabled: bool = True):
+    def _write_snapshot(self) -> int:
+        """Writes the whole save, replacing the journal if enabled. Returns the size written."""
+        # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
+        encoded_save = zlib.compress(pickle.dumps(self.get_save()))
+        if not self.journal_saves:
+            with open(self.save_filename, "wb") as f:
+                f.write(encoded_save)
+            return len(encoded_save)
+
+        # the snapshot replaces the journal, so it has to be complete before the journal is cleared
+        import os
+        with open(self.save_filename + ".tmp", "wb") as f:
+            f.write(encoded_save)
+        os.replace(self.save_filename + ".tmp", self.save_filename)
+        with open(self.journal_filename, "wb"):
+            pass
+        self._snapshot_size = len(encoded_save)
+        self._journal_size = 0
+        self._journaled_received_items = {key: len(items) for key, items in self.received_items.items()}
+        self._journaled_location_checks = {key: len(checks) for key, checks in self.location_checks.items()}
+        self.changed_hint_keys.clear()
+        self.changed_stored_data_keys.clear()
+        return len(encoded_save)
+
+    def _append_journal(self) -> int:
+        """Appends the changes since the last snapshot or journal record to the journal. Returns the size written."""
+        save = self.get_save()
+        record: typing.Dict[str, typing.Any] = {
+            # the rest of the save is small, so it is recorded whole
+            "state": {key: value for key, value in save.items() if key not in self.journaled_keys},
+            "received_items": {},
+            "location_checks": {},
+            "hints": {},
+            "stored_data": {},
+        }
+        # what was journaled is only updated once the record is written, so nothing is lost if writing fails
+        journaled_received_items: typing.Dict[typing.Tuple[int, int, bool], int] = {}
+        journaled_location_checks: typing.Dict[team_slot, int] = {}
+        for key, items in self.received_items.items():
+            journaled = self._journaled_received_items.get(key, 0)
+            if len(items) != journaled:
+                new_items = items[journaled:]
+                # the start index makes replaying the record idempotent
+                record["received_items"][key] = journaled, new_items
+                journaled_received_items[key] = journaled + len(new_items)
+        for key, checks in self.location_checks.items():
+            if len(checks) != self._journaled_location_checks.get(key, 0):
+                record["location_checks"][key] = checks = set(checks)
+                journaled_location_checks[key] = len(checks)
+        changed_hint_keys, self.changed_hint_keys = self.changed_hint_keys, set()
+        changed_stored_data_keys, self.changed_stored_data_keys = self.changed_stored_data_keys, set()
+        try:
+            for key in changed_hint_keys:
+                record["hints"][key] = set(self.hints[key])
+            for key in changed_stored_data_keys:
+                record["stored_data"][key] = self.stored_data[key]
+
+            encoded_record = zlib.compress(pickle.dumps(record))
+            with open(self.journal_filename, "ab") as f:
+                f.write(len(encoded_record).to_bytes(4, "little"))
+                f.write(encoded_record)
+        except BaseException:
+            self.changed_hint_keys |= changed_hint_keys
+            self.changed_stored_data_keys |= changed_stored_data_keys
+            raise
+        self._journal_size += 4 + len(encoded_record)
+        self._journaled_received_items.update(journaled_received_items)
+        self._journaled_location_checks.update(journaled_location_checks)
+        return 4 + len(encoded_record)
+
+    def _replay_journal(self, save_data: dict) -> None:
+        """Applies the records of the journal to save_data, which is modified in place."""
+        try:
+            with open(self.journal_filename, "rb") as f:
+                journal = f.read()
+        except FileNotFoundError:
+            return
+        position = 0
+        records = 0
+        while position < len(journal):
+            size = int.from_bytes(journal[position:position + 4], "little")
+            encoded_record = journal[position + 4:position + 4 + size]
+            if size == 0 or len(encoded_record) < size:
+                self.logger.warning("Ignoring incomplete record at the end of the save journal.")
+                break
+            record = restricted_loads(zlib.decompress(encoded_record))
+            position += 4 + size
+            records += 1
+
+            save_data.update(record["state"])
+            for key, (start, items) in record["received_items"].items():
+                save_data["received_items"].setdefault(key, [])[start:] = items
+            save_data["location_checks"].update(record["location_checks"])
+            save_data["hints"].update(record["hints"])
+            save_data["stored_data"].update(record["stored_data"])
+        self.logger.info(f"Replayed {records} records of the save journal.")
+
+    def init_save(self, enabled: bool = True, journal: bool = False):
         self.saving = enabled
         if self.saving:
             if not self.save_filename:
@@ -604,14 +834,26 @@ class Context:
                 name, ext = os.path.splitext(self.data_filename)
                 self.save_filename = name + '.apsave' if ext.lower() in ('.archipelago', '.zip') \
                     else self.data_filename + '_' + 'apsave'
+            self.journal_saves = journal
+            self.journal_filename = self.save_filename + ".journal"
             try:
                 with open(self.save_filename, 'rb') as f:
                     save_data = restricted_loads(zlib.decompress(f.read()))
+                    if journal:
+                        self._replay_journal(save_data)
                     self.set_save(save_data)
             except FileNotFoundError:
                 self.logger.error('No save data found, starting a new game')
             except Exception as e:
                 self.logger.exception(e)
+                if journal:
+                    # a snapshot would replace the save and its journal, so they are kept for recovery instead
+                    self.logger.error("Could not load the save and its journal, saving is disabled.")
+                    self.saving = False
+                    return
+            if journal:
+                # start the journal from a snapshot of the loaded state
+                self._write_snapshot()
             self._start_async_saving()
 
     def _start_async_saving(self, atexit_save: bool = True):
@@ -647,8 +889,10 @@ class Context:
 
     def get_save(self) -> dict:
         self.recheck_hints()
+        self.save_revision += 1
         d = {
             "version": self.save_version,
+            "revision": self.save_revision,
             "connect_names": self.connect_names,
             "received_items": self.received_items,
             "hints_used": dict(self.hints_used),
@@ -679,9 +923,11 @@ class Context:
             raise Exception("This savegame does not appear to match the loaded multiworld.")
         if savedata["version"] > self.save_version:
             raise Exception("This savegame is newer than the server.")
+        self.save_revision = int(savedata.get("revision", 0))
         self.received_items = savedata["received_items"]
         self.hints_used.update(savedata["hints_used"])
         self.hints.update(savedata["hints"])
+        self.index_hints()
 
         self.name_aliases.update(savedata["name_aliases"])
         self.client_game_state.update(savedata["client_game_state"])
@@ -729,6 +975,8 @@ class Context:
         will refresh all teams or all slots respectively. If a set is passed for 'changed', each (team,slot)
         pair that has at least one hint modified will be added to the set.
         """
+        if self.metrics:
+            self.metrics.hint_rechecks += 1
         for hint_team, hint_slot in self.hints:
             if team != hint_team and team is not None:
                 continue  # Check specified team only, all if team is None
@@ -740,6 +988,9 @@ class Context:
                 new_hints.add(new_hint)
                 if hint == new_hint:
                     continue
+                self.changed_hint_keys.add((hint_team, hint_slot))
+                if hint.finding_player == hint_slot:
+                    self.reindex_hint(hint_team, hint, new_hint)
                 for player in self.slot_set(hint.receiving_player) | {hint.finding_player}:
                     if changed is not None:
                         changed.add((hint_team,player))
@@ -747,6 +998,37 @@ class Context:
                         self.replace_hint(hint_team, player, hint, new_hint)
             self.hints[hint_team, hint_slot] = new_hints
 
+    def recheck_location_hints(self, team: int, slot: int, locations: typing.Iterable[int],
+                               changed: typing.Optional[typing.Set[team_slot]] = None) -> None:
+        """Refreshes only the hints for the specified locations of a slot, after they were checked.
+        If a set is passed for 'changed', each (team,slot) pair that has at least one hint modified will be added to
+        the set.
+        """
+        for location in locations:
+            # replace_hint updates the indexed set
+            for hint in tuple(self.hints_by_location.get((team, slot, location), ())):
+                new_hint = hint.re_check(self, team)
+                if hint == new_hint:
+                    continue
+                for player in self.slot_set(hint.receiving_player) | {hint.finding_player}:
+                    if changed is not None:
+                        changed.add((team, player))
+                    self.replace_hint(team, player, hint, new_hint)
+
+    def index_hints(self) -> None:
+        """Rebuilds hints_by_location from hints."""
+        self.hints_by_location = {}
+        for (team, slot), hints in self.hints.items():
+            for hint in hints:
+                if hint.finding_player == slot:
+                    self.hints_by_location.setdefault((team, slot, hint.location), set()).add(hint)
+
+    def reindex_hint(self, team: int, old_hint: Hint, new_hint: Hint) -> None:
+        """Replaces a hint in hints_by_location with its rechecked version."""
+        hints = self.hints_by_location.setdefault((team, new_hint.finding_player, new_hint.location), set())
+        hints.discard(old_hint)
+        hints.add(new_hint)
+
     def get_rechecked_hints(self, team: int, slot: int):
         self.recheck_hints(team, slot)
         return self.hints[team, slot]
@@ -754,13 +1036,22 @@ class Context:
     def get_sphere(self, player: int, location_id: int) -> int:
         """Get sphere of a location, -1 if spheres are not available."""
         if self.spheres:
-            for i, sphere in enumerate(self.spheres):
-                if location_id in sphere.get(player, set()):
-                    return i
-            raise KeyError(f"No Sphere found for location ID {location_id} belonging to player {player}. "
-                           f"Location or player may not exist.")
+            try:
+                return self.sphere_index[player, location_id]
+            except KeyError:
+                raise KeyError(f"No Sphere found for location ID {location_id} belonging to player {player}. "
+                               f"Location or player may not exist.") from None
         return -1
 
+    def get_remaining_spheres(self, team: int, slot: int) -> typing.Dict[int, int]:
+        """Get the amount of remaining locations of a slot in each sphere, empty if spheres are not available."""
+        if not self.spheres:
+            return {}
+        sphere_index = self.sphere_index
+        return dict(collections.Counter(sphere_index[slot, location_id]
+                                        for location_id in self.locations.get_missing(self.location_checks, team, slot)
+                                        if (slot, location_id) in sphere_index))
+
     def get_players_package(self):
         return [NetworkPlayer(t, p, self.get_aliased_name(t, p), n) for (t, p), n in self.player_names.items()]
 
@@ -817,9 +1108,12 @@ class Context:
                 # we can check once if hint already exists
                 if hint not in self.hints[team, hint.finding_player]:
                     self.hints[team, hint.finding_player].add(hint)
+                    self.hints_by_location.setdefault((team, hint.finding_player, hint.location), set()).add(hint)
+                    self.changed_hint_keys.add((team, hint.finding_player))
                     new_hint_events.add(hint.finding_player)
                     for player in self.slot_set(hint.receiving_player):
                         self.hints[team, player].add(hint)
+                        self.changed_hint_keys.add((team, player))
                         new_hint_events.add(player)
 
             self.logger.info("Notice (Team #%d): %s" % (team + 1, format_hint(self, team, hint)))
@@ -835,16 +1129,18 @@ class Context:
                     async_start(self.send_msgs(client, client_hints))
 
     def get_hint(self, team: int, finding_player: int, seeked_location: int) -> typing.Optional[Hint]:
-        for hint in self.hints[team, finding_player]:
-            if hint.location == seeked_location and hint.finding_player == finding_player:
-                return hint
+        for hint in self.hints_by_location.get((team, finding_player, seeked_location), ()):
+            return hint
         return None
-    
+
     def replace_hint(self, team: int, slot: int, old_hint: Hint, new_hint: Hint) -> None:
         if old_hint in self.hints[team, slot]:
             self.hints[team, slot].remove(old_hint)
             self.hints[team, slot].add(new_hint)
-    
+            self.changed_hint_keys.add((team, slot))
+            if slot == new_hint.finding_player:
+                self.reindex_hint(team, old_hint, new_hint)
+
     # "events"
 
     def on_goal_achieved(self, client: Client):
@@ -866,24 +1162,24 @@ class Context:
 
     def on_changed_hints(self, team: int, slot: int):
         key: str = f"_read_hints_{team}_{slot}"
-        targets: typing.Set[Client] = set(self.stored_data_notification_clients[key])
+        targets: typing.Set[Client] = self.get_notification_clients(key)
         if targets:
             self.broadcast(targets, [{"cmd": "SetReply", "key": key, "value": self.hints[team, slot]}])
 
     def on_client_status_change(self, team: int, slot: int):
         key: str = f"_read_client_status_{team}_{slot}"
-        targets: typing.Set[Client] = set(self.stored_data_notification_clients[key])
+        targets: typing.Set[Client] = self.get_notification_clients(key)
         if targets:
             self.broadcast(targets, [{"cmd": "SetReply", "key": key, "value": self.client_game_state[team, slot]}])
 
 
 def update_aliases(ctx: Context, team: int):
-    cmd = ctx.dumper([{"cmd": "RoomUpdate",
-                       "players": ctx.get_players_package()}])
+    cmd = ctx.encode_msgs([{"cmd": "RoomUpdate",
+                            "players": ctx.get_players_package()}])
 
     for clients in ctx.clients[team].values():
         for client in clients:
-            async_start(ctx.send_encoded_msgs(client, cmd))
+            async_start(ctx.send_encoded_msgs(client, cmd, ("RoomUpdate",)))
 
 
 async def server(websocket: "ServerConnection", path: str = "/", ctx: Context = None) -> None:
@@ -900,6 +1196,8 @@ async def server(websocket: "ServerConnection", path: str = "/", ctx: Context =
             if ctx.log_network:
                 ctx.logger.info(f"Incoming message: {data}")
             for msg in decode(data):
+                if ctx.metrics:
+                    ctx.metrics.count_received(msg.get("cmd", None) if isinstance(msg, dict) else None)
                 await process_client_cmd(ctx, client, msg)
     except Exception as e:
         if not isinstance(e, websockets.WebSocketException):
@@ -1066,19 +1364,42 @@ def get_start_inventory(ctx: Context, player: int, remote_start_inventory: bool)
 
 
 def send_new_items(ctx: Context):
-    for team, clients in ctx.clients.items():
-        for slot, clients in clients.items():
-            for client in clients:
-                if client.no_items:
-                    continue
-                start_inventory = get_start_inventory(ctx, slot, client.remote_start_inventory)
-                items = get_received_items(ctx, team, slot, client.remote_items)
-                if len(start_inventory) + len(items) > client.send_index:
-                    first_new_item = max(0, client.send_index - len(start_inventory))
-                    async_start(ctx.send_msgs(client, [{
-                        "cmd": "ReceivedItems",
-                        "index": client.send_index,
-                        "items": start_inventory[client.send_index:] + items[first_new_item:]}]))
+    """
+    Sends the items that were received by the slots in ctx.new_items_slots to their clients.
+    Inside the event loop, sending is deferred to the next loop iteration, so that all items received until then are
+    sent together.
+    """
+    if ctx.new_items_scheduled:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _send_new_items(ctx)
+    else:
+        ctx.new_items_scheduled = True
+        loop.call_soon(_send_new_items, ctx)
+
+
+def _send_new_items(ctx: Context):
+    ctx.new_items_scheduled = False
+    new_items_slots, ctx.new_items_slots = ctx.new_items_slots, set()
+    for team, slot in new_items_slots:
+        # clients of a slot that are at the same point receive the same message, so it only has to be encoded once
+        receivers: typing.Dict[typing.Tuple[bool, bool, int], typing.List[Client]] = {}
+        for client in ctx.clients[team].get(slot, ()):
+            if not client.no_items:
+                receivers.setdefault((client.remote_start_inventory, client.remote_items, client.send_index),
+                                     []).append(client)
+        for (remote_start_inventory, remote_items, send_index), clients in receivers.items():
+            start_inventory = get_start_inventory(ctx, slot, remote_start_inventory)
+            items = get_received_items(ctx, team, slot, remote_items)
+            if len(start_inventory) + len(items) > send_index:
+                first_new_item = max(0, send_index - len(start_inventory))
+                ctx.broadcast(clients, [{
+                    "cmd": "ReceivedItems",
+                    "index": send_index,
+                    "items": start_inventory[send_index:] + items[first_new_item:]}])
+                for client in clients:
                     client.send_index = len(start_inventory) + len(items)
 
 
@@ -1123,6 +1444,7 @@ def get_remaining(ctx: Context, team: int, slot: int) -> typing.List[typing.Tupl
 
 def send_items_to(ctx: Context, team: int, target_slot: int, *items: NetworkItem):
     for target in ctx.slot_set(target_slot):
+        ctx.new_items_slots.add((team, target))
         for item in items:
             if item.player != target_slot:
                 get_received_items(ctx, team, target, False).append(item)
@@ -1165,15 +1487,42 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
 
         ctx.location_checks[team, slot] |= new_locations
         send_new_items(ctx)
+        ctx.new_checks.setdefault((team, slot), set()).update(new_locations)
+        send_new_checks(ctx)
+
+
+def send_new_checks(ctx: Context):
+    """
+    Applies the side effects of the checks in ctx.new_checks: informing the checking slots, rechecking and sending the
+    changed hints and marking the save dirty.
+    Inside the event loop, this is deferred to the next loop iteration, so that it happens once for all checks until
+    then.
+    """
+    if ctx.new_checks_scheduled:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _send_new_checks(ctx)
+    else:
+        ctx.new_checks_scheduled = True
+        loop.call_soon(_send_new_checks, ctx)
+
+
+def _send_new_checks(ctx: Context):
+    ctx.new_checks_scheduled = False
+    new_checks, ctx.new_checks = ctx.new_checks, {}
+    updated_slots: typing.Set[team_slot] = set()
+    for (team, slot), new_locations in new_checks.items():
         ctx.broadcast(ctx.clients[team][slot], [{
             "cmd": "RoomUpdate",
             "hint_points": get_slot_points(ctx, team, slot),
             "checked_locations": new_locations,  # send back new checks only
         }])
-        updated_slots: typing.Set[tuple[int, int]] = set()
-        ctx.recheck_hints(team, slot, updated_slots)
-        for hint_team, hint_slot in updated_slots:
-            ctx.on_changed_hints(hint_team, hint_slot)
+        ctx.recheck_location_hints(team, slot, new_locations, updated_slots)
+    for hint_team, hint_slot in updated_slots:
+        ctx.on_changed_hints(hint_team, hint_slot)
+    if new_checks:
         ctx.save()
 
 
@@ -1663,6 +2012,7 @@ class ClientMessageProcessor(CommonCommandProcessor):
                 new_item = NetworkItem(names[item_name], -1, self.client.slot)
                 get_received_items(self.ctx, self.client.team, self.client.slot, False).append(new_item)
                 get_received_items(self.ctx, self.client.team, self.client.slot, True).append(new_item)
+                self.ctx.new_items_slots.add((self.client.team, self.client.slot))
                 self.ctx.broadcast_text_all(
                     'Cheat console: sending "' + item_name + '" to ' + self.ctx.get_aliased_name(self.client.team,
                                                                                                  self.client.slot),
@@ -1680,9 +2030,14 @@ class ClientMessageProcessor(CommonCommandProcessor):
         points_available = get_client_points(self.ctx, self.client)
         cost = self.ctx.get_hint_cost(self.client.slot)
         if not input_text:
-            hints = {hint.re_check(self.ctx, self.client.team) for hint in
-                     self.ctx.hints[self.client.team, self.client.slot]}
+            hints: typing.Set[Hint] = set()
+            for hint in self.ctx.hints[self.client.team, self.client.slot]:
+                new_hint = hint.re_check(self.ctx, self.client.team)
+                hints.add(new_hint)
+                if hint.finding_player == self.client.slot:
+                    self.ctx.reindex_hint(self.client.team, hint, new_hint)
             self.ctx.hints[self.client.team, self.client.slot] = hints
+            self.ctx.changed_hint_keys.add((self.client.team, self.client.slot))
             self.ctx.notify_hints(self.client.team, list(hints), recipients=(self.client.slot,))
             self.output(f"A hint costs {self.ctx.get_hint_cost(self.client.slot)} points. "
                         f"You have {points_available} points.")
@@ -1891,6 +2246,7 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             await ctx.send_msgs(client, [{"cmd": "ConnectionRefused", "errors": list(errors)}])
         else:
             team, slot = ctx.connect_names[args['name']]
+            ctx.remove_client_tags(client)
             if client.auth and client.team is not None and client.slot in ctx.clients[client.team]:
                 ctx.clients[team][slot].remove(client)  # re-auth, remove old entry
                 if client.team != team or client.slot != slot:
@@ -1901,7 +2257,7 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             ctx.client_ids[client.team, client.slot] = args["uuid"]
             ctx.clients[team][slot].append(client)
             client.version = args['version']
-            client.tags = args['tags']
+            ctx.set_client_tags(client, args['tags'])
             client.no_locations = bool(client.tags & _non_game_messages.keys())
             # set NoText for old PopTracker clients that predate the tag to save traffic
             client.no_text = "NoText" in client.tags or ("PopTracker" in client.tags and client.version < (0, 5, 1))
@@ -1930,23 +2286,15 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
     elif cmd == "GetDataPackage":
         exclusions = args.get("exclusions", [])
         if "games" in args:
-            games = {name: game_data for name, game_data in ctx.gamespackage.items()
-                     if name in set(args.get("games", []))}
-            await ctx.send_msgs(client, [{"cmd": "DataPackage",
-                                          "data": {"games": games}}])
+            requested_games = set(args.get("games", []))
+            games = [name for name in ctx.gamespackage if name in requested_games]
         # TODO: remove exclusions behaviour around 0.5.0
         elif exclusions:
             exclusions = set(exclusions)
-            games = {name: game_data for name, game_data in ctx.gamespackage.items()
-                     if name not in exclusions}
-
-            package = {"games": games}
-            await ctx.send_msgs(client, [{"cmd": "DataPackage",
-                                          "data": package}])
-
+            games = [name for name in ctx.gamespackage if name not in exclusions]
         else:
-            await ctx.send_msgs(client, [{"cmd": "DataPackage",
-                                          "data": {"games": ctx.gamespackage}}])
+            games = list(ctx.gamespackage)
+        await ctx.send_encoded_msgs(client, ctx.get_encoded_data_package(games), ("DataPackage",))
 
     elif client.auth:
         if cmd == "ConnectUpdate":
@@ -1974,7 +2322,7 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
 
             if "tags" in args:
                 old_tags = client.tags
-                client.tags = args["tags"]
+                ctx.set_client_tags(client, args["tags"])
                 if set(old_tags) != set(client.tags):
                     client.no_locations = bool(client.tags & _non_game_messages.keys())
                     client.no_text = "NoText" in client.tags or (
@@ -2139,13 +2487,11 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             tags = set(args.get("tags", []))
             slots = set(args.get("slots", []))
             args["cmd"] = "Bounced"
-            msg = ctx.dumper([args])
+            msg = ctx.encode_msgs([args])
 
-            for bounceclient in ctx.endpoints:
-                if client.team == bounceclient.team and (ctx.games[bounceclient.slot] in games or
-                                                         set(bounceclient.tags) & tags or
-                                                         bounceclient.slot in slots):
-                    await ctx.send_encoded_msgs(bounceclient, msg)
+            targets = ctx.get_bounce_targets(client.team, games, tags, slots)
+            if targets:
+                await ctx.broadcast_send_encoded_msgs(targets, msg, ("Bounced",))
 
         elif cmd == "Get":
             if "keys" not in args or type(args["keys"]) != list:
@@ -2175,7 +2521,8 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
                 func = modify_functions[operation["operation"]]
                 value = func(value, operation["value"])
             ctx.stored_data[args["key"]] = args["value"] = value
-            targets = set(ctx.stored_data_notification_clients[args["key"]])
+            ctx.changed_stored_data_keys.add(args["key"])
+            targets = ctx.get_notification_clients(args["key"])
             if args.get("want_reply", False):
                 targets.add(client)
             if targets:
@@ -2188,7 +2535,7 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
                                               "text": 'SetNotify', "original_cmd": cmd}])
                 return
             for key in args["keys"]:
-                ctx.stored_data_notification_clients[key].add(client)
+                ctx.add_notification_client(key, client)
 
 
 def update_client_status(ctx: Context, client: Client, new_status: ClientStatus):
@@ -2577,6 +2924,9 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument('--password', default=defaults["password"])
     parser.add_argument('--savefile', default=defaults["savefile"])
     parser.add_argument('--disable_save', default=defaults["disable_save"], action='store_true')
+    parser.add_argument('--journal_save', default=defaults["journal_save"], action='store_true',
+                        help="Save by appending changes to a journal, which is compacted into the save file "
+                             "once it grows larger than it.")
     parser.add_argument('--cert', help="Path to a SSL Certificate for encryption.")
     parser.add_argument('--cert_key', help="Path to SSL Certificate Key file")
     parser.add_argument('--loglevel', default=defaults["loglevel"],
@@ -2631,6 +2981,8 @@ def parse_args() -> argparse.Namespace:
     #0 -> recommended for tournaments to force a level playing field, only allow an exact version match
     """)
     parser.add_argument('--log_network', default=defaults["log_network"], action="store_true")
+    parser.add_argument('--metrics_port', default=defaults["metrics_port"], type=int,
+                        help="Serve runtime metrics in the Prometheus text format on this local port, 0 to disable.")
     args = parser.parse_args()
     return args
 
@@ -2707,7 +3059,16 @@ async def main(args: argparse.Namespace):
         logging.exception(f"Failed to read multiworld data ({e})")
         raise
 
-    ctx.init_save(not args.disable_save)
+    ctx.init_save(not args.disable_save, args.journal_save)
+
+    metrics_task: typing.Optional[asyncio.Task] = None
+    if args.metrics_port:
+        from ServerMetrics import ServerMetrics
+        metrics = ServerMetrics()
+        metrics.add_room(ctx.seed_name, ctx)
+        metrics_task = asyncio.create_task(metrics.monitor_loop_lag())
+        metrics.start_http_server(args.metrics_port)
+        logging.info(f"Serving metrics at http://127.0.0.1:{args.metrics_port}/metrics")
 
     ssl_context = load_server_cert(args.cert, args.cert_key) if args.cert else None
 
@@ -2728,6 +3089,8 @@ async def main(args: argparse.Namespace):
         ctx.shutdown_task = asyncio.create_task(auto_shutdown(ctx, [console_task]))
     await ctx.exit_event.wait()
     console_task.cancel()
+    if metrics_task:
+        metrics_task.cancel()
     if ctx.shutdown_task:
         await ctx.shutdown_task
 
@@ -6,6 +6,11 @@ import enum
 import warnings
 from json import JSONEncoder, JSONDecoder
 
+try:
+    import orjson
+except ImportError:  # optional accelerated codec, the json module is used without it
+    orjson = None
+
 if typing.TYPE_CHECKING:
     from websockets import WebSocketServerProtocol as ServerConnection
 
@@ -135,10 +140,47 @@ _encode = JSONEncoder(
 ).encode
 
 
-def encode(obj: typing.Any) -> str:
+def _encode_default(obj: typing.Any) -> typing.Any:
+    """Converts types orjson does not serialize natively, like _scan_for_TypedTuples does for the json module."""
+    if isinstance(obj, tuple) and hasattr(obj, "_fields"):
+        data = obj._asdict()
+        data["class"] = obj.__class__.__name__
+        return data
+    if isinstance(obj, (tuple, set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _encode_json(obj: typing.Any) -> str:
     return _encode(_scan_for_TypedTuples(obj))
 
 
+def _has_non_finite_float(obj: typing.Any) -> bool:
+    if isinstance(obj, float):
+        return obj != obj or obj in (float("inf"), float("-inf"))
+    if isinstance(obj, dict):
+        return any(_has_non_finite_float(key) or _has_non_finite_float(value) for key, value in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return any(_has_non_finite_float(value) for value in obj)
+    return False
+
+
+def _encode_orjson(obj: typing.Any) -> str:
+    try:
+        encoded = orjson.dumps(obj, default=_encode_default, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:  # such as integers beyond 64 bits, which the json module can still encode
+        return _encode_json(obj)
+    # orjson encodes NaN and infinities as null, while the json module keeps them,
+    # so only messages that contain null can need to be encoded by the json module instead
+    if b"null" in encoded and _has_non_finite_float(obj):
+        return _encode_json(obj)
+    return encoded.decode()
+
+
+encode: typing.Callable[[typing.Any], str] = _encode_orjson if orjson else _encode_json
+"""Encodes an object to a JSON string of the network protocol, with NamedTuples as objects with a "class" key."""
+
+
 def get_any_version(data: dict) -> Version:
     data = {key.lower(): value for key, value in data.items()}  # .NET version classes have capitalized keys
     return Version(int(data["major"]), int(data["minor"]), int(data["build"]))
@@ -156,11 +198,11 @@ custom_hooks = {
 
 
 def _object_hook(o: typing.Any) -> typing.Any:
-    if isinstance(o, dict):
-        hook = custom_hooks.get(o.get("class", None), None)
+    if isinstance(o, dict) and "class" in o:
+        hook = custom_hooks.get(o["class"], None)
         if hook:
             return hook(o)
-        cls = allowlist.get(o.get("class", None), None)
+        cls = allowlist.get(o["class"], None)
         if cls:
             for key in tuple(o):
                 if key not in cls._fields:
@@ -170,7 +212,27 @@ def _object_hook(o: typing.Any) -> typing.Any:
     return o
 
 
-decode = JSONDecoder(object_hook=_object_hook).decode
+_decode_json = JSONDecoder(object_hook=_object_hook).decode
+_digits_to_zero = bytes.maketrans(b"123456789", b"000000000")
+_long_integer = b"0" * 19
+
+
+def _decode_orjson(data: str) -> typing.Any:
+    # only objects carrying a "class" key need the object hook, which orjson does not have
+    if '"class"' in data:
+        return _decode_json(data)
+    encoded = data.encode()
+    # orjson turns integers beyond 64 bits into floats, so leave long runs of digits to the json module as well
+    if _long_integer in encoded.translate(_digits_to_zero):
+        return _decode_json(data)
+    try:
+        return orjson.loads(encoded)
+    except orjson.JSONDecodeError:  # such as NaN, which the json module accepts
+        return _decode_json(data)
+
+
+decode: typing.Callable[[str], typing.Any] = _decode_orjson if orjson else _decode_json
+"""Decodes a JSON string of the network protocol, restoring allowed classes from objects with a "class" key."""
 
 
 class Endpoint:
@@ -474,6 +536,15 @@ class _LocationStore(dict, typing.MutableMapping[int, typing.Dict[int, typing.Tu
                         location_id not in checked])
 
 
+def get_sphere_index(spheres: typing.Iterable[typing.Mapping[int, typing.Collection[int]]]
+                     ) -> typing.Dict[typing.Tuple[int, int], int]:
+    """Maps (player, location_id) to the index of the sphere containing that location, from multidata spheres."""
+    return {(player, location_id): sphere_index
+            for sphere_index, sphere in enumerate(spheres)
+            for player, location_ids in sphere.items()
+            for location_id in location_ids}
+
+
 class MinimumVersions(typing.TypedDict):
     server: tuple[int, int, int]
     clients: dict[int, tuple[int, int, int]]
@@ -0,0 +1,215 @@
+"""
+Optional profiling of generation, enabled with `Generate.py --profile_report <path>`. It writes a JSON report of the
+wall time and change in traced memory per stage, per world type and per player, and of the slowest access rules.
+"""
+from __future__ import annotations
+
+import contextlib
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, ContextManager, Iterator, TYPE_CHECKING
+
+from BaseClasses import CollectionState, Entrance, Location
+
+if TYPE_CHECKING:
+    from BaseClasses import MultiWorld
+
+__all__ = ["CallTimings", "GenerationProfile", "add_calls", "collect_calls", "profile_call", "profile_stage"]
+
+active_profile: GenerationProfile | None = None
+"""The profile that is currently being recorded, if any."""
+
+
+class Timing:
+    """Accumulated wall time and change in traced memory of calls to the same thing."""
+    __slots__ = ("calls", "time", "memory_change")
+
+    calls: int
+    time: float
+    memory_change: int
+    """Net change in memory traced by tracemalloc, so memory freed during the call is subtracted."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.time = 0.0
+        self.memory_change = 0
+
+    def add(self, other: Timing) -> None:
+        self.calls += other.calls
+        self.time += other.time
+        self.memory_change += other.memory_change
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"calls": self.calls, "time": self.time, "memory_change": self.memory_change}
+
+
+class CallTimings:
+    """Timings of World method calls made in a worker process, to be added to the profile of the generator."""
+    __slots__ = ("world_types", "players")
+
+    world_types: dict[str, dict[str, Timing]]
+    players: dict[int, dict[str, Timing]]
+
+    def __init__(self) -> None:
+        self.world_types = {}
+        self.players = {}
+
+
+@contextlib.contextmanager
+def _measure(*timings: Timing) -> Iterator[None]:
+    memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        taken = time.perf_counter() - start
+        memory_change = tracemalloc.get_traced_memory()[0] - memory
+        for timing in timings:
+            timing.calls += 1
+            timing.time += taken
+            timing.memory_change += memory_change
+
+
+class GenerationProfile:
+    """
+    Records where generation spends its time while enabled.
+    Calls running in parallel, like generate_output, are measured independently, so their memory changes overlap.
+    Calls made in worker processes are only included once the generator adds them with add_calls.
+    """
+    rule_count: int
+    """Amount of the slowest access rules to include in the report."""
+    total: Timing
+    stages: dict[str, Timing]
+    world_types: dict[str, dict[str, Timing]]
+    """Timings of each World method by game."""
+    players: dict[int, dict[str, Timing]]
+    """Timings of each World method by player."""
+    rules: dict[Location | Entrance, list[int | float]]
+    """Amount of calls and time spent in the access rule of each location and entrance."""
+
+    def __init__(self, rule_count: int = 50) -> None:
+        self.rule_count = rule_count
+        self.total = Timing()
+        self.stages = {}
+        self.world_types = {}
+        self.players = {}
+        self.rules = {}
+
+    @contextlib.contextmanager
+    def enable(self) -> Iterator[GenerationProfile]:
+        """Records the generation happening within the context into this profile."""
+        global active_profile
+        assert active_profile is None, "Only one generation can be profiled at a time."
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        location_can_reach, entrance_can_reach = Location.can_reach, Entrance.can_reach
+        Location.can_reach = self._profile_rule(location_can_reach)
+        Entrance.can_reach = self._profile_rule(entrance_can_reach)
+        active_profile = self
+        try:
+            with _measure(self.total):
+                yield self
+        finally:
+            active_profile = None
+            Location.can_reach, Entrance.can_reach = location_can_reach, entrance_can_reach
+            if started_tracing:
+                tracemalloc.stop()
+
+    def _profile_rule(self, can_reach: Callable[[Any, CollectionState], bool]) \
+            -> Callable[[Any, CollectionState], bool]:
+        rules = self.rules
+
+        def profiled_can_reach(spot: Location | Entrance, state: CollectionState) -> bool:
+            # reach the parent region first, so updating region reachability isn't counted towards the access rule
+            if spot.parent_region and not spot.parent_region.can_reach(state):
+                return False
+            start = time.perf_counter()
+            reachable = can_reach(spot, state)
+            taken = time.perf_counter() - start
+            entry = rules.get(spot, None)
+            if entry is None:
+                rules[spot] = [1, taken]
+            else:
+                entry[0] += 1
+                entry[1] += taken
+            return reachable
+
+        return profiled_can_reach
+
+    def as_dict(self, multiworld: MultiWorld | None = None) -> dict[str, Any]:
+        def timings_as_dict(timings: dict[str, Timing]) -> dict[str, Any]:
+            return {name: timing.as_dict() for name, timing in timings.items()}
+
+        def world_as_dict(methods: dict[str, Timing]) -> dict[str, Any]:
+            return {"time": sum(timing.time for timing in methods.values()),
+                    "memory_change": sum(timing.memory_change for timing in methods.values()),
+                    "methods": timings_as_dict(methods)}
+
+        slowest_rules = sorted(self.rules.items(), key=lambda rule: rule[1][1], reverse=True)[:self.rule_count]
+        report: dict[str, Any] = {
+            "seed": multiworld.seed_name if multiworld else None,
+            "total": self.total.as_dict(),
+            "stages": timings_as_dict(self.stages),
+            "world_types": {game: world_as_dict(methods) for game, methods in self.world_types.items()},
+            "players": {player: {"name": multiworld.player_name[player] if multiworld else None,
+                                 "game": multiworld.game[player] if multiworld else None,
+                                 **world_as_dict(methods)}
+                        for player, methods in sorted(self.players.items())},
+            "slowest_rules": [{"type": type(spot).__name__, "name": spot.name, "player": spot.player,
+                               "calls": calls, "time": taken}
+                              for spot, (calls, taken) in slowest_rules],
+        }
+        return report
+
+    def write(self, path: str, multiworld: MultiWorld | None = None) -> None:
+        with open(path, "w") as f:
+            json.dump(self.as_dict(multiworld), f, indent=2)
+
+
+def profile_stage(name: str) -> ContextManager[None]:
+    """Measures the context as the named stage of generation, if profiling."""
+    if active_profile is None:
+        return contextlib.nullcontext()
+    return _measure(active_profile.stages.setdefault(name, Timing()))
+
+
+def profile_call(game: str, method_name: str, player: int | None = None) -> ContextManager[None]:
+    """Measures the context as a call of a World method of the game, if profiling."""
+    if active_profile is None:
+        return contextlib.nullcontext()
+    timings = [active_profile.world_types.setdefault(game, {}).setdefault(method_name, Timing())]
+    if player:
+        timings.append(active_profile.players.setdefault(player, {}).setdefault(method_name, Timing()))
+    return _measure(*timings)
+
+
+@contextlib.contextmanager
+def collect_calls() -> Iterator[CallTimings | None]:
+    """
+    Measures World method calls within the context separately from the inherited profile, if profiling.
+    Used in forked worker processes, which return the CallTimings to the generator.
+    """
+    if active_profile is None:
+        yield None
+        return
+    calls = CallTimings()
+    world_types, players = active_profile.world_types, active_profile.players
+    active_profile.world_types, active_profile.players = calls.world_types, calls.players
+    try:
+        yield calls
+    finally:
+        active_profile.world_types, active_profile.players = world_types, players
+
+
+def add_calls(calls: CallTimings | None) -> None:
+    """Adds the timings of World method calls made in a worker process to the profile, if profiling."""
+    if active_profile is None or calls is None:
+        return
+    for profile_timings, worker_timings in ((active_profile.world_types, calls.world_types),
+                                            (active_profile.players, calls.players)):
+        for key, methods in worker_timings.items():
+            timings = profile_timings.setdefault(key, {})
+            for method_name, timing in methods.items():
+                timings.setdefault(method_name, Timing()).add(timing)
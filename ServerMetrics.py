@@ -0,0 +1,246 @@
+"""
+Optional runtime metrics of MultiServer rooms, served in the Prometheus text format.
+Enabled with `MultiServer.py --metrics_port <port>`, or for each room hoster process of the WebHost with METRICS_PORT.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import collections
+import http.server
+import threading
+import time
+import weakref
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from MultiServer import Context
+
+__all__ = ["Histogram", "RoomMetrics", "ServerMetrics"]
+
+
+class Histogram:
+    """Counts of observed values in cumulative buckets, like a Prometheus histogram."""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    buckets: Sequence[float]
+    """Upper bounds of the buckets, in ascending order."""
+    counts: List[int]
+    sum: float
+    count: int
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+client_cmds = frozenset(("Connect", "ConnectUpdate", "Sync", "LocationChecks", "LocationScouts", "CreateHints",
+                         "UpdateHint", "StatusUpdate", "Say", "GetDataPackage", "Bounce", "Get", "Set", "SetNotify"))
+"""Packets clients can send, others are counted as "unknown" so clients can't create arbitrary labels."""
+
+time_buckets = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+"""Buckets of durations in seconds."""
+
+
+class RoomMetrics:
+    """Metrics of a single room, recorded by its Context."""
+    messages_received: collections.Counter[str]
+    """Received packets by cmd."""
+    messages_sent: collections.Counter[str]
+    """Sent packets by cmd, counted once for each client they are sent to."""
+    bytes_sent: int
+    """Size of sent packets before compression, counted once for each client they are sent to."""
+    encode_time: Histogram
+    save_time: Histogram
+    save_size: int
+    """Size of the most recent save or save journal record."""
+    hint_rechecks: int
+
+    def __init__(self) -> None:
+        self.messages_received = collections.Counter()
+        self.messages_sent = collections.Counter()
+        self.bytes_sent = 0
+        self.encode_time = Histogram(time_buckets)
+        self.save_time = Histogram(time_buckets)
+        self.save_size = 0
+        self.hint_rechecks = 0
+
+    def count_received(self, cmd: object) -> None:
+        self.messages_received[cmd if isinstance(cmd, str) and cmd in client_cmds else "unknown"] += 1
+
+    def count_sent(self, data: str, recipients: int, cmds: Iterable[str]) -> None:
+        self.bytes_sent += len(data) * recipients
+        for cmd in cmds:
+            self.messages_sent[cmd] += recipients
+
+    def observe_save(self, duration: float, size: int) -> None:
+        self.save_time.observe(duration)
+        self.save_size = size
+
+
+def get_resident_memory() -> Optional[int]:
+    """Current resident memory of this process in bytes, if it can be determined on this platform."""
+    try:
+        import psutil
+    except ImportError:
+        try:
+            import os
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, AttributeError):
+            return None
+    return psutil.Process().memory_info().rss
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+class _MetricWriter:
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+
+    def header(self, name: str, metric_type: str, description: str) -> None:
+        self.lines.append(f"# HELP {name} {description}")
+        self.lines.append(f"# TYPE {name} {metric_type}")
+
+    def sample(self, name: str, labels: Dict[str, str], value: float) -> None:
+        self.lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    def histogram(self, name: str, labels: Dict[str, str], histogram: Histogram) -> None:
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            self.sample(f"{name}_bucket", {**labels, "le": str(bound)}, cumulative)
+        self.sample(f"{name}_bucket", {**labels, "le": "+Inf"}, histogram.count)
+        self.sample(f"{name}_sum", labels, histogram.sum)
+        self.sample(f"{name}_count", labels, histogram.count)
+
+
+class ServerMetrics:
+    """Metrics of all rooms running on an event loop, and of the loop and process itself."""
+    rooms: weakref.WeakValueDictionary[str, Context]
+    loop_lag: Histogram
+    """How much later than scheduled the event loop runs callbacks, indicating how busy it is."""
+    loop: Optional[asyncio.AbstractEventLoop]
+
+    def __init__(self) -> None:
+        self.rooms = weakref.WeakValueDictionary()
+        self.loop_lag = Histogram(time_buckets)
+        self.loop = None
+
+    def add_room(self, name: str, ctx: Context) -> None:
+        """Enables recording metrics of a room, which are reported until the Context is deleted."""
+        ctx.metrics = RoomMetrics()
+        self.rooms[name] = ctx
+
+    async def monitor_loop_lag(self, interval: float = 1.0) -> None:
+        """Measures the lag of the running event loop until cancelled."""
+        self.loop = asyncio.get_running_loop()
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.observe(max(0.0, time.perf_counter() - start - interval))
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text format. Not thread-safe, so run it on the rooms' event loop."""
+        writer = _MetricWriter()
+        rooms: List[Tuple[Dict[str, str], Context]] = [({"room": name}, ctx) for name, ctx in list(self.rooms.items())
+                                                       if ctx.metrics]
+
+        def room_samples(name: str, metric_type: str, description: str) -> Iterator[Tuple[Dict[str, str], Context]]:
+            writer.header(name, metric_type, description)
+            yield from rooms
+
+        for labels, ctx in room_samples("archipelago_room_connected_clients", "gauge",
+                                        "Authenticated clients connected to the room."):
+            writer.sample("archipelago_room_connected_clients", labels,
+                          sum(len(clients) for team in ctx.clients.values() for clients in team.values()))
+        for labels, ctx in room_samples("archipelago_room_messages_received_total", "counter",
+                                        "Packets received by the room by cmd."):
+            for cmd, count in sorted(ctx.metrics.messages_received.items()):
+                writer.sample("archipelago_room_messages_received_total", {**labels, "cmd": cmd}, count)
+        for labels, ctx in room_samples("archipelago_room_messages_sent_total", "counter",
+                                        "Packets sent by the room by cmd, once per receiving client."):
+            for cmd, count in sorted(ctx.metrics.messages_sent.items()):
+                writer.sample("archipelago_room_messages_sent_total", {**labels, "cmd": cmd}, count)
+        for labels, ctx in room_samples("archipelago_room_sent_bytes_total", "counter",
+                                        "Size of packets sent by the room before compression."):
+            writer.sample("archipelago_room_sent_bytes_total", labels, ctx.metrics.bytes_sent)
+        for labels, ctx in room_samples("archipelago_room_encode_seconds", "histogram",
+                                        "Time spent encoding packets."):
+            writer.histogram("archipelago_room_encode_seconds", labels, ctx.metrics.encode_time)
+        for labels, ctx in room_samples("archipelago_room_save_seconds", "histogram",
+                                        "Time spent saving the room."):
+            writer.histogram("archipelago_room_save_seconds", labels, ctx.metrics.save_time)
+        for labels, ctx in room_samples("archipelago_room_save_size_bytes", "gauge",
+                                        "Size of the most recent save of the room."):
+            writer.sample("archipelago_room_save_size_bytes", labels, ctx.metrics.save_size)
+        for labels, ctx in room_samples("archipelago_room_hint_rechecks_total", "counter",
+                                        "Times the hints of a slot or team were rechecked."):
+            writer.sample("archipelago_room_hint_rechecks_total", labels, ctx.metrics.hint_rechecks)
+
+        writer.header("archipelago_rooms", "gauge", "Rooms hosted by this process.")
+        writer.sample("archipelago_rooms", {}, len(rooms))
+        writer.header("archipelago_event_loop_lag_seconds", "histogram",
+                      "How much later than scheduled the event loop ran a callback.")
+        writer.histogram("archipelago_event_loop_lag_seconds", {}, self.loop_lag)
+        resident_memory = get_resident_memory()
+        if resident_memory is not None:
+            writer.header("archipelago_process_resident_memory_bytes", "gauge", "Resident memory of this process.")
+            writer.sample("archipelago_process_resident_memory_bytes", {}, resident_memory)
+        writer.lines.append("")
+        return "\n".join(writer.lines)
+
+    def start_http_server(self, port: int, host: str = "127.0.0.1") -> http.server.ThreadingHTTPServer:
+        """
+        Serves the metrics on a thread, rendering them on the event loop of monitor_loop_lag,
+        which has to be running.
+        """
+        metrics = self
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                if not metrics.loop:
+                    self.send_error(503, "Event loop is not running")
+                    return
+
+                async def render() -> str:
+                    return metrics.render()
+
+                try:
+                    body = asyncio.run_coroutine_threadsafe(render(), metrics.loop).result(10).encode()
+                except TimeoutError:
+                    self.send_error(503, "Event loop did not respond")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass  # scrapes would flood the log
+
+        http_server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+        http_server.daemon_threads = True
+        threading.Thread(target=http_server.serve_forever, name="ServerMetrics", daemon=True).start()
+        return http_server
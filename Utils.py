@@ -524,6 +524,21 @@ class KeyedDefaultDict(collections.defaultdict):
         return value
 
 
+class KeyedDefaultLookup(dict):
+    """dict variant that returns default_factory(key) for missing keys without storing it, so it can be shared"""
+    __slots__ = ("default_factory",)
+    default_factory: typing.Callable[[typing.Any], typing.Any]
+
+    def __init__(self,
+                 default_factory: typing.Callable[[Any], Any],
+                 seq: typing.Union[typing.Mapping, typing.Iterable] = ()):
+        super().__init__(seq)
+        self.default_factory = default_factory
+
+    def __missing__(self, key):
+        return self.default_factory(key)
+
+
 def get_text_between(text: str, start: str, end: str) -> str:
     return text[text.index(start) + len(start): text.rindex(end)]
 
@@ -25,7 +25,14 @@ app.jinja_env.filters['get_file_safe_name'] = get_file_safe_name
 
 app.config["SELFHOST"] = True  # application process is in charge of running the websites
 app.config["GENERATORS"] = 8  # maximum concurrent world gens
+app.config["LARGE_GENERATORS"] = 0  # maximum concurrent world gens estimated to be large, if 0 half of GENERATORS
 app.config["HOSTERS"] = 8  # maximum concurrent room hosters
+app.config["METRICS_PORT"] = 0  # if set, each room hoster serves metrics on localhost at this port plus its index
+# if set, room hosters unload rooms without connections while using more memory than this, in bytes
+app.config["HOSTER_MEMORY_LIMIT"] = 0
+# decoded multidata of this many seeds, up to this many bytes of stored multidata, is kept for their trackers
+app.config["TRACKER_SEED_CACHE_SIZE"] = 8
+app.config["TRACKER_SEED_CACHE_BYTES"] = 16 * 1024 * 1024
 app.config["SELFLAUNCH"] = True  # application process is in charge of launching Rooms.
 app.config["SELFLAUNCHCERT"] = None  # can point to a SSL Certificate to encrypt Room websocket connections
 app.config["SELFLAUNCHKEY"] = None  # can point to a SSL Certificate Key to encrypt Room websocket connections
@@ -3,7 +3,7 @@ from uuid import UUID
 
 from flask import request, session, url_for
 from markupsafe import Markup
-from pony.orm import commit
+from pony.orm import commit, count
 
 from Utils import restricted_dumps
 from WebHostLib import app
@@ -82,4 +82,12 @@ def wait_seed_api(seed: UUID):
         return {"text": "Generation not found"}, 404
     elif generation.state == STATE_ERROR:
         return {"text": "Generation failed"}, 500
+    elif generation.state == STATE_QUEUED:
+        status = {"text": "Generation running",
+                  "queue_length": count(queued for queued in Generation if queued.state == STATE_QUEUED)}
+        queue = json.loads(generation.meta).get("queue")
+        if queue:
+            status["queue_position"] = queue["position"]
+            status["expected_wait"] = queue["expected_wait"]
+        return status, 202
     return {"text": "Generation running"}, 202
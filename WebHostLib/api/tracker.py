@@ -1,14 +1,14 @@
-from datetime import datetime, timezone
+from datetime import datetime
 from typing import Any, TypedDict
 from uuid import UUID
 
-from flask import abort
+from flask import Response, abort, jsonify, request
 
 from NetUtils import ClientStatus, Hint, NetworkItem, SlotType
 from WebHostLib import cache
 from WebHostLib.api import api_endpoints
 from WebHostLib.models import Room
-from WebHostLib.tracker import TrackerData
+from WebHostLib.tracker import TrackerData, TeamPlayer
 
 
 class PlayerAlias(TypedDict):
@@ -23,6 +23,13 @@ class PlayerItemsReceived(TypedDict):
     items: list[NetworkItem]
 
 
+class PlayerItemsReceivedSince(TypedDict):
+    team: int
+    player: int
+    index: int
+    items: list[NetworkItem]
+
+
 class PlayerChecksDone(TypedDict):
     team: int
     player: int
@@ -65,11 +72,45 @@ class PlayerGame(TypedDict):
 
 
 @api_endpoints.route("/tracker/<suuid:tracker>")
-@cache.memoize(timeout=60)
-def tracker_data(tracker: UUID) -> dict[str, Any]:
+def tracker_data(tracker: UUID) -> Response:
     """
     Outputs json data to <root_path>/api/tracker/<id of current session tracker>.
+    The room's revision is used as ETag, so requests with If-None-Match get 304 Not Modified until the room saves.
 
+    :param tracker: UUID of current session tracker.
+    :query since: Revision of a previous response. If given, only what changed since then is returned, if known.
+
+    :return: Tracking data for all players in the room, or what changed since the revision given by `since`.
+    """
+    since = request.args.get("since", type=int)
+    if since is None:
+        data = get_tracker_data(tracker)
+    else:
+        data = get_tracker_changes(tracker, since)
+    response = jsonify(data)
+    response.set_etag(str(data["revision"]))
+    return response.make_conditional(request)
+
+
+def get_hints(tracker_data: TrackerData) -> list[PlayerHints]:
+    """Retrieves the hints of each slot, including the hints of the groups players are a member of."""
+    hints: list[PlayerHints] = []
+    for team, players in tracker_data.get_all_slots().items():
+        for player in players:
+            player_hints = sorted(tracker_data.get_player_hints(team, player))
+            hints.append({"team": team, "player": player, "hints": player_hints})
+            slot_info = tracker_data.get_slot_info(player)
+            # this assumes groups are always after players
+            if slot_info.type != SlotType.group:
+                continue
+            for member in slot_info.group_members:
+                hints[member - 1]["hints"] += player_hints
+    return hints
+
+
+@cache.memoize(timeout=60)
+def get_tracker_data(tracker: UUID) -> dict[str, Any]:
+    """
     :param tracker: UUID of current session tracker.
 
     :return: Tracking data for all players in the room. Typing and docstrings describe the format of each value.
@@ -110,43 +151,22 @@ def tracker_data(tracker: UUID) -> dict[str, Any]:
     ]
     """Total number of locations checked for the entire multiworld per team."""
 
-    hints: list[PlayerHints] = []
+    hints: list[PlayerHints] = get_hints(tracker_data)
     """Hints that all players have used or received."""
-    for team, players in tracker_data.get_all_slots().items():
-        for player in players:
-            player_hints = sorted(tracker_data.get_player_hints(team, player))
-            hints.append({"team": team, "player": player, "hints": player_hints})
-            slot_info = tracker_data.get_slot_info(player)
-            # this assumes groups are always after players
-            if slot_info.type != SlotType.group:
-                continue
-            for member in slot_info.group_members:
-                hints[member - 1]["hints"] += player_hints
 
     activity_timers: list[PlayerTimer] = []
     """Time of last activity per player. Returned as RFC 1123 format and null if no connection has been made."""
+    activity_times = tracker_data.get_room_activity_times()
     for team, players in all_players.items():
         for player in players:
-            activity_timers.append({"team": team, "player": player, "time": None})
-
-    for (team, player), timestamp in tracker_data._multisave.get("client_activity_timers", []):
-        for entry in activity_timers:
-            if entry["team"] == team and entry["player"] == player:
-                entry["time"] = datetime.fromtimestamp(timestamp, timezone.utc)
-                break
+            activity_timers.append({"team": team, "player": player, "time": activity_times.get((team, player))})
 
     connection_timers: list[PlayerTimer] = []
     """Time of last connection per player. Returned as RFC 1123 format and null if no connection has been made."""
+    connection_times = tracker_data.get_room_connection_times()
     for team, players in all_players.items():
         for player in players:
-            connection_timers.append({"team": team, "player": player, "time": None})
-
-    for (team, player), timestamp in tracker_data._multisave.get("client_connection_timers", []):
-        # find the matching entry
-        for entry in connection_timers:
-            if entry["team"] == team and entry["player"] == player:
-                entry["time"] = datetime.fromtimestamp(timestamp, timezone.utc)
-                break
+            connection_timers.append({"team": team, "player": player, "time": connection_times.get((team, player))})
 
     player_status: list[PlayerStatus] = []
     """The current client status for each player."""
@@ -156,6 +176,90 @@ def tracker_data(tracker: UUID) -> dict[str, Any]:
                 {"team": team, "player": player, "status": tracker_data.get_player_client_status(team, player)})
 
     return {
+        "revision": tracker_data.get_room_revision(),
+        "aliases": player_aliases,
+        "player_items_received": player_items_received,
+        "player_checks_done": player_checks_done,
+        "total_checks_done": total_checks_done,
+        "hints": hints,
+        "activity_timers": activity_timers,
+        "connection_timers": connection_timers,
+        "player_status": player_status,
+    }
+
+
+def get_tracker_changes(tracker: UUID, since: int) -> dict[str, Any]:
+    """
+    :param tracker: UUID of current session tracker.
+    :param since: Revision of the room to return the changes since.
+
+    :return: Tracking data of the players that changed since the revision, in the format of get_tracker_data.
+        Falls back to all tracking data if the changes since then are not known.
+    """
+    room: Room | None = Room.get(tracker=tracker)
+    if not room:
+        abort(404)
+
+    tracker_data = TrackerData(room)
+    changes = tracker_data.get_room_changes_since(since)
+    if changes is None:
+        return get_tracker_data(tracker)
+
+    all_players: list[TeamPlayer] = [(team, player) for team, players in tracker_data.get_all_players().items()
+                                     for player in players]
+    changed_players = set(changes.changed_players)
+    for team, player in list(changed_players):
+        # members show the hints of their groups
+        slot_info = tracker_data.get_slot_info(player)
+        if slot_info.type == SlotType.group:
+            changed_players.update((team, member) for member in slot_info.group_members)
+
+    player_aliases: list[PlayerAlias] = [
+        {"team": team, "player": player, "alias": tracker_data.get_player_alias(team, player)}
+        for team, player in all_players if (team, player) in changed_players
+    ]
+
+    player_items_received: list[PlayerItemsReceivedSince] = []
+    """Items received by each player since the revision, starting at index of their received items."""
+    for team, player in all_players:
+        index = changes.received_items_counts.get((team, player), 0)
+        items = tracker_data.get_player_received_items(team, player)
+        if len(items) > index:
+            player_items_received.append({"team": team, "player": player, "index": index, "items": items[index:]})
+
+    player_checks_done: list[PlayerChecksDone] = [
+        {"team": team, "player": player, "locations": sorted(changes.new_checks[team, player])}
+        for team, player in all_players if (team, player) in changes.new_checks
+    ]
+    """ID of the locations checked by each player since the revision."""
+
+    total_checks_done: list[TeamTotalChecks] = [
+        {"team": team, "checks_done": checks_done}
+        for team, checks_done in tracker_data.get_team_locations_checked_count().items()
+    ]
+
+    hints: list[PlayerHints] = [player_hints for player_hints in get_hints(tracker_data)
+                                if (player_hints["team"], player_hints["player"]) in changed_players]
+
+    activity_times = tracker_data.get_room_activity_times()
+    activity_timers: list[PlayerTimer] = [
+        {"team": team, "player": player, "time": activity_times.get((team, player))}
+        for team, player in all_players if (team, player) in changed_players
+    ]
+    connection_times = tracker_data.get_room_connection_times()
+    connection_timers: list[PlayerTimer] = [
+        {"team": team, "player": player, "time": connection_times.get((team, player))}
+        for team, player in all_players if (team, player) in changed_players
+    ]
+
+    player_status: list[PlayerStatus] = [
+        {"team": team, "player": player, "status": tracker_data.get_player_client_status(team, player)}
+        for team, player in all_players if (team, player) in changed_players
+    ]
+
+    return {
+        "revision": tracker_data.get_room_revision(),
+        "since": changes.revision,
         "aliases": player_aliases,
         "player_items_received": player_items_received,
         "player_checks_done": player_checks_done,
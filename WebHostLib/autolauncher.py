@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import functools
 import json
 import logging
 import multiprocessing
+import time
 import typing
 from datetime import timedelta, datetime
 from threading import Event, Thread
@@ -13,6 +15,15 @@ from pony.orm import db_session, select, commit, PrimaryKey
 
 from Utils import restricted_loads
 from .locker import Locker, AlreadyRunningException
+from .notify import RoomNotifications
+from .scheduler import GenerationScheduler, QueueStatus
+
+ROOM_POLL_INTERVAL = 5.0
+"""Seconds between polls of the database for rooms to start, if autohost can receive notifications."""
+QUEUE_STATUS_INTERVAL = 5.0
+"""Seconds between updates of the queue status of queued generations, while the queue doesn't change."""
+QUEUE_STATUS_TOLERANCE = 10.0
+"""Seconds the expected wait of a queued generation has to change by to update its queue status."""
 
 _stop_event = Event()
 
@@ -52,11 +63,32 @@ def _mp_gen_game(
         setproctitle(f"Generator (idle)")
 
 
-def launch_generator(pool: multiprocessing.pool.Pool, generation: Generation, timeout: int|None) -> None:
+def handle_scheduled_success(scheduler: GenerationScheduler, generation_id: UUID, seed_id) -> None:
+    # generations that timed out finish without a seed
+    scheduler.finish(generation_id, seed_id is not None)
+    handle_generation_success(seed_id)
+
+
+def handle_scheduled_failure(scheduler: GenerationScheduler, generation_id: UUID, result: BaseException) -> None:
+    scheduler.finish(generation_id, False)
+    handle_generation_failure(result)
+
+
+def launch_generator(pool: multiprocessing.pool.Pool, generation: Generation, timeout: int|None,
+                     scheduler: GenerationScheduler | None = None) -> None:
     try:
         meta = json.loads(generation.meta)
+        if "queue" in meta:
+            del meta["queue"]
+            generation.meta = json.dumps(meta)
         options = restricted_loads(generation.options)
         logging.info(f"Generating {generation.id} for {len(options)} players")
+        if scheduler:
+            callback = functools.partial(handle_scheduled_success, scheduler, generation.id)
+            error_callback = functools.partial(handle_scheduled_failure, scheduler, generation.id)
+        else:
+            callback = handle_generation_success
+            error_callback = handle_generation_failure
         pool.apply_async(
             _mp_gen_game,
             (options,),
@@ -66,10 +98,12 @@ def launch_generator(pool: multiprocessing.pool.Pool, generation: Generation, ti
                 "owner": generation.owner,
                 "timeout": timeout,
             },
-            handle_generation_success,
-            handle_generation_failure,
+            callback,
+            error_callback,
         )
     except Exception as e:
+        if scheduler:
+            scheduler.finish(generation.id, False)
         generation.state = STATE_ERROR
         commit()
         logging.exception(e)
@@ -77,6 +111,35 @@ def launch_generator(pool: multiprocessing.pool.Pool, generation: Generation, ti
         generation.state = STATE_STARTED
 
 
+def get_generation_games(generation: Generation) -> typing.List[str]:
+    """Returns the game of each player of a generation."""
+    options = restricted_loads(generation.options)
+    return [str(player_options.get("game")) for player_options in options.values()]
+
+
+def update_queue_status(scheduler: GenerationScheduler,
+                        published: typing.Dict[UUID, QueueStatus]) -> None:
+    """
+    Stores where queued generations are in the queue in their meta, for the status api.
+    Only writes generations whose position changed or whose expected wait moved noticeably since last published.
+    """
+    queue_status = scheduler.get_queue_status()
+    for generation_id in published.keys() - queue_status.keys():
+        del published[generation_id]
+    for generation_id, status in queue_status.items():
+        last_status = published.get(generation_id)
+        if last_status and last_status.position == status.position and \
+                abs(last_status.expected_wait - status.expected_wait) < QUEUE_STATUS_TOLERANCE:
+            continue
+        generation = Generation.get(id=generation_id)
+        if not generation or generation.state != STATE_QUEUED:
+            continue
+        meta = json.loads(generation.meta)
+        meta["queue"] = {"position": status.position, "expected_wait": round(status.expected_wait)}
+        generation.meta = json.dumps(meta)
+        published[generation_id] = status
+
+
 def init_generator(config: dict[str, Any]) -> None:
     from setproctitle import setproctitle
 
@@ -125,15 +188,47 @@ def autohost(config: dict):
                     hosters.append(hoster)
                     hoster.start()
 
-                while not stop_event.wait(0.1):
-                    with db_session:
-                        rooms = select(
-                            room for room in Room if
-                            room.last_activity >= datetime.utcnow() - timedelta(days=3))
-                        for room in rooms:
-                            # we have to filter twice, as the per-room timeout can't currently be PonyORM transpiled.
-                            if room.last_activity >= datetime.utcnow() - timedelta(seconds=room.timeout + 5):
-                                hosters[room.id.int % len(hosters)].start_room(room.id)
+                def start_active_room(room: Room) -> None:
+                    # we have to filter twice, as the per-room timeout can't currently be PonyORM transpiled.
+                    if room.last_activity >= datetime.utcnow() - timedelta(seconds=room.timeout + 5):
+                        hoster = get_hosting(hosters, room.id)
+                        if not hoster:
+                            hoster = min(hosters, key=MultiworldInstance.get_estimated_memory)
+                            hoster.start_room(room.id, estimate_room_memory(room))
+
+                with RoomNotifications() as notifications:
+                    # with notifications, polling only catches rooms that were changed without notifying
+                    poll_interval = ROOM_POLL_INTERVAL if notifications.listening else 0.1
+                    last_poll = 0.0
+                    while not stop_event.is_set():
+                        if notifications.listening:
+                            notified_room_ids = notifications.receive(min(1.0, poll_interval))
+                        else:
+                            stop_event.wait(poll_interval)
+                            notified_room_ids = set()
+
+                        for hoster in hosters:
+                            hoster.update()
+
+                        if notified_room_ids:
+                            with db_session:
+                                for room_id in notified_room_ids:
+                                    hoster = get_hosting(hosters, room_id)
+                                    if hoster:
+                                        hoster.notify_commands(room_id)
+                                    else:
+                                        room = Room.get(id=room_id)
+                                        if room:
+                                            start_active_room(room)
+
+                        if time.monotonic() - last_poll >= poll_interval:
+                            last_poll = time.monotonic()
+                            with db_session:
+                                rooms = select(
+                                    room for room in Room if
+                                    room.last_activity >= datetime.utcnow() - timedelta(days=3))
+                                for room in rooms:
+                                    start_active_room(room)
 
         except AlreadyRunningException:
             logging.info("Autohost reports as already running, not starting another.")
@@ -150,6 +245,8 @@ def autogen(config: dict):
                 with multiprocessing.Pool(config["GENERATORS"], initializer=init_generator,
                                           initargs=(config,), maxtasksperchild=10) as generator_pool:
                     job_time = config["JOB_TIME"]
+                    scheduler = GenerationScheduler(config["GENERATORS"], config.get("LARGE_GENERATORS"), job_time)
+                    published_status: typing.Dict[UUID, QueueStatus] = {}
                     with db_session:
                         to_start = select(generation for generation in Generation if generation.state == STATE_STARTED)
 
@@ -160,35 +257,92 @@ def autogen(config: dict):
                                 if sid:
                                     generation.delete()
                                 else:
-                                    launch_generator(generator_pool, generation, timeout=job_time)
+                                    # queue again, to be scheduled along with the others
+                                    generation.state = STATE_QUEUED
 
                             commit()
                         select(generation for generation in Generation if generation.state == STATE_ERROR).delete()
 
+                    last_status_update = 0.0
                     while not stop_event.wait(0.1):
                         with db_session:
-                            # for update locks the database row(s) during transaction, preventing writes from elsewhere
-                            to_start = select(
-                                generation for generation in Generation
-                                if generation.state == STATE_QUEUED).for_update()
-                            for generation in to_start:
-                                launch_generator(generator_pool, generation, timeout=job_time)
+                            queued_ids = set(select(
+                                generation.id for generation in Generation if generation.state == STATE_QUEUED))
+                            for generation_id in set(scheduler.queued) - queued_ids:
+                                scheduler.remove(generation_id)  # deleted while queued
+                            changed = False
+                            for generation_id in queued_ids:
+                                if generation_id in scheduler:
+                                    continue
+                                generation = Generation.get(id=generation_id)
+                                try:
+                                    games = get_generation_games(generation)
+                                except Exception as e:
+                                    generation.state = STATE_ERROR
+                                    logging.exception(e)
+                                else:
+                                    scheduler.add(generation.id, generation.owner, games)
+                                changed = True
+
+                            # only hand generations to the pool once a worker is free for them,
+                            # so later generations can still be scheduled ahead of them
+                            while job := scheduler.start_next():
+                                generation = Generation.get(id=job.id)
+                                if generation:
+                                    launch_generator(generator_pool, generation, timeout=job_time,
+                                                     scheduler=scheduler)
+                                else:
+                                    scheduler.finish(job.id, False)
+                                changed = True
+                            commit()
+
+                            if changed or time.monotonic() - last_status_update >= QUEUE_STATUS_INTERVAL:
+                                last_status_update = time.monotonic()
+                                update_queue_status(scheduler, published_status)
         except AlreadyRunningException:
             logging.info("Autogen reports as already running, not starting another.")
 
     Thread(target=keep_running, name="AP_Autogen").start()
 
 
+ROOM_MEMORY = 16 * 1024 * 1024
+SLOT_MEMORY = 256 * 1024
+"""Rough estimate of the memory a room uses, in bytes, until its hoster reports its memory with the room loaded."""
+
+
+def estimate_room_memory(room: Room) -> int:
+    return ROOM_MEMORY + SLOT_MEMORY * room.seed.slots.count()
+
+
+def get_hosting(hosters: typing.Iterable[MultiworldInstance], room_id) -> typing.Optional[MultiworldInstance]:
+    for hoster in hosters:
+        if room_id in hoster.room_ids:
+            return hoster
+    return None
+
+
 class MultiworldInstance():
+    room_ids: typing.Set[UUID]
+    room_memory: typing.Dict[UUID, int]
+    """Estimated memory of each room, for those that the last reported resident_memory doesn't include."""
+    resident_memory: typing.Optional[int]
+    """Last reported memory of the hosting process, if it can be determined on its platform."""
+
     def __init__(self, config: dict, id: int):
         self.room_ids = set()
+        self.room_memory = {}
+        self.resident_memory = None
         self.process: typing.Optional[multiprocessing.Process] = None
         self.ponyconfig = config["PONY"]
         self.cert = config["SELFLAUNCHCERT"]
         self.key = config["SELFLAUNCHKEY"]
         self.host = config["HOST_ADDRESS"]
+        self.metrics_port = config["METRICS_PORT"] + id if config.get("METRICS_PORT") else 0
         self.rooms_to_start = multiprocessing.Queue()
         self.rooms_shutting_down = multiprocessing.Queue()
+        self.rooms_with_commands = multiprocessing.Queue()
+        self.status = multiprocessing.Queue()
+        self.memory_limit = config.get("HOSTER_MEMORY_LIMIT", 0)
         self.name = f"MultiHoster{id}"
 
     def start(self):
@@ -198,20 +352,39 @@ class MultiworldInstance():
         process = multiprocessing.Process(group=None, target=run_server_process,
                                           args=(self.name, self.ponyconfig, get_static_server_data(),
                                                 self.cert, self.key, self.host,
-                                                self.rooms_to_start, self.rooms_shutting_down),
+                                                self.rooms_to_start, self.rooms_shutting_down, self.metrics_port,
+                                                self.rooms_with_commands, self.status, self.memory_limit),
                                           name=self.name)
         process.start()
         self.process = process
 
-    def start_room(self, room_id):
+    def update(self):
+        """Processes the rooms that were shut down and the status reports of the hosting process."""
         while not self.rooms_shutting_down.empty():
-            self.room_ids.remove(self.rooms_shutting_down.get(block=True, timeout=None))
+            room_id = self.rooms_shutting_down.get(block=True, timeout=None)
+            self.room_ids.remove(room_id)
+            self.room_memory.pop(room_id, None)
+        while not self.status.empty():
+            self.resident_memory, loaded_room_ids = self.status.get(block=True, timeout=None)
+            if self.resident_memory is not None:
+                for room_id in loaded_room_ids:
+                    self.room_memory.pop(room_id, None)
+
+    def get_estimated_memory(self) -> int:
+        return (self.resident_memory or 0) + sum(self.room_memory.values())
+
+    def start_room(self, room_id, estimated_memory: int = ROOM_MEMORY):
         if room_id in self.room_ids:
             pass  # should already be hosted currently.
         else:
             self.room_ids.add(room_id)
+            self.room_memory[room_id] = estimated_memory
             self.rooms_to_start.put(room_id)
 
+    def notify_commands(self, room_id):
+        """Has the hosting process deliver the commands of a room it hosts, instead of waiting for its next poll."""
+        self.rooms_with_commands.put(room_id)
+
     def stop(self):
         if self.process:
             self.process.terminate()
@@ -7,6 +7,7 @@ import functools
 import logging
 import multiprocessing
 import pickle
+import queue
 import random
 import socket
 import threading
@@ -23,11 +24,18 @@ from MultiServer import (
     Context, server, auto_shutdown, ServerCommandProcessor, ClientMessageProcessor, load_server_cert,
     server_per_message_deflate_factory,
 )
-from Utils import restricted_loads, cache_argsless
+from ServerMetrics import ServerMetrics, get_resident_memory
+from Utils import restricted_loads, cache_argsless, KeyedDefaultLookup
 from .locker import Locker
 from .models import Command, GameDataPackage, Room, db
 
 
+HOSTER_STATUS_INTERVAL = 10
+"""Seconds between reports of a room hoster's memory to autohost."""
+ROOM_UNLOAD_GRACE = datetime.timedelta(minutes=5)
+"""Time after starting during which a room is not shut down to free memory, so its players get to connect."""
+
+
 class CustomClientMessageProcessor(ClientMessageProcessor):
     ctx: WebHostContext
 
@@ -60,18 +68,57 @@ class DBCommandProcessor(ServerCommandProcessor):
         self.ctx.logger.info(text)
 
 
+class StaticGameNames(typing.NamedTuple):
+    item_names: KeyedDefaultLookup
+    location_names: KeyedDefaultLookup
+    all_item_and_group_names: typing.FrozenSet[str]
+    all_location_and_group_names: typing.FrozenSet[str]
+
+
+static_game_names: typing.Dict[str, StaticGameNames] = {}
+"""Name tables of the static data packages by game, built on first use and shared by all rooms of this process."""
+
+
+def get_static_game_names(game: str, static_server_data: dict) -> StaticGameNames:
+    names = static_game_names.get(game)
+    if names is None:
+        game_package = static_server_data["gamespackage"][game]
+        archipelago_package = static_server_data["gamespackage"]["Archipelago"]
+        item_names = {item_id: item_name for item_name, item_id in game_package["item_name_to_id"].items()}
+        location_names = {location_id: location_name
+                          for location_name, location_id in game_package["location_name_to_id"].items()}
+        if game != "Archipelago":
+            # Add Archipelago items and locations to each data package.
+            item_names.update((item_id, item_name)
+                              for item_name, item_id in archipelago_package["item_name_to_id"].items())
+            location_names.update((location_id, location_name)
+                                  for location_name, location_id in archipelago_package["location_name_to_id"].items())
+        names = static_game_names[game] = StaticGameNames(
+            # unlike KeyedDefaultDict, unknown ids are not stored, so one room's lookups don't grow another's table
+            KeyedDefaultLookup(lambda code: f"Unknown item (ID:{code})", item_names),
+            KeyedDefaultLookup(lambda code: f"Unknown location (ID:{code})", location_names),
+            frozenset(game_package["item_name_to_id"]).union(
+                static_server_data["item_name_groups"].get(game, ())),
+            frozenset(game_package["location_name_to_id"]).union(
+                static_server_data["location_name_groups"].get(game, ())),
+        )
+    return names
+
+
 class WebHostContext(Context):
     room_id: int
+    start_time: datetime.datetime
 
     def __init__(self, static_server_data: dict, logger: logging.Logger):
         # static server data is used during _load_game_data to load required data,
-        # without needing to import worlds system, which takes quite a bit of memory
+        # without needing to import worlds system, which takes quite a bit of memory,
+        # and during _init_game_data to share the name tables of static data packages
         self.static_server_data = static_server_data
         super(WebHostContext, self).__init__("", 0, "", "", 1,
                                              40, True, "enabled", "enabled",
                                              "enabled", 0, 2, logger=logger)
-        del self.static_server_data
         self.main_loop = asyncio.get_running_loop()
+        self.start_time = datetime.datetime.now(datetime.timezone.utc)
         self.video = {}
         self.tags = ["AP", "WebHost"]
 
@@ -89,19 +136,25 @@ class WebHostContext(Context):
             setattr(self, key, value)
         self.non_hintable_names = collections.defaultdict(frozenset, self.non_hintable_names)
 
-    def listen_to_db_commands(self):
-        cmdprocessor = DBCommandProcessor(self)
-
-        while not self.exit_event.is_set():
-            with db_session:
-                commands = select(command for command in Command if command.room.id == self.room_id)
-                if commands:
-                    for command in commands:
-                        self.main_loop.call_soon_threadsafe(cmdprocessor, command.commandtext)
-                        command.delete()
-                    commit()
-            del commands
-            time.sleep(5)
+    def _init_game_data(self):
+        static_gamespackage = self.static_server_data["gamespackage"]
+        if self.gamespackage.get("Archipelago") is not static_gamespackage.get("Archipelago"):
+            return super(WebHostContext, self)._init_game_data()
+        custom_games = []
+        for game_name, game_package in self.gamespackage.items():
+            if game_package and game_package is static_gamespackage.get(game_name):
+                # static data package, so the name tables can be shared instead of being built for each room
+                if "checksum" in game_package:
+                    self.checksums[game_name] = game_package["checksum"]
+                names = get_static_game_names(game_name, self.static_server_data)
+                self.item_names[game_name] = names.item_names
+                self.location_names[game_name] = names.location_names
+                self.all_item_and_group_names[game_name] = names.all_item_and_group_names
+                self.all_location_and_group_names[game_name] = names.all_location_and_group_names
+            else:
+                self._init_game(game_name, game_package)
+                custom_games.append(game_name)
+        self._add_archipelago_names(custom_games)
 
     @db_session
     def load(self, room_id: int):
@@ -158,13 +211,15 @@ class WebHostContext(Context):
                 if savegame_data:
                     self.set_save(restricted_loads(Room.get(id=self.room_id).multisave))
             self._start_async_saving(atexit_save=False)
-        threading.Thread(target=self.listen_to_db_commands, daemon=True).start()
 
     @db_session
     def _save(self, exit_save: bool = False) -> bool:
+        start = time.perf_counter()
         room = Room.get(id=self.room_id)
         # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
         room.multisave = pickle.dumps(self.get_save())
+        if self.metrics:
+            self.metrics.observe_save(time.perf_counter() - start, len(room.multisave))
         # saving only occurs on activity, so we can "abuse" this information to mark this as last_activity
         if not exit_save:  # we don't want to count a shutdown as activity, which would restart the server again
             room.last_activity = datetime.datetime.utcnow()
@@ -176,6 +231,89 @@ class WebHostContext(Context):
         return d
 
 
+class DBCommandListener(threading.Thread):
+    """
+    Delivers the commands from the database to the rooms of this process.
+    Rooms with new commands are announced through rooms_with_commands, and the commands of all rooms are polled for
+    in case a notification did not arrive.
+    """
+    poll_interval = 5
+    rooms: typing.Dict[typing.Any, WebHostContext]
+    rooms_with_commands: typing.Union[multiprocessing.Queue, queue.Queue]
+
+    def __init__(self, rooms_with_commands: typing.Optional[multiprocessing.Queue] = None):
+        super().__init__(name="DBCommandListener", daemon=True)
+        self.rooms = {}
+        self.rooms_lock = threading.Lock()
+        self.rooms_with_commands = rooms_with_commands if rooms_with_commands else queue.Queue()
+
+    def add_room(self, ctx: WebHostContext) -> None:
+        with self.rooms_lock:
+            self.rooms[ctx.room_id] = ctx
+        self.rooms_with_commands.put(ctx.room_id)  # commands may have been sent before the room started
+
+    def remove_room(self, room_id) -> None:
+        with self.rooms_lock:
+            self.rooms.pop(room_id, None)
+
+    def run(self) -> None:
+        last_poll = time.monotonic()
+        while True:
+            try:
+                room_ids = set()
+                try:
+                    room_ids.add(self.rooms_with_commands.get(timeout=self.poll_interval))
+                    while True:
+                        room_ids.add(self.rooms_with_commands.get_nowait())
+                except queue.Empty:
+                    pass
+                if time.monotonic() - last_poll >= self.poll_interval:
+                    last_poll = time.monotonic()
+                    with self.rooms_lock:
+                        room_ids.update(self.rooms)
+                if room_ids:
+                    self.deliver_commands(room_ids)
+            except Exception:
+                # the commands not delivered are kept in the database and picked up by the next poll
+                logging.exception("Failed to deliver commands to rooms.")
+
+    def deliver_commands(self, room_ids: typing.Iterable) -> None:
+        with self.rooms_lock:
+            rooms = {room_id: self.rooms[room_id] for room_id in room_ids if room_id in self.rooms}
+        if not rooms:
+            return
+        room_ids = tuple(rooms)
+        with db_session:
+            commands = select(command for command in Command if command.room.id in room_ids).order_by(Command.id)
+            for command in commands:
+                ctx = rooms[command.room.id]
+                try:
+                    ctx.main_loop.call_soon_threadsafe(DBCommandProcessor(ctx), command.commandtext)
+                except RuntimeError:
+                    # the room shut down meanwhile, it receives the command when it starts again
+                    continue
+                command.delete()
+            commit()
+
+
+def unload_idle_room(rooms: typing.Iterable[WebHostContext]) -> typing.Optional[WebHostContext]:
+    """Shuts down the least recently active room without connections, so its memory can be freed. Returns that room.
+    Rooms started within ROOM_UNLOAD_GRACE are kept, and starting counts as activity.
+    It saves when shutting down and is started again on its next activity, like after its inactivity timeout.
+    """
+    started_before = datetime.datetime.now(datetime.timezone.utc) - ROOM_UNLOAD_GRACE
+    idle_rooms = [ctx for ctx in rooms
+                  if not ctx.endpoints and not ctx.exit_event.is_set() and ctx.start_time < started_before]
+    if not idle_rooms:
+        return None
+    ctx = min(idle_rooms, key=lambda idle_ctx: max(idle_ctx.start_time, *idle_ctx.client_activity_timers.values()))
+    ctx.logger.info("Shutting down to free memory of the room hoster.")
+    if ctx.server:
+        ctx.server.ws_server.close()
+    ctx.exit_event.set()
+    return ctx
+
+
 def get_random_port():
     return random.randint(49152, 65535)
 
@@ -231,7 +369,9 @@ def set_up_logging(room_id) -> logging.Logger:
 
 def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                        cert_file: typing.Optional[str], cert_key_file: typing.Optional[str],
-                       host: str, rooms_to_run: multiprocessing.Queue, rooms_shutting_down: multiprocessing.Queue):
+                       host: str, rooms_to_run: multiprocessing.Queue, rooms_shutting_down: multiprocessing.Queue,
+                       metrics_port: int = 0, rooms_with_commands: typing.Optional[multiprocessing.Queue] = None,
+                       hoster_status: typing.Optional[multiprocessing.Queue] = None, memory_limit: int = 0):
     from setproctitle import setproctitle
 
     setproctitle(name)
@@ -276,13 +416,43 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
 
     loop = asyncio.get_event_loop()
 
+    metrics: typing.Optional[ServerMetrics] = None
+    if metrics_port:
+        # aggregates the metrics of all rooms of this process
+        metrics = ServerMetrics()
+        loop.create_task(metrics.monitor_loop_lag())
+        metrics.start_http_server(metrics_port)
+        logging.info(f"Serving metrics of {name} at http://127.0.0.1:{metrics_port}/metrics")
+
+    command_listener = DBCommandListener(rooms_with_commands)
+    command_listener.start()
+
+    hosted_rooms: typing.Dict[typing.Any, WebHostContext] = {}
+
+    async def monitor_memory():
+        # reports the memory used by this process to autohost for placing rooms, and frees memory if needed
+        while True:
+            resident_memory = get_resident_memory()
+            if hoster_status:
+                hoster_status.put((resident_memory, list(hosted_rooms)))
+            if memory_limit and resident_memory and resident_memory > memory_limit:
+                # one room at a time, as freed memory takes a while to show up, if it is returned to the system at all
+                unload_idle_room(hosted_rooms.values())
+            await asyncio.sleep(HOSTER_STATUS_INTERVAL)
+
+    loop.create_task(monitor_memory())
+
     async def start_room(room_id):
         with Locker(f"RoomLocker {room_id}"):
             try:
                 logger = set_up_logging(room_id)
                 ctx = WebHostContext(static_server_data, logger)
+                if metrics:
+                    metrics.add_room(str(room_id), ctx)
                 ctx.load(room_id)
                 ctx.init_save()
+                command_listener.add_room(ctx)
+                hosted_rooms[room_id] = ctx
                 assert ctx.server is None
                 try:
                     ctx.server = websockets.serve(
@@ -340,6 +510,8 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                     setattr(asyncio.current_task(), "save", None)
             finally:
                 try:
+                    command_listener.remove_room(room_id)
+                    hosted_rooms.pop(room_id, None)
                     ctx.save_dirty = False  # make sure the saving thread does not write to DB after final wakeup
                     ctx.exit_event.set()  # make sure the saving thread stops at some point
                     # NOTE: async saving should probably be an async task and could be merged with shutdown_task
@@ -12,6 +12,7 @@ from werkzeug.utils import secure_filename
 from worlds.AutoWorld import AutoWorldRegister, World
 from . import app, cache
 from .markdown import render_markdown
+from .notify import notify_room
 from .models import Seed, Room, Command, UUID, uuid4
 from Utils import title_sorted
 
@@ -170,6 +171,7 @@ def new_room(seed: UUID):
         abort(404)
     room = Room(seed=seed, owner=session["_id"], tracker=uuid4())
     commit()
+    notify_room(room.id)
     return redirect(url_for("host_room", room=room.id))
 
 
@@ -219,6 +221,7 @@ def host_room_command(room: UUID):
         if cmd:
             Command(room=room, commandtext=cmd)
             commit()
+            notify_room(room.id)
     return redirect(url_for("host_room", room=room.id))
 
 
@@ -237,6 +240,8 @@ def host_room(room: UUID):
         # we only set last_activity if needed, otherwise parallel access on /room will cause an internal server error
         # due to "pony.orm.core.OptimisticCheckError: Object Room was updated outside of current transaction"
         room.last_activity = now  # will trigger a spinup, if it's not already running
+        commit()
+        notify_room(room.id)
 
     browser_tokens = "Mozilla", "Chrome", "Safari"
     automated = ("update" in request.args
@@ -0,0 +1,83 @@
+"""
+Notifies autohost that a room has new commands or should be started, so it can act right away instead of on its next
+poll of the database. Uses a unix datagram socket, so on Windows autohost only polls.
+"""
+from __future__ import annotations
+
+import os
+import socket
+import sys
+import typing
+from uuid import UUID
+
+from .locker import CommonLocker
+
+socket_path = os.path.join(CommonLocker.lock_folder, "autohost.sock")
+supported = sys.platform != "win32"
+
+
+def notify_room(room_id: UUID) -> None:
+    """Notifies autohost, if it is listening. Failing is fine, as autohost polls as well."""
+    if not supported:
+        return
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as notification_socket:
+            notification_socket.sendto(room_id.bytes, socket_path)
+    except OSError:
+        pass
+
+
+class RoomNotifications:
+    """Receives the notifications of notify_room. Only one autohost may listen, which its Locker ensures."""
+    listening: bool
+    _socket: typing.Optional[socket.socket]
+
+    def __init__(self) -> None:
+        self._socket = None
+        self.listening = False
+        if not supported:
+            return
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+        try:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)  # left behind by an autohost that didn't shut down cleanly
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._socket.bind(socket_path)
+        except OSError:
+            if self._socket:
+                self._socket.close()
+                self._socket = None
+            return
+        self.listening = True
+
+    def receive(self, timeout: float) -> typing.Set[UUID]:
+        """Waits up to timeout seconds for notifications, then returns the rooms of all pending ones."""
+        room_ids: typing.Set[UUID] = set()
+        if not self._socket:
+            return room_ids
+        self._socket.settimeout(timeout)
+        try:
+            while True:
+                data = self._socket.recv(16)
+                if len(data) == 16:
+                    room_ids.add(UUID(bytes=data))
+                self._socket.settimeout(0)
+        except (BlockingIOError, socket.timeout):
+            pass
+        return room_ids
+
+    def close(self) -> None:
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+            try:
+                os.unlink(socket_path)
+            except OSError:
+                pass
+        self.listening = False
+
+    def __enter__(self) -> RoomNotifications:
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.close()
@@ -0,0 +1,166 @@
+"""
+Schedules the queued generations of autogen onto its generator processes.
+Generations are estimated by their players and games and queued as either small or large, where large generations
+can only use part of the generators, so small ones don't wait behind them. Within each, owners take turns.
+The durations of finished generations refine the estimates.
+"""
+from __future__ import annotations
+
+import collections
+import itertools
+import threading
+import time
+import typing
+from uuid import UUID
+
+GENERATION_OVERHEAD = 5.0
+"""Estimated seconds a generation takes regardless of its players."""
+PLAYER_TIME = 2.0
+"""Estimated seconds a player of a game adds to a generation, until generations with the game have finished."""
+LARGE_GENERATION_TIME = 120.0
+"""Generations estimated to take longer than this many seconds are large."""
+ESTIMATE_WEIGHT = 0.2
+"""Weight of the duration of a finished generation when refining the estimates of its games."""
+
+
+class GenerationJob(typing.NamedTuple):
+    id: UUID
+    owner: UUID
+    games: typing.Dict[str, int]
+    """Number of players of each game."""
+    order: int
+    """Order in which the generation was queued."""
+
+
+class QueueStatus(typing.NamedTuple):
+    position: int
+    """1-based position of the generation in the order it is expected to start in."""
+    expected_wait: float
+    """Estimated seconds until the generation starts."""
+
+
+class GenerationScheduler:
+    workers: int
+    large_workers: int
+    """Number of workers that may generate large generations at the same time, by default half of them."""
+    timeout: typing.Optional[float]
+    """Seconds after which generations time out, which caps their estimates."""
+    player_times: typing.Dict[str, float]
+    """Estimated seconds each player of a game adds to a generation."""
+    queued: typing.Dict[UUID, GenerationJob]
+    running: typing.Dict[UUID, typing.Tuple[GenerationJob, float]]
+    """Generations that were started, with the monotonic time they were started at."""
+
+    def __init__(self, workers: int, large_workers: typing.Optional[int] = None,
+                 timeout: typing.Optional[float] = None) -> None:
+        self.workers = workers
+        self.large_workers = large_workers or max(1, workers // 2)
+        self.timeout = timeout
+        self.player_times = {}
+        self.queued = {}
+        self.running = {}
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def __contains__(self, generation_id: UUID) -> bool:
+        with self._lock:
+            return generation_id in self.queued or generation_id in self.running
+
+    def estimate(self, job: GenerationJob) -> float:
+        estimate = GENERATION_OVERHEAD + sum(self.player_times.get(game, PLAYER_TIME) * players
+                                             for game, players in job.games.items())
+        if self.timeout:
+            return min(estimate, self.timeout)
+        return estimate
+
+    def is_large(self, job: GenerationJob) -> bool:
+        return self.estimate(job) > LARGE_GENERATION_TIME
+
+    def add(self, generation_id: UUID, owner: UUID, games: typing.Iterable[str]) -> GenerationJob:
+        """Queues a generation, with the game of each of its players."""
+        job = GenerationJob(generation_id, owner, dict(collections.Counter(games)), next(self._order))
+        with self._lock:
+            self.queued[generation_id] = job
+        return job
+
+    def remove(self, generation_id: UUID) -> None:
+        """Removes a generation that is no longer queued."""
+        with self._lock:
+            self.queued.pop(generation_id, None)
+
+    def start_next(self) -> typing.Optional[GenerationJob]:
+        """Returns the generation to start next on a free worker, if there is a free worker for any of them."""
+        with self._lock:
+            job = self._select(self.queued.values(), [job for job, _ in self.running.values()])
+            if job:
+                del self.queued[job.id]
+                self.running[job.id] = job, time.monotonic()
+            return job
+
+    def finish(self, generation_id: UUID, succeeded: bool) -> None:
+        """Frees the worker of a generation. The duration of successful generations refines the estimates."""
+        with self._lock:
+            job, started = self.running.pop(generation_id, (None, 0.0))
+            if job and succeeded:
+                self._refine(job, time.monotonic() - started)
+
+    def get_queue_status(self) -> typing.Dict[UUID, QueueStatus]:
+        """Simulates the queue with the current estimates, to get when each queued generation will start."""
+        with self._lock:
+            now = time.monotonic()
+            queued = dict(self.queued)
+            running: typing.List[typing.Tuple[float, GenerationJob]] = [
+                (max(0.0, started + self.estimate(job) - now), job) for job, started in self.running.values()
+            ]
+            status: typing.Dict[UUID, QueueStatus] = {}
+            elapsed = 0.0
+            while queued:
+                job = self._select(queued.values(), [job for _, job in running])
+                if job:
+                    del queued[job.id]
+                    status[job.id] = QueueStatus(len(status) + 1, elapsed)
+                    running.append((elapsed + self.estimate(job), job))
+                elif running:
+                    finished = min(running, key=lambda finish_job: finish_job[0])
+                    running.remove(finished)
+                    elapsed = max(elapsed, finished[0])
+                else:
+                    break  # no workers
+            return status
+
+    def _select(self, queued: typing.Iterable[GenerationJob],
+                running: typing.Sequence[GenerationJob]) -> typing.Optional[GenerationJob]:
+        if len(running) >= self.workers:
+            return None
+        small_jobs: typing.List[GenerationJob] = []
+        large_jobs: typing.List[GenerationJob] = []
+        for job in queued:
+            (large_jobs if self.is_large(job) else small_jobs).append(job)
+        large_running = sum(1 for job in running if self.is_large(job))
+        small_running = len(running) - large_running
+        owner_running = collections.Counter(job.owner for job in running)
+
+        def next_of(jobs: typing.List[GenerationJob]) -> GenerationJob:
+            # owners with fewer running generations go first, then the order they were queued in
+            return min(jobs, key=lambda job: (owner_running[job.owner], job.order))
+
+        # small generations get the workers not reserved for large ones, and large generations get theirs,
+        # which small generations can use while no large generation waits for them.
+        if small_jobs and small_running < max(1, self.workers - self.large_workers):
+            return next_of(small_jobs)
+        if large_jobs and large_running < self.large_workers:
+            return next_of(large_jobs)
+        if small_jobs:
+            return next_of(small_jobs)
+        return None
+
+    def _refine(self, job: GenerationJob, duration: float) -> None:
+        player_estimate = sum(self.player_times.get(game, PLAYER_TIME) * players
+                              for game, players in job.games.items())
+        if player_estimate <= 0:
+            return
+        # attribute the duration to the games by their share of the estimate
+        ratio = max(0.0, duration - GENERATION_OVERHEAD) / player_estimate
+        for game in job.games:
+            player_time = self.player_times.get(game, PLAYER_TIME)
+            self.player_times[game] = (1 - ESTIMATE_WEIGHT) * player_time + ESTIMATE_WEIGHT * player_time * ratio
@@ -1,5 +1,9 @@
+import bisect
 import datetime
 import collections
+import functools
+import hashlib
+import threading
 from dataclasses import dataclass
 from typing import Any, Callable, Dict, List, Optional, Set, Tuple, NamedTuple, Counter
 from uuid import UUID
@@ -9,14 +13,21 @@ from flask import make_response, render_template, request, Request, Response
 from werkzeug.exceptions import abort
 
 from MultiServer import Context, get_saving_second
-from NetUtils import ClientStatus, Hint, NetworkItem, NetworkSlot, SlotType
-from Utils import restricted_loads, KeyedDefaultDict
+from NetUtils import ClientStatus, Hint, NetworkItem, NetworkSlot, SlotType, get_sphere_index
+from Utils import restricted_loads, KeyedDefaultDict, KeyedDefaultLookup
 from . import app, cache
-from .models import GameDataPackage, Room
+from .models import GameDataPackage, Room, Seed
 
 # Multisave is currently updated, at most, every minute.
 TRACKER_CACHE_TIMEOUT_IN_SECONDS = 60
 
+# Decoded data kept in memory for the trackers of the most recently requested data packages and rooms.
+# The amount of seeds is configured by TRACKER_SEED_CACHE_SIZE and TRACKER_SEED_CACHE_BYTES in app.config.
+TRACKER_GAME_PACKAGE_CACHE_SIZE = 128
+TRACKER_MULTISAVE_CACHE_SIZE = 64
+# Revisions of each room's multisave that changes since can be reported for.
+TRACKER_SAVE_HISTORY_SIZE = 16
+
 _multiworld_trackers: Dict[str, Callable] = {}
 _player_trackers: Dict[str, Callable] = {}
 
@@ -40,23 +51,146 @@ def _cache_results(func: Callable) -> Callable:
     return method_wrapper
 
 
+class GameNames(NamedTuple):
+    item_id_to_name: Dict[int, str]
+    location_id_to_name: Dict[int, str]
+    item_name_to_id: Dict[str, int]
+    location_name_to_id: Dict[str, int]
+
+
+_multidatas: "collections.OrderedDict[UUID, Tuple[int, Dict[str, Any]]]" = collections.OrderedDict()
+"""Stored size and decoded multidata by seed, least recently used first."""
+_multidatas_lock = threading.Lock()
+
+
+def get_multidata(seed_id: UUID) -> Dict[str, Any]:
+    """Retrieves the decoded multidata of a seed, which never changes. Shared between requests, so don't modify it."""
+    with _multidatas_lock:
+        cached = _multidatas.get(seed_id)
+        if cached:
+            _multidatas.move_to_end(seed_id)
+            return cached[1]
+
+    data = Seed[seed_id].multidata
+    multidata = Context.decompress(data)
+    max_count = app.config["TRACKER_SEED_CACHE_SIZE"]
+    max_bytes = app.config["TRACKER_SEED_CACHE_BYTES"]
+    if max_count <= 0 or len(data) > max_bytes:
+        return multidata
+    with _multidatas_lock:
+        _multidatas[seed_id] = len(data), multidata
+        _multidatas.move_to_end(seed_id)
+        total_bytes = sum(size for size, _ in _multidatas.values())
+        while len(_multidatas) > max_count or total_bytes > max_bytes:
+            total_bytes -= _multidatas.popitem(last=False)[1][0]
+    return multidata
+
+
+@functools.lru_cache(maxsize=TRACKER_GAME_PACKAGE_CACHE_SIZE)
+def get_game_names(checksum: str) -> GameNames:
+    """Retrieves the lookup tables of a data package. Shared between requests, so don't modify them."""
+    game_package = restricted_loads(GameDataPackage[checksum].data)
+    return GameNames(
+        KeyedDefaultLookup(lambda code: f"Unknown Item (ID: {code})",
+                           {id: name for name, id in game_package["item_name_to_id"].items()}),
+        KeyedDefaultLookup(lambda code: f"Unknown Location (ID: {code})",
+                           {id: name for name, id in game_package["location_name_to_id"].items()}),
+        game_package["item_name_to_id"],
+        game_package["location_name_to_id"],
+    )
+
+
+class SaveChanges(NamedTuple):
+    revision: int
+    received_items_counts: Dict[TeamPlayer, int]
+    """Amount of items each player had received at this revision."""
+    new_checks: Dict[TeamPlayer, Set[int]]
+    """Locations checked since the previous revision."""
+    changed_players: Set[TeamPlayer]
+    """Players whose alias, hints, status or timers changed since the previous revision."""
+
+
+class RoomSave(NamedTuple):
+    digest: bytes
+    multisave: Dict[str, Any]
+    history: Tuple[SaveChanges, ...]
+    """Changes between the revisions of the room that were decoded by this process, oldest first."""
+
+
+_room_saves: "collections.OrderedDict[UUID, RoomSave]" = collections.OrderedDict()
+"""Decoded multisave by room, least recently used first."""
+_room_saves_lock = threading.Lock()
+
+
+def _get_save_changes(previous: Optional[Dict[str, Any]], multisave: Dict[str, Any]) -> SaveChanges:
+    received_items_counts = {(team, player): len(items)
+                             for (team, player, remote), items in multisave.get("received_items", {}).items()
+                             if remote}
+    if previous is None:
+        return SaveChanges(multisave.get("revision", 0), received_items_counts, {}, set())
+    previous_checks = previous.get("location_checks", {})
+    new_checks = {}
+    for team_player, checks in multisave.get("location_checks", {}).items():
+        checks = checks - previous_checks.get(team_player, set())
+        if checks:
+            new_checks[team_player] = checks
+    changed_players = set()
+    for key in ("name_aliases", "hints", "client_game_state", "client_activity_timers", "client_connection_timers"):
+        previous_values = dict(previous.get(key, ()))
+        values = dict(multisave.get(key, ()))
+        changed_players.update(team_player for team_player in previous_values.keys() | values.keys()
+                               if previous_values.get(team_player) != values.get(team_player))
+    return SaveChanges(multisave.get("revision", 0), received_items_counts, new_checks, changed_players)
+
+
+def get_room_save(room: Room) -> RoomSave:
+    """Retrieves the decoded multisave of a room, which is only decoded again once the room has saved.
+    Shared between requests, so don't modify it.
+    """
+    if not room.multisave:
+        return RoomSave(b"", {}, ())
+    digest = hashlib.blake2b(room.multisave, digest_size=16).digest()
+    with _room_saves_lock:
+        cached = _room_saves.get(room.id)
+        if cached and cached.digest == digest:
+            _room_saves.move_to_end(room.id)
+            return cached
+
+    multisave = restricted_loads(room.multisave)
+    if cached and cached.history and cached.history[-1].revision < multisave.get("revision", 0):
+        history = cached.history[-TRACKER_SAVE_HISTORY_SIZE + 1:] + (_get_save_changes(cached.multisave, multisave),)
+    else:
+        # the first revision decoded, or one saved by an older server without revisions
+        history = (_get_save_changes(None, multisave),)
+    room_save = RoomSave(digest, multisave, history)
+    with _room_saves_lock:
+        _room_saves[room.id] = room_save
+        _room_saves.move_to_end(room.id)
+        while len(_room_saves) > TRACKER_MULTISAVE_CACHE_SIZE:
+            _room_saves.popitem(last=False)
+    return room_save
+
+
 @dataclass
 class TrackerData:
     """A helper dataclass that is instantiated each time an HTTP request comes in for tracker data.
 
     Provides helper methods to lazily load necessary data that each tracker require and caches any results so any
     subsequent helper method calls do not need to recompute results during the lifetime of this instance.
+    The decoded multidata, multisave and data packages are shared with other requests for the same room.
     """
     room: Room
     _multidata: Dict[str, Any]
     _multisave: Dict[str, Any]
+    _room_save: RoomSave
     _tracker_cache: Dict[str, Any]
 
     def __init__(self, room: Room):
         """Initialize a new RoomMultidata object for the current room."""
         self.room = room
-        self._multidata = Context.decompress(room.seed.multidata)
-        self._multisave = restricted_loads(room.multisave) if room.multisave else {}
+        self._multidata = get_multidata(room.seed.id)
+        self._room_save = get_room_save(room)
+        self._multisave = self._room_save.multisave
         self._tracker_cache = {}
 
         self.item_name_to_id: Dict[str, Dict[str, int]] = {}
@@ -70,15 +204,13 @@ class TrackerData:
             game_name: KeyedDefaultDict(lambda code: f"Unknown Game {game_name} - Location (ID: {code})")
         })
         for game, game_package in self._multidata["datapackage"].items():
-            game_package = restricted_loads(GameDataPackage.get(checksum=game_package["checksum"]).data)
-            self.item_id_to_name[game] = KeyedDefaultDict(lambda code: f"Unknown Item (ID: {code})", {
-                id: name for name, id in game_package["item_name_to_id"].items()})
-            self.location_id_to_name[game] = KeyedDefaultDict(lambda code: f"Unknown Location (ID: {code})", {
-                id: name for name, id in game_package["location_name_to_id"].items()})
+            game_names = get_game_names(game_package["checksum"])
+            self.item_id_to_name[game] = game_names.item_id_to_name
+            self.location_id_to_name[game] = game_names.location_id_to_name
 
             # Normal lookup tables as well.
-            self.item_name_to_id[game] = game_package["item_name_to_id"]
-            self.location_name_to_id[game] = game_package["location_name_to_id"]
+            self.item_name_to_id[game] = game_names.item_name_to_id
+            self.location_name_to_id[game] = game_names.location_name_to_id
 
     def get_seed_name(self) -> str:
         """Retrieves the seed name."""
@@ -108,6 +240,26 @@ class TrackerData:
         """Retrieves a list of all item codes a given slot starts with."""
         return self._multidata["precollected_items"][player]
 
+    def get_room_revision(self) -> int:
+        """Retrieves the revision of the multisave, which increases each time the room saves."""
+        return self._multisave.get("revision", 0)
+
+    def get_room_changes_since(self, revision: int) -> Optional[SaveChanges]:
+        """Retrieves what changed since the given revision of the multisave, with the revision changes are reported
+        since and the received item counts at that revision. None if this process doesn't know the changes since then.
+        """
+        history = self._room_save.history
+        index = bisect.bisect_right([changes.revision for changes in history], revision) - 1
+        if index < 0:
+            return None
+        new_checks: Dict[TeamPlayer, Set[int]] = {}
+        changed_players: Set[TeamPlayer] = set()
+        for changes in history[index + 1:]:
+            for team_player, checks in changes.new_checks.items():
+                new_checks[team_player] = new_checks.get(team_player, set()) | checks
+            changed_players |= changes.changed_players
+        return SaveChanges(history[index].revision, history[index].received_items_counts, new_checks, changed_players)
+
     def get_player_checked_locations(self, team: int, player: int) -> Set[int]:
         """Retrieves the set of all locations marked complete by this player."""
         return self._multisave.get("location_checks", {}).get((team, player), set())
@@ -279,6 +431,22 @@ class TrackerData:
 
         return last_activity
 
+    @_cache_results
+    def get_room_activity_times(self) -> Dict[TeamPlayer, datetime.datetime]:
+        """Retrieves a dictionary of all players and the time of their last activity, in UTC.
+        Does not include players who have no activity recorded.
+        """
+        return {(team, player): datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+                for (team, player), timestamp in self._multisave.get("client_activity_timers", [])}
+
+    @_cache_results
+    def get_room_connection_times(self) -> Dict[TeamPlayer, datetime.datetime]:
+        """Retrieves a dictionary of all players and the time of their last connection, in UTC.
+        Does not include players who have never connected.
+        """
+        return {(team, player): datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+                for (team, player), timestamp in self._multisave.get("client_connection_timers", [])}
+
     @_cache_results
     def get_room_videos(self) -> Dict[TeamPlayer, Tuple[str, str]]:
         """Retrieves a dictionary of any players who have video streaming enabled and their feeds.
@@ -296,6 +464,19 @@ class TrackerData:
         """ each sphere is { player: { location_id, ... } } """
         return self._multidata.get("spheres", [])
 
+    @_cache_results
+    def get_sphere_index(self) -> Dict[Tuple[int, int], int]:
+        """Retrieves the sphere of each location, keyed by (player, location_id)."""
+        return get_sphere_index(self.get_spheres())
+
+    @_cache_results
+    def get_player_remaining_spheres(self, team: int, player: int) -> Dict[int, int]:
+        """Retrieves the amount of locations not marked complete by this player in each sphere."""
+        sphere_index = self.get_sphere_index()
+        return dict(collections.Counter(sphere_index[player, location_id]
+                                        for location_id in self.get_player_missing_locations(team, player)
+                                        if (player, location_id) in sphere_index))
+
 
 def _process_if_request_valid(incoming_request: Request, room: Optional[Room]) -> Optional[Response]:
     if not room:
@@ -609,12 +609,16 @@ class ServerOptions(Group):
         OFF = 0
         ON = 1
 
+    class MetricsPort(int):
+        """Serve runtime metrics in the Prometheus text format on this local port, 0 to disable"""
+
     host: str | None = None
     port: int = 38281
     password: str | None = None
     multidata: str | None = None
     savefile: str | None = None
     disable_save: bool = False
+    journal_save: bool = False
     loglevel: str = "info"
     logtime: bool = False
     server_password: ServerPassword | None = None
@@ -628,6 +632,7 @@ class ServerOptions(Group):
     auto_shutdown: AutoShutdown = AutoShutdown(0)
     compatibility: Compatibility = Compatibility(2)
     log_network: LogNetwork = LogNetwork(0)
+    metrics_port: MetricsPort = MetricsPort(0)
 
 
 class GeneratorOptions(Group):
@@ -687,6 +692,22 @@ class GeneratorOptions(Group):
         start_inventory -> Move remaining items to start_inventory, generate additional filler items to fill locations.
         """
 
+    class GenerateEarlyProcesses(int):
+        """
+        Maximum amount of worker processes running the early setup of worlds at the same time.
+        Only worlds that support it are set up in a worker process, everything else is set up one after another.
+        Each worker is a fork of the generator, so more workers use more memory. 0 disables workers.
+        Worker processes are not available on Windows.
+        """
+
+    class OutputProcesses(int):
+        """
+        Maximum amount of worker processes generating output files, such as roms and mods, at the same time.
+        Only worlds that support it generate their output in a worker process, everything else uses threads.
+        Each worker is a fork of the generator, so more workers use more memory. 0 disables workers.
+        Worker processes are not available on Windows.
+        """
+
     enemizer_path: EnemizerPath = EnemizerPath("EnemizerCLI/EnemizerCLI.Core")  # + ".exe" is implied on Windows
     player_files_path: PlayerFilesPath = PlayerFilesPath("Players")
     players: Players = Players(0)
@@ -696,6 +717,8 @@ class GeneratorOptions(Group):
     race: Race = Race(0)
     plando_options: PlandoOptions = PlandoOptions("bosses, connections, texts")
     panic_method: PanicMethod = PanicMethod("swap")
+    generate_early_processes: GenerateEarlyProcesses = GenerateEarlyProcesses(0)
+    output_processes: OutputProcesses = OutputProcesses(0)
     loglevel: str = "info"
     logtime: bool = False
 
@@ -0,0 +1,330 @@
+"""
+Load test of MultiServer with simulated clients speaking the network protocol.
+
+Generates a seed (or loads the given multidata), starts MultiServer on a thread of this process and connects a
+simulated client to each slot, which send LocationChecks, LocationScouts, Set and DeathLink Bounce packets at the given
+rates per client. Reports latency percentiles of each packet type, the CPU time spent by the server thread and the peak
+memory of the process.
+The clients run in the same process as the server, so they compete with it for the GIL. Latencies therefore include a
+share of client overhead, which is constant between runs, so reports stay comparable for the same arguments.
+
+Run with `python test/benchmark/server_load.py --help` for the options.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import typing
+from collections import deque
+from pathlib import Path
+
+if typing.TYPE_CHECKING:
+    from MultiServer import Context
+
+
+def percentiles(latencies: typing.List[float]) -> typing.Dict[str, typing.Any]:
+    """Summarizes latencies in seconds as count and nearest-rank percentiles in milliseconds."""
+    if not latencies:
+        return {"count": 0}
+    latencies = sorted(latencies)
+
+    def rank(percent: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))] * 1000, 3)
+
+    return {"count": len(latencies), "p50": rank(50), "p90": rank(90), "p99": rank(99), "max": rank(100)}
+
+
+def get_peak_memory() -> typing.Optional[int]:
+    """Peak resident memory of this process in bytes, if it can be determined on this platform."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def generate_seed(game: str, players: int, output_dir: str) -> Path:
+    """Generates a seed of the game with default options for each slot, returning its output zip."""
+    import sys
+    import tempfile
+    import Generate
+    import Main
+
+    original_argv = sys.argv
+    try:
+        with tempfile.TemporaryDirectory() as players_dir:
+            for player in range(1, players + 1):
+                with open(Path(players_dir) / f"{player}.yaml", "w", encoding="utf-8") as f:
+                    json.dump({"name": f"Player{player}", "game": game, game: {}}, f)
+            sys.argv = [sys.argv[0], "--seed", "0", "--spoiler", "0", "--skip_prog_balancing",
+                        "--player_files_path", players_dir, "--outputpath", output_dir]
+            Main.main(*Generate.main())
+    finally:
+        sys.argv = original_argv
+    return next(Path(output_dir).glob("*.zip"))
+
+
+class ServerThread(threading.Thread):
+    """Runs MultiServer on its own event loop, so its CPU time can be measured separately from the clients."""
+    multidata: Path
+    ctx: Context
+    port: int
+    ready: threading.Event
+    loop: asyncio.AbstractEventLoop
+
+    def __init__(self, multidata: Path) -> None:
+        super().__init__(name="MultiServer", daemon=True)
+        self.multidata = multidata
+        self.port = 0
+        self.ready = threading.Event()
+
+    def run(self) -> None:
+        asyncio.run(self._serve())
+
+    async def _serve(self) -> None:
+        import functools
+        import websockets
+        from MultiServer import Context, server, server_per_message_deflate_factory
+
+        self.loop = asyncio.get_running_loop()
+        self.ctx = Context("127.0.0.1", 0, "", "", 0, 0, False)
+        self.ctx.load(str(self.multidata))
+        self.ctx.init_save(False)
+        ws_server = await websockets.serve(functools.partial(server, ctx=self.ctx), host="127.0.0.1", port=0,
+                                           extensions=[server_per_message_deflate_factory])
+        self.port = ws_server.sockets[0].getsockname()[1]
+        self.ready.set()
+        await self.ctx.exit_event.wait()
+        ws_server.close()
+        await ws_server.wait_closed()
+
+    def get_cpu_time(self) -> float:
+        """CPU time used by the server thread so far."""
+        async def thread_time() -> float:
+            return time.thread_time()
+        return asyncio.run_coroutine_threadsafe(thread_time(), self.loop).result()
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.ctx.exit_event.set)
+        self.join()
+
+
+class SimulatedClient:
+    """A client of a slot, sending packets at random intervals and timing the server's responses."""
+    notify_key = "LoadTest"
+    """Key every client sets and registers for through SetNotify."""
+
+    latencies: typing.Dict[str, typing.List[float]]
+    pending: typing.Dict[str, typing.Deque[float]]
+    """Send times of packets answered in order, by the command of the answer."""
+
+    def __init__(self, address: str, name: str, game: str, deathlink: bool, rates: typing.Dict[str, float],
+                 latencies: typing.Dict[str, typing.List[float]], seed: int) -> None:
+        self.address = address
+        self.name = name
+        self.game = game
+        self.tags = ["DeathLink"] if deathlink else []
+        self.rates = rates
+        self.latencies = latencies
+        self.random = random.Random(seed)
+        self.pending = {"RoomUpdate": deque(), "LocationInfo": deque()}
+        self.slot = 0
+        self.missing_locations: typing.List[int] = []
+        self.all_locations: typing.List[int] = []
+        self.socket = None
+
+    async def send(self, msgs: typing.List[typing.Dict[str, typing.Any]]) -> None:
+        await self.socket.send(json.dumps(msgs))
+
+    async def connect(self) -> None:
+        import websockets
+        from Utils import version_tuple
+
+        start = time.perf_counter()
+        self.socket = await websockets.connect(self.address, max_size=None, ping_interval=None)
+        await self.socket.recv()  # RoomInfo
+        await self.send([{"cmd": "Connect", "game": self.game, "name": self.name, "password": None, "uuid": "",
+                          "version": {"class": "Version", "major": version_tuple.major,
+                                      "minor": version_tuple.minor, "build": version_tuple.build},
+                          "items_handling": 0b111, "tags": self.tags, "slot_data": False}])
+        while True:
+            for msg in json.loads(await self.socket.recv()):
+                if msg["cmd"] == "ConnectionRefused":
+                    raise ConnectionError(f"{self.name} was refused: {msg.get('errors', [])}")
+                if msg["cmd"] == "Connected":
+                    self.slot = msg["slot"]
+                    self.missing_locations = list(msg["missing_locations"])
+                    self.random.shuffle(self.missing_locations)
+                    self.all_locations = self.missing_locations + list(msg["checked_locations"])
+                    self.latencies["Connect"].append(time.perf_counter() - start)
+                    await self.send([{"cmd": "SetNotify", "keys": [self.notify_key]}])
+                    return
+
+    async def receive(self) -> None:
+        import websockets
+        try:
+            async for data in self.socket:
+                now = time.perf_counter()
+                for msg in json.loads(data):
+                    cmd = msg["cmd"]
+                    if cmd == "RoomUpdate" and "checked_locations" in msg and self.pending["RoomUpdate"]:
+                        self.latencies["LocationChecks"].append(now - self.pending["RoomUpdate"].popleft())
+                    elif cmd == "LocationInfo" and self.pending["LocationInfo"]:
+                        self.latencies["LocationScouts"].append(now - self.pending["LocationInfo"].popleft())
+                    elif cmd == "SetReply" and "sent" in msg:
+                        own = msg["slot"] == self.slot
+                        self.latencies["Set" if own else "SetNotify"].append(now - msg["sent"])
+                    elif cmd == "Bounced" and "sent" in msg.get("data", {}):
+                        own = msg["data"]["source"] == self.name
+                        self.latencies["Bounce" if own else "DeathLink"].append(now - msg["data"]["sent"])
+        except websockets.ConnectionClosed:
+            pass
+
+    async def act(self, action: str) -> None:
+        now = time.perf_counter()
+        if action == "LocationChecks":
+            if not self.missing_locations:
+                return
+            self.pending["RoomUpdate"].append(now)
+            await self.send([{"cmd": "LocationChecks", "locations": [self.missing_locations.pop()]}])
+        elif action == "LocationScouts":
+            if not self.all_locations:
+                return
+            self.pending["LocationInfo"].append(now)
+            locations = self.random.sample(self.all_locations, min(5, len(self.all_locations)))
+            await self.send([{"cmd": "LocationScouts", "locations": locations, "create_as_hint": 0}])
+        elif action == "Set":
+            await self.send([{"cmd": "Set", "key": self.notify_key, "default": 0, "want_reply": True, "sent": now,
+                              "operations": [{"operation": "add", "value": 1}]}])
+        elif action == "Bounce" and self.tags:
+            await self.send([{"cmd": "Bounce", "tags": self.tags,
+                              "data": {"time": time.time(), "source": self.name, "cause": "Load test", "sent": now}}])
+
+    async def run(self, duration: float) -> None:
+        receiver = asyncio.create_task(self.receive())
+        actions, weights = zip(*self.rates.items())
+        total_rate = sum(weights)
+        end = time.perf_counter() + duration
+        while total_rate:
+            delay = self.random.expovariate(total_rate)
+            if time.perf_counter() + delay > end:
+                break
+            await asyncio.sleep(delay)
+            await self.act(self.random.choices(actions, weights)[0])
+        await asyncio.sleep(max(0.0, end - time.perf_counter()))
+        await self.socket.close()
+        await receiver
+
+
+async def run_clients(server_thread: ServerThread, args: argparse.Namespace,
+                      latencies: typing.Dict[str, typing.List[float]]) -> typing.Dict[str, typing.Any]:
+    ctx = server_thread.ctx
+    rates = {"LocationChecks": args.check_rate, "LocationScouts": args.scout_rate,
+             "Set": args.set_rate, "Bounce": args.deathlink_rate}
+    rng = random.Random(args.seed)
+    address = f"ws://127.0.0.1:{server_thread.port}"
+    clients = [SimulatedClient(address, name, ctx.games[slot], rng.random() < args.deathlink_ratio, rates, latencies,
+                               rng.getrandbits(32))
+               for (team, slot), name in sorted(ctx.player_names.items())
+               if slot not in ctx.groups][:args.clients or None]
+
+    connecting = asyncio.Semaphore(args.connect_concurrency)
+
+    async def connect(client: SimulatedClient) -> None:
+        async with connecting:
+            await client.connect()
+
+    await asyncio.gather(*(connect(client) for client in clients))
+    cpu_start = server_thread.get_cpu_time()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(client.run(args.duration) for client in clients))
+    cpu_time = server_thread.get_cpu_time() - cpu_start
+    wall_time = time.perf_counter() - wall_start
+    return {
+        "clients": len(clients),
+        "deathlink_clients": sum(bool(client.tags) for client in clients),
+        "duration": wall_time,
+        "server_cpu_time": cpu_time,
+        "server_cpu_utilization": cpu_time / wall_time,
+        "unanswered": sum(len(pending) for client in clients for pending in client.pending.values()),
+    }
+
+
+def run_server_load_benchmark(args: argparse.Namespace) -> typing.Dict[str, typing.Any]:
+    import logging
+    import tempfile
+
+    from Utils import init_logging
+
+    init_logging("Benchmark Runner")
+    logger = logging.getLogger("Benchmark")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        multidata = args.multidata
+        if not multidata:
+            logger.info(f"Generating {args.players} slots of {args.game}.")
+            multidata = generate_seed(args.game, args.players, temp_dir)
+
+        server_thread = ServerThread(Path(multidata))
+        server_thread.start()
+        server_thread.ready.wait()
+        # only report server warnings and errors, instead of every connect and check
+        server_thread.ctx.logger = logging.getLogger("Server")
+        for logger_name in ("Server", "websockets"):
+            logging.getLogger(logger_name).setLevel(logging.WARNING)
+
+        latencies: typing.Dict[str, typing.List[float]] = {
+            name: [] for name in ("Connect", "LocationChecks", "LocationScouts", "Set", "SetNotify", "Bounce",
+                                  "DeathLink")}
+        try:
+            report = asyncio.run(run_clients(server_thread, args, latencies))
+        finally:
+            server_thread.stop()
+
+    report["peak_memory"] = get_peak_memory()
+    report["latency"] = {name: percentiles(values) for name, values in latencies.items()}
+    logger.info(f"{report['clients']} clients ({report['deathlink_clients']} with DeathLink) for "
+                f"{report['duration']:.1f} seconds: server used {report['server_cpu_time']:.2f} seconds of CPU "
+                f"({report['server_cpu_utilization']:.1%}), {report['unanswered']} packets unanswered, "
+                f"peak memory {(report['peak_memory'] or 0) / 2 ** 20:.1f} MiB.")
+    for name, summary in report["latency"].items():
+        if summary["count"]:
+            logger.info(f"{name:>14}: {summary['count']:>7} p50 {summary['p50']:>9.3f}ms p90 {summary['p90']:>9.3f}ms "
+                        f"p99 {summary['p99']:>9.3f}ms max {summary['max']:>9.3f}ms")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Measure MultiServer under load of simulated clients.")
+    parser.add_argument("--multidata", help="Multidata or zip to host, generates a seed if not given.")
+    parser.add_argument("--game", default="APQuest", help="Game of each slot of the generated seed.")
+    parser.add_argument("--players", type=int, default=100, help="Amount of slots of the generated seed.")
+    parser.add_argument("--clients", type=int, default=0, help="Amount of clients to connect, 0 for every slot.")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run the load for.")
+    parser.add_argument("--check_rate", type=float, default=0.5, help="LocationChecks per second per client.")
+    parser.add_argument("--scout_rate", type=float, default=0.05, help="LocationScouts per second per client.")
+    parser.add_argument("--set_rate", type=float, default=0.1,
+                        help="Sets of a key all clients registered to with SetNotify, per second per client.")
+    parser.add_argument("--deathlink_rate", type=float, default=0.01,
+                        help="DeathLink Bounces per second per client with DeathLink.")
+    parser.add_argument("--deathlink_ratio", type=float, default=0.5, help="Share of clients with DeathLink.")
+    parser.add_argument("--connect_concurrency", type=int, default=50,
+                        help="Amount of clients connecting at the same time.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the clients' random behavior.")
+    parser.add_argument("--report", help="Path to write the report to as JSON.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from path_change import change_home
+    change_home()
+    run_server_load_benchmark(parse_args())
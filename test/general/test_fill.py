@@ -1,11 +1,12 @@
-from typing import List, Iterable
+from typing import Dict, List, Iterable, Optional
 import unittest
+from unittest import mock
 
 from Options import Accessibility
 from test.general import generate_items, generate_locations, generate_test_multiworld
-from Fill import FillError, balance_multiworld_progression, fill_restrictive, \
-    distribute_early_items, distribute_items_restrictive
-from BaseClasses import Entrance, LocationProgressType, MultiWorld, Region, Item, Location, \
+from Fill import FillError, LocationReachabilityCache, balance_multiworld_progression, fill_restrictive, \
+    distribute_early_items, distribute_items_restrictive, sweep_from_pool, _get_sweep_horizon
+from BaseClasses import CollectionState, Entrance, LocationProgressType, MultiWorld, Region, Item, Location, \
     ItemClassification
 from worlds.generic.Rules import CollectionRule, add_item_rule, locality_rules, set_rule
 
@@ -433,6 +434,42 @@ class TestFillRestrictive(unittest.TestCase):
         self.assertTrue(sphere1_loc1.item.name == one_to_two1 or
                         sphere1_loc2.item.name == one_to_two1, "Wrong item in Sphere 1")
 
+    def test_sweep_checkpoint_matches_full_sweep(self):
+        """Test that fill_restrictive places each item against the same state with sweep checkpoints as when sweeping
+        the whole pool, including after the checkpoint's horizon ran out and after a swap returned an item to it"""
+        def fill(horizon: Optional[int]) -> Dict[str, str]:
+            multiworld = generate_test_multiworld(1)
+            player1 = generate_player_data(multiworld, 1, 10, 10)
+            locations = player1.locations[:]  # copy required
+            item_names = [item.name for item in player1.prog_items]
+            # Items are placed from the end of the pool, so item 9 is placed in the first location. The checkpoint is
+            # rebuilt with item 9 placed before item 3 is placed, which has to be swapped into the first location.
+            for location in locations[1:]:
+                add_item_rule(location, lambda item_to_place: item_to_place.name != item_names[3])
+
+            mismatches: List[str] = []
+
+            def check_state(state: CollectionState) -> LocationReachabilityCache:
+                full_sweep_state = sweep_from_pool(multiworld.state, player1.prog_items)
+                if state.prog_items[1] != full_sweep_state.prog_items[1]:
+                    mismatches.append(f"{state.prog_items[1]} != {full_sweep_state.prog_items[1]}")
+                return LocationReachabilityCache(state)
+
+            placements: List[Location] = []
+            get_horizon = _get_sweep_horizon if horizon is None else lambda reachable_items: horizon
+            with mock.patch("Fill._get_sweep_horizon", wraps=get_horizon) as get_sweep_horizon, \
+                    mock.patch("Fill.LocationReachabilityCache", side_effect=check_state):
+                fill_restrictive(multiworld, multiworld.state, player1.locations, player1.prog_items,
+                                 on_place=placements.append)
+            self.assertGreater(get_sweep_horizon.call_count, 1, "Checkpoint was never rebuilt - Test flawed")
+            self.assertEqual(len(placements), 11, "Did not swap - Test flawed")
+            self.assertEqual(player1.locations, [])
+            self.assertEqual(mismatches, [])
+            return {location.name: location.item.name for location in locations}
+
+        # a horizon of 0 puts the whole pool into the checkpoint each iteration, which is the same as not using one
+        self.assertEqual(fill(None), fill(0))
+
     def test_double_sweep(self):
         """Test that sweep doesn't duplicate Event items when sweeping"""
         # test for PR1114
@@ -463,6 +500,27 @@ class TestFillRestrictive(unittest.TestCase):
         self.assertEqual(1, len(player1.prog_items))
         self.assertIsNot(loc0.item, player1.prog_items[0], "Filled item was still present in item pool")
 
+    def test_reachability_cache_matches_can_fill(self):
+        """Test that LocationReachabilityCache.can_fill gives the same results as Location.can_fill"""
+        multiworld = generate_test_multiworld()
+        player1 = generate_player_data(multiworld, 1, 4, 2, 1)
+        locked, excluded, allowed, free = player1.locations
+        item = player1.prog_items[0]
+        for location in (locked, excluded, allowed):
+            set_rule(location, lambda state: state.has(player1.prog_items[1].name, 1))
+        excluded.progress_type = LocationProgressType.EXCLUDED
+        allowed.always_allow = lambda state, item: item.name == player1.basic_items[0].name
+        add_item_rule(free, lambda item: item.advancement)
+
+        cache = LocationReachabilityCache(multiworld.state)
+        for location in player1.locations:
+            for check_access in (True, False):
+                for candidate in (item, player1.basic_items[0]):
+                    with self.subTest(location=location.name, item=candidate.name, check_access=check_access):
+                        self.assertEqual(cache.can_fill(location, candidate, check_access),
+                                         location.can_fill(multiworld.state, candidate, check_access))
+        self.assertEqual(cache.reachable, {locked: False, excluded: False, free: True, allowed: False})
+
 
 class TestDistributeItemsRestrictive(unittest.TestCase):
     def test_basic_distribute(self):
@@ -6,7 +6,7 @@ from BaseClasses import CollectionState, MultiWorld
 from Fill import distribute_items_restrictive
 from Options import ItemLinks
 from worlds.AutoWorld import AutoWorldRegister, World, call_all
-from . import setup_solo_multiworld
+from . import generate_items, generate_test_multiworld, setup_solo_multiworld
 
 
 class TestBase(unittest.TestCase):
@@ -162,3 +162,11 @@ class TestBase(unittest.TestCase):
                                          f"{game_name} modified local_items during {step}")
                         self.assertEqual(non_local_items, multiworld.worlds[1].options.non_local_items.value,
                                          f"{game_name} modified non_local_items during {step}")
+
+    def test_duplicate_item_reference(self):
+        """Test that adding the same item instance to the itempool twice is caught"""
+        multiworld = generate_test_multiworld()
+        item = generate_items(1, 1)[0]
+        multiworld.worlds[1].create_items = lambda: multiworld.itempool.extend((item, item))
+        with self.assertRaises(AssertionError):
+            call_all(multiworld, "create_items")
@@ -0,0 +1,25 @@
+import unittest
+
+from BaseClasses import Entrance, Location
+from Profiler import GenerationProfile
+from worlds.AutoWorld import AutoWorldRegister
+from . import setup_solo_multiworld
+
+
+class TestGenerationProfile(unittest.TestCase):
+    def test_profile(self) -> None:
+        """Tests that a profile records stages, world calls and access rules, and is removed afterwards."""
+        location_can_reach, entrance_can_reach = Location.can_reach, Entrance.can_reach
+        profile = GenerationProfile(rule_count=5)
+        with profile.enable():
+            multiworld = setup_solo_multiworld(AutoWorldRegister.world_types["A Link to the Past"])
+            multiworld.can_beat_game(multiworld.state)
+        self.assertIs(Location.can_reach, location_can_reach)
+        self.assertIs(Entrance.can_reach, entrance_can_reach)
+
+        report = profile.as_dict(multiworld)
+        self.assertIn("create_regions", report["stages"])
+        self.assertIn("set_rules", report["world_types"]["A Link to the Past"]["methods"])
+        self.assertEqual(report["players"][1]["game"], "A Link to the Past")
+        self.assertEqual(len(report["slowest_rules"]), 5)
+        self.assertTrue(all(rule["calls"] for rule in report["slowest_rules"]))
@@ -1,8 +1,8 @@
 import unittest
 
-from BaseClasses import CollectionState
+from BaseClasses import CollectionState, Region
 from worlds.AutoWorld import AutoWorldRegister
-from . import setup_solo_multiworld, gen_steps
+from . import generate_items, generate_test_multiworld, setup_solo_multiworld, gen_steps
 
 
 class TestBase(unittest.TestCase):
@@ -79,3 +79,114 @@ class TestBase(unittest.TestCase):
                             locations.add(location)
                     self.assertGreater(len(locations), 0,
                                        msg="Need to be able to reach at least one location to get started.")
+
+
+class TestIncrementalReachability(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld()
+        self.multiworld.worlds[1].incremental_reachability = True
+        menu = self.multiworld.get_region("Menu", 1)
+        self.regions = [Region(f"Region {i}", 1, self.multiworld) for i in range(3)]
+        self.multiworld.regions += self.regions
+        self.items = generate_items(3, 1, True)
+        menu.connect(self.regions[0], rule=lambda state: state.has(self.items[0].name, 1))
+        menu.connect(self.regions[1], rule=lambda state: state.has(self.items[1].name, 1))
+        self.regions[1].connect(self.regions[2], "Indirect",
+                                lambda state: state.can_reach_region(self.regions[0].name, 1))
+        self.multiworld.register_indirect_condition(self.regions[0], self.multiworld.get_entrance("Indirect", 1))
+
+    def test_only_dependent_entrances_rechecked(self) -> None:
+        """Ensure collecting an item only rechecks the blocked entrances whose rules looked it up."""
+        state = CollectionState(self.multiworld)
+        self.assertFalse(self.regions[0].can_reach(state))
+        self.assertEqual(state.entrance_dependencies[1][self.multiworld.get_entrance("Menu -> Region 0", 1)],
+                         {self.items[0].name})
+
+        checked = []
+        entrance = self.multiworld.get_entrance("Menu -> Region 0", 1)
+        rule = entrance.access_rule
+        entrance.access_rule = lambda state: checked.append(entrance) or rule(state)
+        state.collect(self.items[1], True)
+        self.assertTrue(self.regions[1].can_reach(state))
+        self.assertFalse(self.regions[2].can_reach(state))
+        self.assertEqual(checked, [])
+
+        state.collect(self.items[0], True)
+        self.assertTrue(self.regions[2].can_reach(state))
+        self.assertEqual(checked, [entrance])
+
+    def test_matches_full_update(self) -> None:
+        """Ensure the incremental update reaches the same regions as a full update when collecting and removing."""
+        world = self.multiworld.worlds[1]
+        incremental_state = CollectionState(self.multiworld)
+        full_state = CollectionState(self.multiworld)
+
+        def assert_same_regions() -> None:
+            world.incremental_reachability = True
+            incremental_state.update_reachable_regions(1)
+            world.incremental_reachability = False
+            full_state.update_reachable_regions(1)
+            self.assertEqual(incremental_state.reachable_regions[1], full_state.reachable_regions[1])
+
+        for item in reversed(self.items):
+            incremental_state.collect(item, True)
+            full_state.collect(item, True)
+            assert_same_regions()
+        incremental_state.remove(self.items[0])
+        full_state.remove(self.items[0])
+        assert_same_regions()
+        incremental_state = incremental_state.copy()
+        incremental_state.collect(self.items[0], True)
+        full_state.collect(self.items[0], True)
+        assert_same_regions()
+
+    def test_opted_in_worlds(self) -> None:
+        """Ensure worlds using incremental reachability reach the same regions as a full update while collecting."""
+        for game_name, world_type in AutoWorldRegister.world_types.items():
+            if not world_type.incremental_reachability:
+                continue
+            with self.subTest("Game", game=game_name):
+                multiworld = setup_solo_multiworld(world_type)
+                world = multiworld.worlds[1]
+                incremental_state = CollectionState(multiworld)
+                full_state = CollectionState(multiworld)
+                for item in multiworld.itempool:
+                    if not item.advancement:
+                        continue
+                    incremental_state.collect(item, True)
+                    full_state.collect(item, True)
+                    world.incremental_reachability = True
+                    incremental_state.update_reachable_regions(1)
+                    world.incremental_reachability = False
+                    full_state.update_reachable_regions(1)
+                    self.assertEqual(incremental_state.reachable_regions[1], full_state.reachable_regions[1])
+
+    def test_rule_writes_kept(self) -> None:
+        """Ensure items a rule writes into prog_items during an incremental update are kept and tracked as changed."""
+        entrance = self.multiworld.get_entrance("Menu -> Region 0", 1)
+        rule = entrance.access_rule
+
+        def counting_rule(state: CollectionState) -> bool:
+            state.prog_items[1]["Rule Checks"] += 1
+            return rule(state)
+
+        entrance.access_rule = counting_rule
+        state = CollectionState(self.multiworld)
+        self.assertFalse(self.regions[0].can_reach(state))
+        self.assertEqual(state.prog_items[1]["Rule Checks"], 1)
+        self.assertIn("Rule Checks", state.prog_items[1].changed)
+
+    def test_bulk_writes_tracked(self) -> None:
+        """Ensure items added through Counter methods that bypass __setitem__ are rechecked."""
+        state = CollectionState(self.multiworld)
+        self.assertFalse(self.regions[0].can_reach(state))
+        self.assertFalse(state.prog_items[1])
+        # Counter.update of an empty Counter goes through dict.update
+        state.prog_items[1].update({self.items[0].name: 1})
+        state.stale[1] = True
+        self.assertTrue(self.regions[0].can_reach(state))
+
+        state.prog_items[1].pop(self.items[0].name)
+        state.prog_items[1].setdefault(self.items[1].name, 1)
+        state.stale[1] = True
+        self.assertTrue(self.regions[1].can_reach(state))
@@ -1,7 +1,8 @@
 import unittest
 
+from BaseClasses import CollectionState
 from worlds.AutoWorld import AutoWorldRegister, call_all
-from . import setup_solo_multiworld
+from . import generate_items, generate_test_multiworld, setup_solo_multiworld
 
 
 class TestBase(unittest.TestCase):
@@ -27,3 +28,41 @@ class TestBase(unittest.TestCase):
                     with self.subTest("Step", step=step):
                         call_all(multiworld, step)
                         self.assertTrue(multiworld.get_all_state(False, allow_partial_entrances=True))
+
+
+class TestStateCopy(unittest.TestCase):
+    def test_copies_are_independent(self):
+        """Ensure mutating a state or its copy after copying does not affect the other."""
+        multiworld = generate_test_multiworld(2)
+        items = generate_items(2, 1, True)
+        state = CollectionState(multiworld)
+        state.collect(items[0], True)
+        copied_state = state.copy()
+        self.assertEqual(copied_state.prog_items, state.prog_items)
+
+        copied_state.collect(items[1], True)
+        state.prog_items[2]["Other"] += 1
+        self.assertEqual(state.count(items[1].name, 1), 0)
+        self.assertEqual(copied_state.count(items[1].name, 1), 1)
+        self.assertEqual(copied_state.count("Other", 2), 0)
+        self.assertEqual(copied_state.copy().count(items[0].name, 1), 1)
+        self.assertEqual(set(copied_state.prog_items), {1, 2})
+
+        state.remove(items[0])
+        self.assertEqual(state.count(items[0].name, 1), 0)
+        self.assertEqual(copied_state.count(items[0].name, 1), 1)
+
+    def test_reading_copies_nothing(self):
+        """Ensure iterating, comparing and printing the per-player values of a copied state does not copy them."""
+        multiworld = generate_test_multiworld(2)
+        state = CollectionState(multiworld)
+        state.collect(generate_items(1, 1, True)[0], True)
+        copied_state = state.copy()
+        prog_items = copied_state.prog_items
+        self.assertEqual(list(prog_items), [1, 2])
+        self.assertEqual(set(prog_items.keys()), {1, 2})
+        self.assertEqual(prog_items, state.prog_items)
+        self.assertIn("Counter", repr(prog_items))
+        self.assertEqual(dict.__len__(prog_items), 0, "reading should not copy any player's values")
+        self.assertEqual(dict(prog_items.items()), dict(state.prog_items.items()))
+        self.assertEqual(dict.__len__(prog_items), 2, "items can be mutated, so it should copy the values")
@@ -0,0 +1,35 @@
+# Tests for the json and orjson codecs of NetUtils.encode and NetUtils.decode
+import unittest
+
+import NetUtils
+from NetUtils import ClientStatus, Hint, HintStatus, NetworkItem, NetworkPlayer, NetworkSlot, SlotType
+from Utils import Version
+
+sample_msgs = [
+    {"cmd": "ReceivedItems", "index": 0, "items": [NetworkItem(1, 2, 3, 4), NetworkItem(5, 6, 7)]},
+    {"cmd": "Connected", "players": [NetworkPlayer(0, 1, "Ä", "A")],
+     "slot_info": {1: NetworkSlot("A", "Game", SlotType.player), 2: NetworkSlot("G", "Game", SlotType.group, [1])},
+     "checked_locations": {1, 2, 3}, "missing_locations": frozenset(), "version": Version(0, 6, 2)},
+    {"cmd": "SetReply", "key": "_read_hints_0_1", "value": [Hint(1, 2, 3, 4, False, "", 0, HintStatus.HINT_FOUND)]},
+    {"cmd": "StatusUpdate", "status": ClientStatus.CLIENT_GOAL, "value": 1.5, "big": 2 ** 70, "none": None},
+    {"cmd": "SetReply", "key": "float", "value": [float("nan"), float("inf")], "original_value": {"-inf": -1e309}},
+]
+
+
+@unittest.skipUnless(NetUtils.orjson, "orjson is not installed")
+class TestCodec(unittest.TestCase):
+    def test_encode(self) -> None:
+        """Tests that both codecs encode the same objects, including NaN and infinities."""
+        for msg in sample_msgs:
+            with self.subTest(cmd=msg["cmd"]):
+                self.assertEqual(NetUtils._encode_orjson(msg), NetUtils._encode_json(msg))
+
+    def test_decode(self) -> None:
+        """Tests that both codecs decode to the same objects, restoring allowed classes."""
+        for msg in sample_msgs:
+            with self.subTest(cmd=msg["cmd"]):
+                data = NetUtils._encode_json(msg)
+                self.assertEqual(NetUtils._decode_orjson(data), NetUtils._decode_json(data))
+        self.assertEqual(NetUtils._decode_orjson('[{"value":NaN,"big":123456789012345678901}]'),
+                         NetUtils._decode_json('[{"value":NaN,"big":123456789012345678901}]'))
+        self.assertIsInstance(NetUtils._decode_orjson(NetUtils.encode([NetworkItem(1, 2, 3)]))[0], NetworkItem)
@@ -1,12 +1,15 @@
 # Tests for Generate.py (ArchipelagoGenerate.exe)
 
+import multiprocessing
 import unittest
 import os
 import os.path
 import sys
+import zipfile
 
 from pathlib import Path
 from tempfile import TemporaryDirectory
+from unittest import mock
 
 import Generate
 import Main
@@ -72,6 +75,22 @@ class TestGenerateMain(unittest.TestCase):
 
         self.assertOutput(self.output_tempdir.name)
 
+    def test_generate_output_exception(self):
+        from worlds.apquest.world import APQuestWorld
+
+        def generate_output(world, output_directory: str) -> None:
+            with open(os.path.join(output_directory, "partial.txt"), "w") as f:
+                f.write("partial")
+            raise ValueError("output failed")
+
+        sys.argv = [sys.argv[0], '--seed', '0',
+                    '--player_files_path', str(self.abs_input_dir),
+                    '--outputpath', self.output_tempdir.name]
+        with mock.patch.object(APQuestWorld, "generate_output", generate_output), \
+                self.assertRaisesRegex(ValueError, "output failed"):
+            Main.main(*Generate.main())
+        self.assertEqual(list(Path(self.output_tempdir.name).glob("*.zip")), [], "partial archive was not removed")
+
     def test_generate_yaml(self):
         # override host.yaml
         from settings import get_settings
@@ -108,6 +127,7 @@ class TestGenerateWeights(TestGenerateMain):
     # don't need to run these tests
     test_generate_absolute = None
     test_generate_relative = None
+    test_generate_output_exception = None
 
     def test_generate_yaml(self):
         from settings import get_settings
@@ -137,3 +157,119 @@ class TestGenerateWeights(TestGenerateMain):
                     result, getattr(namespace, option_name)[player].value,
                     "Generated results from weights file did not match expected value."
                 )
+
+
+class TestMoveToArchive(unittest.TestCase):
+    """Tests moving finished output files into the archive."""
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory(prefix="AP_archive_")
+        self.output_directory = os.path.join(self.tempdir.name, "1")
+        os.mkdir(self.output_directory)
+        self.zip_path = os.path.join(self.tempdir.name, "AP_test.zip")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write(self, name: str, data: bytes) -> None:
+        with open(os.path.join(self.output_directory, name), "wb") as f:
+            f.write(data)
+
+    def test_move_to_archive(self):
+        self.write("AP_test_P1.txt", b"text" * 100)
+        self.write("AP_test.archipelago", b"multidata")
+        with zipfile.ZipFile(os.path.join(self.output_directory, "mod.zip"), "w") as nested:
+            nested.writestr("mod.txt", "mod")
+
+        with zipfile.ZipFile(self.zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            Main._move_to_archive(zf, self.output_directory)
+        self.assertFalse(os.path.exists(self.output_directory), "output directory was not removed")
+
+        with zipfile.ZipFile(self.zip_path) as zf:
+            self.assertEqual(zf.read("AP_test_P1.txt"), b"text" * 100)
+            self.assertEqual(zf.read("AP_test.archipelago"), b"multidata")
+            self.assertEqual(zf.getinfo("AP_test_P1.txt").compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(zf.getinfo("AP_test.archipelago").compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zf.getinfo("mod.zip").compress_type, zipfile.ZIP_STORED)
+            with zipfile.ZipFile(zf.open("mod.zip")) as nested:
+                self.assertEqual(nested.read("mod.txt"), b"mod")
+
+
+@unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "output worker processes are forked")
+class TestGenerateOutputProcesses(TestGenerateMain):
+    """Tests generating the output of a world in a worker process."""
+
+    # don't need to run these tests
+    test_paths = None
+    test_generate_absolute = None
+    test_generate_relative = None
+    test_generate_output_exception = None
+    test_generate_yaml = None
+
+    def generate(self, generate_output) -> None:
+        from settings import get_settings
+        from worlds.apquest.world import APQuestWorld
+        sys.argv = [sys.argv[0], '--seed', '0',
+                    '--player_files_path', str(self.abs_input_dir),
+                    '--outputpath', self.output_tempdir.name]
+        # the weights test leaves its player count in the settings
+        with mock.patch.object(get_settings().generator, "players", 0), \
+                mock.patch.object(get_settings().generator, "output_processes", 1), \
+                mock.patch.object(APQuestWorld, "output_in_process", True), \
+                mock.patch.object(APQuestWorld, "generate_output", generate_output):
+            Main.main(*Generate.main())
+
+    def test_output_in_process(self):
+        from Profiler import GenerationProfile
+
+        def generate_output(world, output_directory: str) -> None:
+            with open(os.path.join(output_directory, f"P{world.player}_pid.txt"), "w") as f:
+                f.write(str(os.getpid()))
+
+        profile = GenerationProfile()
+        with profile.enable():
+            self.generate(generate_output)
+
+        self.assertOutput(self.output_tempdir.name)
+        zip_path, = Path(self.output_tempdir.name).glob("*.zip")
+        with zipfile.ZipFile(zip_path) as zf:
+            self.assertNotEqual(zf.read("P1_pid.txt").decode(), str(os.getpid()))
+        self.assertEqual(profile.players[1]["generate_output"].calls, 1, "worker calls should be profiled")
+
+    def test_output_process_exception(self):
+        def generate_output(world, output_directory: str) -> None:
+            raise ValueError("output failed")
+
+        with self.assertRaisesRegex(ValueError, "output failed"):
+            self.generate(generate_output)
+        self.assertEqual(list(Path(self.output_tempdir.name).glob("*.zip")), [], "partial archive was not removed")
+
+
+@unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "generate_early worker processes are forked")
+class TestGenerateEarlyProcesses(unittest.TestCase):
+    """Tests setting up worlds in worker processes."""
+
+    def test_generate_early_in_process(self):
+        from Profiler import GenerationProfile
+        from settings import get_settings
+        from test.general import setup_multiworld
+        from worlds.AutoWorld import AutoWorldRegister
+
+        world_types = [AutoWorldRegister.world_types[game] for game in ("Yacht Dice", "APQuest", "Yacht Dice")]
+        expected = setup_multiworld(world_types, ("generate_early",), seed=0)
+        multiworld = setup_multiworld(world_types, (), seed=0)
+        randoms = {player: world.random for player, world in multiworld.worlds.items()}
+        profile = GenerationProfile()
+        with mock.patch.object(get_settings().generator, "generate_early_processes", 2), profile.enable():
+            Main._generate_early(multiworld)
+
+        for player in (1, 3):
+            world, expected_world = multiworld.worlds[player], expected.worlds[player]
+            self.assertIs(world.random, randoms[player], "the multiworld should keep its reference to the random")
+            self.assertEqual(world.random.getstate(), expected_world.random.getstate())
+            self.assertEqual(world.itempool, expected_world.itempool)
+            for option_name in world.options_dataclass.type_hints:
+                self.assertEqual(getattr(world.options, option_name).value,
+                                 getattr(expected_world.options, option_name).value)
+            self.assertIs(world.multiworld, multiworld)
+            self.assertEqual(profile.players[player]["generate_early"].calls, 1, "worker calls should be profiled")
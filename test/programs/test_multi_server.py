@@ -1,5 +1,18 @@
+import asyncio
 import unittest
-from MultiServer import Context, ServerCommandProcessor
+from collections.abc import Iterable
+from typing import Any
+from typing_extensions import override
+from unittest import mock
+from MultiServer import Client, Context, ServerCommandProcessor, register_location_checks, send_items_to, send_new_items
+from NetUtils import (GamesPackage, Hint, HintStatus, LocationStore, NetworkItem, NetworkSlot, SlotType, decode,
+                      get_sphere_index)
+
+
+def make_context() -> Context:
+    """Creates a server context without loading the data packages of the installed worlds."""
+    with mock.patch.object(Context, "_load_game_data"):
+        return Context("", 0, "", "", 0, 0, False)
 
 
 class TestResolvePlayerName(unittest.TestCase):
@@ -38,3 +51,282 @@ class TestResolvePlayerName(unittest.TestCase):
         assert p.resolve_player("ABC") == (1, 2, "abc"), "case insensitive resolves when 1 match"
         assert p.resolve_player("abcd") == (1, 3, "abCD"), "case insensitive resolves when 1 match"
         assert not p.resolve_player("aB"), "partial name shouldn't resolve to player"
+
+
+class TestSendNewItems(unittest.TestCase):
+    def test_coalesced(self) -> None:
+        ctx = make_context()
+        broadcasts: list[tuple[list[Client], list[dict[str, Any]]]] = []
+
+        def broadcast(endpoints: Iterable[Client], msgs: list[dict[str, Any]]) -> None:
+            broadcasts.append((list(endpoints), msgs))
+
+        ctx.broadcast = broadcast
+        clients = [Client(mock.MagicMock(), ctx) for _ in range(3)]
+        clients[2].no_items = True
+        ctx.clients = {0: {1: clients, 2: []}}
+
+        async def check_locations() -> None:
+            send_items_to(ctx, 0, 1, NetworkItem(10, 100, 2, 0))
+            send_new_items(ctx)
+            send_items_to(ctx, 0, 1, NetworkItem(11, 101, 2, 0))
+            send_new_items(ctx)
+            self.assertFalse(broadcasts, "items should be sent in the next event loop iteration")
+            await asyncio.sleep(0)
+
+        asyncio.run(check_locations())
+        self.assertEqual(len(broadcasts), 1, "both items should be sent in one message")
+        endpoints, msgs = broadcasts[0]
+        self.assertEqual(endpoints, clients[:2])
+        self.assertEqual(msgs, [{"cmd": "ReceivedItems", "index": 0,
+                                 "items": [NetworkItem(10, 100, 2, 0), NetworkItem(11, 101, 2, 0)]}])
+        self.assertEqual([client.send_index for client in clients], [2, 2, 0])
+
+        send_new_items(ctx)
+        self.assertEqual(len(broadcasts), 1, "slots without new items should not be sent anything")
+
+
+class TestHintIndex(unittest.TestCase):
+    def test_recheck_location_hints(self) -> None:
+        ctx = make_context()
+        hint = Hint(2, 1, 100, 10, False)
+        other_hint = Hint(1, 2, 200, 20, False)
+        ctx.hints[0, 1] |= {hint, other_hint}
+        ctx.hints[0, 2] |= {hint, other_hint}
+        ctx.index_hints()
+        self.assertIs(ctx.get_hint(0, 1, 100), hint)
+        self.assertIsNone(ctx.get_hint(0, 2, 100), "hints should only be found for the finding player")
+
+        ctx.location_checks[0, 1] |= {100}
+        changed: set[tuple[int, int]] = set()
+        ctx.recheck_location_hints(0, 1, [100], changed)
+        found_hint = hint._replace(found=True, status=HintStatus.HINT_FOUND)
+        self.assertEqual(changed, {(0, 1), (0, 2)})
+        self.assertEqual(ctx.get_hint(0, 1, 100), found_hint)
+        self.assertEqual(ctx.hints[0, 1], {found_hint, other_hint})
+        self.assertEqual(ctx.hints[0, 2], {found_hint, other_hint})
+
+    def test_hints_on_same_location(self) -> None:
+        ctx = make_context()
+        hint = Hint(2, 1, 100, 10, False)
+        entrance_hint = Hint(2, 1, 100, 10, False, "Entrance")
+        ctx.hints[0, 1] |= {hint, entrance_hint}
+        ctx.hints[0, 2] |= {hint, entrance_hint}
+        ctx.index_hints()
+        self.assertEqual(ctx.hints_by_location[0, 1, 100], {hint, entrance_hint})
+        self.assertIn(ctx.get_hint(0, 1, 100), {hint, entrance_hint})
+
+        ctx.location_checks[0, 1] |= {100}
+        ctx.recheck_location_hints(0, 1, [100])
+        found_hints = {hint._replace(found=True, status=HintStatus.HINT_FOUND),
+                       entrance_hint._replace(found=True, status=HintStatus.HINT_FOUND)}
+        self.assertEqual(ctx.hints_by_location[0, 1, 100], found_hints, "every hint of the location should be found")
+        self.assertEqual(ctx.hints[0, 1], found_hints)
+        self.assertEqual(ctx.hints[0, 2], found_hints)
+
+
+class TestNewChecks(unittest.TestCase):
+    def test_batched_checks(self) -> None:
+        ctx = make_context()
+        ctx.slot_info = {1: NetworkSlot("A", "Game", SlotType.player), 2: NetworkSlot("B", "Game", SlotType.player)}
+        ctx.player_names = {(0, 1): "A", (0, 2): "B"}
+        ctx.clients = {0: {1: [], 2: []}}
+        ctx.locations = LocationStore({1: {100: (10, 2, 0), 101: (11, 2, 0)}, 2: {200: (20, 1, 0)}})
+        hint = Hint(2, 1, 101, 11, False)
+        ctx.hints[0, 1] |= {hint}
+        ctx.hints[0, 2] |= {hint}
+        ctx.index_hints()
+
+        async def check() -> None:
+            with mock.patch.object(ctx, "broadcast") as broadcast, mock.patch.object(ctx, "save") as save:
+                register_location_checks(ctx, 0, 1, [100])
+                register_location_checks(ctx, 0, 1, [101])
+                register_location_checks(ctx, 0, 2, [200])
+                self.assertEqual(ctx.location_checks[0, 1], {100, 101}, "checks should be registered immediately")
+                self.assertFalse(save.called)
+                await asyncio.sleep(0)
+                room_updates = {tuple(sorted(call.args[1][0]["checked_locations"]))
+                                for call in broadcast.call_args_list if call.args[1][0]["cmd"] == "RoomUpdate"}
+                self.assertEqual(room_updates, {(100, 101), (200,)})
+                save.assert_called_once()
+                found_hint: Hint | None = ctx.get_hint(0, 1, 101)
+                assert found_hint is not None
+                self.assertTrue(found_hint.found)
+
+        asyncio.run(check())
+
+
+class TestSphereIndex(unittest.TestCase):
+    def test_spheres(self) -> None:
+        ctx = make_context()
+        self.assertEqual(ctx.get_sphere(1, 100), -1)
+        self.assertEqual(ctx.get_remaining_spheres(0, 1), {})
+
+        ctx.spheres = [{1: {100}, 2: {200}}, {1: {101, 102}}]
+        ctx.sphere_index = get_sphere_index(ctx.spheres)
+        ctx.locations = LocationStore({1: {100: (1, 2, 0), 101: (2, 2, 0), 102: (3, 2, 0), 103: (4, 2, 0)},
+                                       2: {200: (5, 1, 0)}})
+        self.assertEqual(ctx.get_sphere(1, 101), 1)
+        self.assertEqual(ctx.get_sphere(2, 200), 0)
+        with self.assertRaises(KeyError):
+            ctx.get_sphere(2, 100)
+
+        ctx.location_checks[0, 1] |= {101}
+        self.assertEqual(ctx.get_remaining_spheres(0, 1), {0: 1, 1: 1},
+                         "checked and sphereless locations should not be counted")
+
+
+class TestRouting(unittest.TestCase):
+    @override
+    def setUp(self) -> None:
+        self.ctx = make_context()
+        self.ctx.games = {1: "Game A", 2: "Game B", 3: "Game A"}
+        self.ctx.game_slots = {"Game A": {1, 3}, "Game B": {2}}
+        self.ctx.clients = {0: {1: [], 2: [], 3: []}, 1: {1: []}}
+        self.ctx.player_names = {(team, slot): f"Player{slot}" for team, slots in self.ctx.clients.items()
+                                 for slot in slots}
+
+    def connect(self, team: int, slot: int, tags: list[str]) -> Client:
+        client = Client(mock.MagicMock(), self.ctx)
+        client.team, client.slot, client.auth = team, slot, True
+        self.ctx.clients[team][slot].append(client)
+        self.ctx.set_client_tags(client, tags)
+        return client
+
+    def test_bounce_targets(self) -> None:
+        a, b, c = self.connect(0, 1, ["DeathLink"]), self.connect(0, 2, []), self.connect(0, 3, [])
+        other_team = self.connect(1, 1, ["DeathLink"])
+        self.assertEqual(self.ctx.get_bounce_targets(0, [], ["DeathLink"], []), {a})
+        self.assertEqual(self.ctx.get_bounce_targets(0, ["Game A"], [], [2]), {a, b, c})
+        self.assertEqual(self.ctx.get_bounce_targets(1, ["Game A"], [], []), {other_team})
+
+        self.ctx.set_client_tags(a, ["AP"])
+        self.ctx.set_client_tags(b, ["DeathLink"])
+        self.assertEqual(self.ctx.get_bounce_targets(0, [], ["DeathLink"], []), {b})
+        asyncio.run(self.ctx.disconnect(b))
+        self.assertEqual(self.ctx.get_bounce_targets(0, [], ["DeathLink"], []), set())
+
+    def test_notification_prefix(self) -> None:
+        exact, prefixed = self.connect(0, 1, []), self.connect(0, 2, [])
+        self.ctx.add_notification_client("GameA_1", exact)
+        self.ctx.add_notification_client("GameA_*", prefixed)
+        self.assertEqual(self.ctx.get_notification_clients("GameA_1"), {exact, prefixed})
+        self.assertEqual(self.ctx.get_notification_clients("GameA_2"), {prefixed})
+        self.assertEqual(self.ctx.get_notification_clients("GameA"), set())
+
+
+class TestEncodedDataPackage(unittest.TestCase):
+    def test_encoded_data_package(self) -> None:
+        ctx = make_context()
+        games: dict[str, GamesPackage] = {
+            "Game \"A\"": {"item_name_to_id": {"Ä": 1}, "location_name_to_id": {}, "checksum": "test_a"},
+            "Game B": {"item_name_to_id": {}, "location_name_to_id": {"B": 2}},
+        }
+        ctx.gamespackage = games
+        msg = ctx.get_encoded_data_package(ctx.gamespackage)
+        self.assertEqual(msg, ctx.dumper([{"cmd": "DataPackage", "data": {"games": ctx.gamespackage}}]))
+        self.assertEqual(decode(msg)[0]["data"]["games"], ctx.gamespackage)
+        self.assertIs(ctx.get_encoded_game_package("Game \"A\""), ctx.get_encoded_game_package("Game \"A\""),
+                      "data packages with a checksum should be encoded once")
+
+
+class TestMetrics(unittest.TestCase):
+    def test_render(self) -> None:
+        from ServerMetrics import ServerMetrics
+        ctx = make_context()
+        metrics = ServerMetrics()
+        metrics.add_room('room "1"', ctx)
+        ctx.clients = {0: {1: [Client(mock.MagicMock(), ctx)]}}
+        assert ctx.metrics is not None
+        ctx.metrics.count_received("LocationChecks")
+        ctx.metrics.count_received("Arbitrary")
+        ctx.metrics.count_sent(ctx.encode_msgs([{"cmd": "RoomUpdate"}]), 2, ["RoomUpdate"])
+        ctx.recheck_hints()
+
+        lines = metrics.render().splitlines()
+        self.assertIn('archipelago_room_connected_clients{room="room \\"1\\""} 1', lines)
+        self.assertIn('archipelago_room_messages_received_total{room="room \\"1\\"",cmd="LocationChecks"} 1', lines)
+        self.assertIn('archipelago_room_messages_received_total{room="room \\"1\\"",cmd="unknown"} 1', lines)
+        self.assertIn('archipelago_room_messages_sent_total{room="room \\"1\\"",cmd="RoomUpdate"} 2', lines)
+        self.assertIn('archipelago_room_encode_seconds_count{room="room \\"1\\""} 1', lines)
+        self.assertIn('archipelago_room_hint_rechecks_total{room="room \\"1\\""} 1', lines)
+        self.assertIn("archipelago_rooms 1", lines)
+
+
+class TestJournalSave(unittest.TestCase):
+    def test_replay(self) -> None:
+        import os
+        import tempfile
+        with mock.patch.object(Context, "_start_async_saving"), tempfile.TemporaryDirectory() as temp_dir:
+            ctx = make_context()
+            ctx.save_filename = os.path.join(temp_dir, "test.apsave")
+            hint = Hint(1, 2, 100, 10, False)
+            ctx.hints[0, 1] |= {hint}
+            ctx.hints[0, 2] |= {hint}
+            ctx.index_hints()
+            ctx.init_save(journal=True)
+            snapshot = os.path.getmtime(ctx.save_filename), os.path.getsize(ctx.save_filename)
+
+            send_items_to(ctx, 0, 1, NetworkItem(10, 100, 2, 0))
+            ctx.location_checks[0, 2] |= {100}
+            ctx.recheck_location_hints(0, 2, [100])
+            self.assertEqual(ctx.changed_hint_keys, {(0, 1), (0, 2)})
+            ctx.stored_data["key"] = 1
+            ctx.changed_stored_data_keys.add("key")
+            self.assertTrue(ctx.save(now=True))
+            self.assertEqual(ctx.changed_hint_keys, set(), "only changed hints should be journaled")
+            send_items_to(ctx, 0, 1, NetworkItem(11, 101, 2, 0))
+            ctx.location_checks[0, 2] |= {101}
+            self.assertTrue(ctx.save(now=True))
+            self.assertEqual((os.path.getmtime(ctx.save_filename), os.path.getsize(ctx.save_filename)), snapshot,
+                             "changes should only be appended to the journal")
+            # an interrupted write of a record should be ignored
+            journal_filename = ctx.journal_filename
+            assert journal_filename is not None
+            incomplete_record: bytes = (1000).to_bytes(4, "little") + b"incomplete"
+            with open(journal_filename, "ab") as f:
+                f.write(incomplete_record)
+
+            loaded_ctx = make_context()
+            loaded_ctx.save_filename = ctx.save_filename
+            loaded_ctx.init_save(journal=True)
+            received_items: dict[tuple[int, int, bool], list[NetworkItem]] = loaded_ctx.received_items
+            self.assertEqual(received_items, ctx.received_items)
+            self.assertEqual(dict(loaded_ctx.location_checks), dict(ctx.location_checks))
+            self.assertEqual(loaded_ctx.stored_data, ctx.stored_data)
+            self.assertEqual(dict(loaded_ctx.hints), dict(ctx.hints))
+            self.assertTrue(all(hint.found for hint in loaded_ctx.hints[0, 1]))
+            self.assertGreater(loaded_ctx.save_revision, ctx.save_revision, "revisions should keep increasing")
+            self.assertEqual(os.path.getsize(journal_filename), 0, "loading should compact the journal")
+
+    def test_keep_unreadable_journal(self) -> None:
+        import os
+        import tempfile
+        import zlib
+        with mock.patch.object(Context, "_start_async_saving"), tempfile.TemporaryDirectory() as temp_dir:
+            ctx = make_context()
+            ctx.save_filename = os.path.join(temp_dir, "test.apsave")
+            ctx.init_save(journal=True)
+            send_items_to(ctx, 0, 1, NetworkItem(10, 100, 2, 0))
+            self.assertTrue(ctx.save(now=True))
+            journal_filename = ctx.journal_filename
+            assert journal_filename is not None
+            # a complete record that can't be decoded
+            corrupt_record = zlib.compress(b"corrupt")
+            with open(journal_filename, "ab") as f:
+                f.write(len(corrupt_record).to_bytes(4, "little") + corrupt_record)
+            with open(ctx.save_filename, "rb") as f:
+                save = f.read()
+            with open(journal_filename, "rb") as f:
+                journal = f.read()
+
+            loaded_ctx = make_context()
+            loaded_ctx.save_filename = ctx.save_filename
+            with self.assertLogs(loaded_ctx.logger, "ERROR"):
+                loaded_ctx.init_save(journal=True)
+            self.assertFalse(loaded_ctx.saving)
+            self.assertFalse(loaded_ctx.save(now=True))
+            with open(ctx.save_filename, "rb") as f:
+                self.assertEqual(f.read(), save, "the save should be kept")
+            with open(journal_filename, "rb") as f:
+                self.assertEqual(f.read(), journal, "the journal should be kept")
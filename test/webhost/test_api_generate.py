@@ -43,3 +43,42 @@ class TestAPIGenerate(TestBase):
         json_data = response.get_json()
         self.assertTrue(json_data["text"].startswith("Generation of seed "))
         self.assertTrue(json_data["text"].endswith(" started successfully."))
+
+    def test_status_queued(self) -> None:
+        """Queued generations report the queue, and their place in it once scheduled."""
+        from pony.orm import db_session
+        from WebHostLib.models import Generation
+
+        options = {
+            "Tester1":
+                {
+                    "game": "Archipelago",
+                    "name": "Tester",
+                    "Archipelago": {}
+                }
+        }
+        response = self.client.post(
+            "/api/generate",
+            data=json.dumps({"weights": options}),
+            content_type='application/json'
+        )
+        json_data = response.get_json()
+        generation_id = json_data["detail"]
+        status_url = json_data["wait_api_url"]
+
+        response = self.client.get(status_url)
+        self.assertEqual(response.status_code, 202)
+        json_data = response.get_json()
+        self.assertEqual(json_data["text"], "Generation running")
+        self.assertGreaterEqual(json_data["queue_length"], 1)
+        self.assertNotIn("queue_position", json_data)
+
+        with db_session:
+            generation = Generation.get(id=generation_id)
+            meta = json.loads(generation.meta)
+            meta["queue"] = {"position": 2, "expected_wait": 30}
+            generation.meta = json.dumps(meta)
+
+        json_data = self.client.get(status_url).get_json()
+        self.assertEqual(json_data["queue_position"], 2)
+        self.assertEqual(json_data["expected_wait"], 30)
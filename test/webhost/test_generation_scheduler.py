@@ -0,0 +1,85 @@
+import unittest
+from uuid import uuid4
+
+
+class TestGenerationScheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        from WebHostLib.scheduler import GenerationScheduler
+        self.scheduler = GenerationScheduler(2, 1)
+        self.owner = uuid4()
+
+    def add(self, players: int, owner=None, game: str = "Game"):
+        return self.scheduler.add(uuid4(), owner or self.owner, [game] * players)
+
+    def test_estimate(self) -> None:
+        """Generations are estimated by their players, per game."""
+        from WebHostLib.scheduler import GENERATION_OVERHEAD, PLAYER_TIME
+        job = self.scheduler.add(uuid4(), self.owner, ["Game", "Game", "Other Game"])
+        self.assertEqual(job.games, {"Game": 2, "Other Game": 1})
+        self.assertEqual(self.scheduler.estimate(job), GENERATION_OVERHEAD + 3 * PLAYER_TIME)
+        self.scheduler.timeout = 1
+        self.assertEqual(self.scheduler.estimate(job), 1)
+
+    def test_small_ahead_of_large(self) -> None:
+        """Large generations only get their share of the workers, small ones start ahead of queued large ones."""
+        large1 = self.add(100)
+        large2 = self.add(100)
+        small = self.add(1)
+        self.assertTrue(self.scheduler.is_large(large1))
+        self.assertFalse(self.scheduler.is_large(small))
+        self.assertEqual(self.scheduler.start_next(), small)
+        self.assertEqual(self.scheduler.start_next(), large1)
+        self.assertIsNone(self.scheduler.start_next())
+        self.scheduler.finish(small.id, False)
+        self.assertIsNone(self.scheduler.start_next())
+        self.scheduler.finish(large1.id, False)
+        self.assertEqual(self.scheduler.start_next(), large2)
+
+    def test_small_use_idle_large_workers(self) -> None:
+        """Small generations use the workers of large ones, while no large generation waits."""
+        small1 = self.add(1)
+        small2 = self.add(1)
+        self.assertEqual(self.scheduler.start_next(), small1)
+        self.assertEqual(self.scheduler.start_next(), small2)
+        large = self.add(100)
+        self.assertIsNone(self.scheduler.start_next())
+        self.add(1)
+        self.scheduler.finish(small1.id, False)
+        self.assertEqual(self.scheduler.start_next(), large)
+
+    def test_owners_take_turns(self) -> None:
+        """Owners with fewer running generations go first."""
+        busy_owner = uuid4()
+        self.scheduler.workers = 3
+        first = self.add(1, busy_owner)
+        second = self.add(1, busy_owner)
+        other = self.add(1)
+        self.assertEqual(self.scheduler.start_next(), first)
+        self.assertEqual(self.scheduler.start_next(), other)
+        self.assertEqual(self.scheduler.start_next(), second)
+
+    def test_refine(self) -> None:
+        """Durations of successful generations refine the estimates of their games."""
+        from WebHostLib.scheduler import PLAYER_TIME
+        job = self.add(10)
+        self.assertEqual(self.scheduler.start_next(), job)
+        self.scheduler.finish(job.id, True)  # finishing right away, much quicker than estimated
+        self.assertLess(self.scheduler.player_times["Game"], PLAYER_TIME)
+        failed = self.add(10, game="Other Game")
+        self.scheduler.start_next()
+        self.scheduler.finish(failed.id, False)
+        self.assertNotIn("Other Game", self.scheduler.player_times)
+
+    def test_queue_status(self) -> None:
+        """Queued generations get their position and expected wait by the estimates."""
+        running = [self.add(1), self.add(1)]
+        queued = [self.add(1), self.add(1)]
+        for job in running:
+            self.scheduler.start_next()
+        status = self.scheduler.get_queue_status()
+        self.assertEqual(status.keys(), {job.id for job in queued})
+        self.assertEqual(status[queued[0].id].position, 1)
+        self.assertEqual(status[queued[1].id].position, 2)
+        self.assertGreater(status[queued[0].id].expected_wait, 0)
+        self.assertLessEqual(status[queued[0].id].expected_wait, self.scheduler.estimate(running[0]))
+        self.assertAlmostEqual(status[queued[0].id].expected_wait, status[queued[1].id].expected_wait, places=3)
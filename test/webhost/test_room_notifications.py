@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+from uuid import uuid4
+
+from . import TestBase
+
+
+@unittest.skipIf(sys.platform == "win32", "notifications use unix sockets")
+class TestRoomNotifications(unittest.TestCase):
+    def test_notify(self) -> None:
+        """Verify that notified rooms are received, and that notifying without a listener is fine."""
+        from WebHostLib import notify
+
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                mock.patch.object(notify, "socket_path", os.path.join(temp_dir, "autohost.sock")):
+            room_ids = [uuid4(), uuid4()]
+            notify.notify_room(room_ids[0])
+            with notify.RoomNotifications() as notifications:
+                self.assertTrue(notifications.listening)
+                self.assertEqual(notifications.receive(0), set())
+                for room_id in room_ids:
+                    notify.notify_room(room_id)
+                self.assertEqual(notifications.receive(1), set(room_ids))
+            self.assertFalse(os.path.exists(notify.socket_path))
+
+
+class TestDBCommandListener(TestBase):
+    def test_deliver_commands(self) -> None:
+        """Verify that commands are delivered to the rooms they were sent to, in order, and only once."""
+        from pony.orm import db_session, select
+        from WebHostLib.customserver import DBCommandListener, DBCommandProcessor
+        from WebHostLib.models import Command, Room, Seed
+
+        with (Path(__file__).parent / "data" / "One_Archipelago.archipelago").open("rb") as f:
+            multidata = f.read()
+        with db_session:
+            seed = Seed(multidata=multidata, owner=uuid4())
+            room = Room(seed=seed, owner=seed.owner)
+            other_room = Room(seed=seed, owner=seed.owner)
+            Command(room=room, commandtext="/first")
+            Command(room=room, commandtext="/second")
+            Command(room=other_room, commandtext="/other")
+            seed_id, room_id, other_room_id = seed.id, room.id, other_room.id
+
+        ctx = mock.Mock(room_id=room_id)
+        listener = DBCommandListener()
+        listener.add_room(ctx)
+        self.assertEqual(listener.rooms_with_commands.get_nowait(), room_id)
+        listener.deliver_commands({room_id, other_room_id})
+        listener.deliver_commands({room_id})
+        calls = ctx.main_loop.call_soon_threadsafe.call_args_list
+        self.assertEqual([call.args[1] for call in calls], ["/first", "/second"])
+        self.assertIsInstance(calls[0].args[0], DBCommandProcessor)
+        with db_session:
+            self.assertEqual([command.commandtext for command in select(command for command in Command)
+                              if command.room.id in (room_id, other_room_id)], ["/other"])
+            Room[room_id].delete()
+            Room[other_room_id].delete()
+            Seed[seed_id].delete()
+
+    def test_listener_survives_errors(self) -> None:
+        """Verify that the listener keeps delivering commands after delivering them failed."""
+        from WebHostLib.customserver import DBCommandListener
+
+        failed = threading.Event()
+        delivered = threading.Event()
+
+        def deliver_commands(room_ids: set) -> None:
+            if not failed.is_set():
+                failed.set()
+                raise Exception("database is down")
+            delivered.set()
+
+        listener = DBCommandListener()
+        with mock.patch.object(listener, "deliver_commands", deliver_commands), self.assertLogs(level="ERROR"):
+            listener.start()
+            listener.rooms_with_commands.put(uuid4())
+            self.assertTrue(failed.wait(10))
+            listener.rooms_with_commands.put(uuid4())
+            self.assertTrue(delivered.wait(10))
+        self.assertTrue(listener.is_alive())
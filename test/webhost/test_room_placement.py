@@ -0,0 +1,82 @@
+import datetime
+import queue
+import unittest
+from unittest import mock
+from uuid import uuid4
+
+
+class TestRoomPlacement(unittest.TestCase):
+    def get_hoster(self, id: int):
+        from WebHostLib.autolauncher import MultiworldInstance
+        hoster = MultiworldInstance({"PONY": {}, "SELFLAUNCHCERT": None, "SELFLAUNCHKEY": None,
+                                     "HOST_ADDRESS": "", "METRICS_PORT": 0}, id)
+        # the hosting processes are not started, so the queues don't have to be shared with them
+        hoster.rooms_to_start = queue.Queue()
+        hoster.rooms_shutting_down = queue.Queue()
+        hoster.status = queue.Queue()
+        return hoster
+
+    def test_least_memory(self) -> None:
+        """Verify that rooms are placed by the reported memory of hosters and the estimated memory of new rooms."""
+        from WebHostLib.autolauncher import MultiworldInstance, get_hosting
+
+        hosters = [self.get_hoster(0), self.get_hoster(1)]
+        hosters[0].status.put((100, []))
+        hosters[1].status.put((50, []))
+        for hoster in hosters:
+            hoster.update()
+        big_room, small_room = uuid4(), uuid4()
+        min(hosters, key=MultiworldInstance.get_estimated_memory).start_room(big_room, 100)
+        self.assertIs(get_hosting(hosters, big_room), hosters[1])
+        min(hosters, key=MultiworldInstance.get_estimated_memory).start_room(small_room, 10)
+        self.assertIs(get_hosting(hosters, small_room), hosters[0])
+        self.assertEqual(hosters[1].get_estimated_memory(), 150)
+
+        # once the reported memory includes a room, its estimate is dropped
+        hosters[1].status.put((80, [big_room]))
+        hosters[1].rooms_shutting_down.put(big_room)
+        hosters[1].update()
+        self.assertEqual(hosters[1].get_estimated_memory(), 80)
+        self.assertIsNone(get_hosting(hosters, big_room))
+
+    def test_unload_idle_room(self) -> None:
+        """Verify that the least recently active room without connections is unloaded."""
+        from WebHostLib.customserver import unload_idle_room
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        started = now - datetime.timedelta(days=1)
+
+        def get_room(endpoints: list, last_activity: datetime.datetime, start_time: datetime.datetime = started):
+            ctx = mock.Mock(endpoints=endpoints, client_activity_timers={(0, 1): last_activity}, start_time=start_time)
+            ctx.exit_event.is_set.return_value = False
+            return ctx
+
+        connected = get_room([object()], now - datetime.timedelta(hours=2))
+        recent = get_room([], now)
+        old = get_room([], now - datetime.timedelta(hours=1))
+        self.assertIs(unload_idle_room([connected, recent, old]), old)
+        old.exit_event.set.assert_called_once()
+        old.server.ws_server.close.assert_called_once()
+        recent.exit_event.set.assert_not_called()
+        self.assertIsNone(unload_idle_room([connected]))
+
+    def test_unload_idle_room_recently_started(self) -> None:
+        """Verify that rooms are not unloaded right after starting, and that starting counts as activity."""
+        from WebHostLib.customserver import unload_idle_room
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+        def get_room(start_time: datetime.datetime):
+            # activity saved by a previous run of the room
+            ctx = mock.Mock(endpoints=[], client_activity_timers={(0, 1): now - datetime.timedelta(days=2)},
+                            start_time=start_time)
+            ctx.exit_event.is_set.return_value = False
+            return ctx
+
+        fresh = get_room(now)
+        self.assertIsNone(unload_idle_room([fresh]))
+        fresh.exit_event.set.assert_not_called()
+        restarted = get_room(now - datetime.timedelta(hours=1))
+        started_earlier = get_room(now - datetime.timedelta(hours=2))
+        self.assertIs(unload_idle_room([fresh, restarted, started_earlier]), started_earlier)
+        restarted.exit_event.set.assert_not_called()
@@ -0,0 +1,57 @@
+import logging
+import unittest
+
+
+class TestStaticGameNames(unittest.IsolatedAsyncioTestCase):
+    static_server_data = {
+        "non_hintable_names": {},
+        "gamespackage": {
+            "Archipelago": {"item_name_to_id": {"Nothing": -1}, "location_name_to_id": {"Cheat Console": -1},
+                            "checksum": "ap"},
+            "Game": {"item_name_to_id": {"Item": 1}, "location_name_to_id": {"Location": 2}, "checksum": "game"},
+        },
+        "item_name_groups": {"Archipelago": {}, "Game": {"Group": {"Item"}}},
+        "location_name_groups": {"Archipelago": {}, "Game": {}},
+    }
+
+    def setUp(self) -> None:
+        from WebHostLib import customserver
+        customserver.static_game_names.clear()
+
+    def tearDown(self) -> None:
+        from WebHostLib import customserver
+        customserver.static_game_names.clear()
+
+    def get_context(self):
+        from WebHostLib.customserver import WebHostContext
+        ctx = WebHostContext(self.static_server_data, logging.getLogger("TestStaticGameNames"))
+        ctx.gamespackage = dict(ctx.gamespackage)
+        return ctx
+
+    async def test_shared_between_rooms(self) -> None:
+        """Rooms using the static data packages share their name tables, without adding unknown ids to them."""
+        ctx1 = self.get_context()
+        ctx2 = self.get_context()
+        ctx1._init_game_data()
+        ctx2._init_game_data()
+        self.assertIs(ctx1.item_names["Game"], ctx2.item_names["Game"])
+        self.assertIs(ctx1.all_item_and_group_names["Game"], ctx2.all_item_and_group_names["Game"])
+        self.assertEqual(ctx1.item_names["Game"][1], "Item")
+        self.assertEqual(ctx1.item_names["Game"][-1], "Nothing")
+        self.assertEqual(ctx1.location_names["Game"][-1], "Cheat Console")
+        self.assertEqual(ctx1.all_item_and_group_names["Game"], {"Item", "Group"})
+        self.assertEqual(ctx1.checksums["Game"], "game")
+        self.assertEqual(ctx1.item_names["Game"][3], "Unknown item (ID:3)")
+        self.assertNotIn(3, ctx2.item_names["Game"])
+
+    async def test_custom_data_package(self) -> None:
+        """Custom data packages get name tables of their own."""
+        from WebHostLib.customserver import static_game_names
+        ctx = self.get_context()
+        ctx.gamespackage["Game"] = {"item_name_to_id": {"Custom Item": 1}, "location_name_to_id": {},
+                                    "checksum": "custom"}
+        ctx._init_game_data()
+        self.assertEqual(ctx.item_names["Game"][1], "Custom Item")
+        self.assertEqual(ctx.item_names["Game"][-1], "Nothing")
+        self.assertEqual(ctx.checksums["Game"], "custom")
+        self.assertNotIn("Game", static_game_names)
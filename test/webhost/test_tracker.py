@@ -2,6 +2,7 @@ import os
 import pickle
 from pathlib import Path
 from typing import ClassVar
+from unittest import mock
 from uuid import UUID, uuid4
 
 from flask import url_for
@@ -103,3 +104,77 @@ class TestTracker(TestBase):
                 self.assertEqual(response.status_code, 200)
             with self.client.open(url_for("api.tracker_slot_data", tracker=self.tracker_uuid)) as response:
                 self.assertEqual(response.status_code, 200)
+
+    def test_tracker_data_cache(self) -> None:
+        """Verify that decoded room data is reused until the room saves."""
+        from pony.orm import db_session
+        from WebHostLib.models import Room
+        from WebHostLib.tracker import TrackerData
+
+        with db_session:
+            room = Room.get(id=self.room_id)
+            room.multisave = pickle.dumps({"location_checks": {(0, 1): set()}})
+            first = TrackerData(room)
+            second = TrackerData(room)
+            self.assertIs(first._multidata, second._multidata)
+            self.assertIs(first._multisave, second._multisave)
+            self.assertIs(first.item_id_to_name["Archipelago"], second.item_id_to_name["Archipelago"])
+            self.assertEqual(first.get_player_checked_locations(0, 1), set())
+
+            room.multisave = pickle.dumps({"location_checks": {(0, 1): {-1}}})
+            third = TrackerData(room)
+            self.assertIs(first._multidata, third._multidata)
+            self.assertEqual(third.get_player_checked_locations(0, 1), {-1})
+
+    def test_tracker_seed_cache_limit(self) -> None:
+        """Verify that multidata larger than the configured cache size is decoded again for each request."""
+        from pony.orm import db_session
+        from WebHostLib.models import Room
+        from WebHostLib.tracker import TrackerData
+
+        with db_session, mock.patch.dict(self.app.config, {"TRACKER_SEED_CACHE_BYTES": len(self.data) - 1}):
+            room = Room.get(id=self.room_id)
+            first = TrackerData(room)
+            second = TrackerData(room)
+            self.assertIsNot(first._multidata, second._multidata)
+
+    def test_tracker_api_revisions(self) -> None:
+        """Verify that the tracker api answers conditional requests and reports changes since a revision."""
+        from pony.orm import db_session
+        from NetUtils import NetworkItem
+        from WebHostLib.models import Room
+        from WebHostLib.tracker import TrackerData
+
+        def save(revision: int, items: list, checks: set) -> None:
+            with db_session:
+                Room.get(id=self.room_id).multisave = pickle.dumps({
+                    "revision": revision,
+                    "received_items": {(0, 1, True): items},
+                    "location_checks": {(0, 1): checks},
+                    "client_game_state": {(0, 1): 10 if revision > 1 else 0},
+                })
+
+        first_item = NetworkItem(1, -1, 0, 0)
+        second_item = NetworkItem(2, -2, 0, 0)
+        save(1, [first_item], {-1})
+        # the only slot of the test seed is a spectator
+        with self.app.test_request_context(), \
+                mock.patch.object(TrackerData, "get_all_players", lambda tracker_data: {0: [1]}):
+            url = url_for("api.tracker_data", tracker=self.tracker_uuid)
+            response = self.client.get(url, query_string={"since": 0})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json["revision"], 1)
+            self.assertNotIn("since", response.json, "unknown revisions should get all tracking data")
+            etag, _ = response.get_etag()
+            response = self.client.get(url, query_string={"since": 1}, headers={"If-None-Match": f'"{etag}"'})
+            self.assertEqual(response.status_code, 304)
+
+            save(2, [first_item, second_item], {-1, -2})
+            response = self.client.get(url, query_string={"since": 1})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json["revision"], 2)
+            self.assertEqual(response.json["since"], 1)
+            self.assertEqual(response.json["player_items_received"],
+                             [{"team": 0, "player": 1, "index": 1, "items": [list(second_item)]}])
+            self.assertEqual(response.json["player_checks_done"], [{"team": 0, "player": 1, "locations": [-2]}])
+            self.assertEqual(response.json["player_status"], [{"team": 0, "player": 1, "status": 10}])
@@ -12,6 +12,7 @@ from typing import (Any, Callable, ClassVar, Dict, FrozenSet, Iterable, List, Ma
 
 from Options import item_and_loc_options, ItemsAccessibility, OptionGroup, PerGameCommonOptions
 from BaseClasses import CollectionState
+from Profiler import profile_call, profile_stage
 from Utils import Version
 
 if TYPE_CHECKING:
@@ -175,7 +176,8 @@ def _timed_call(method: Callable[..., Any], *args: Any,
 def call_single(multiworld: "MultiWorld", method_name: str, player: int, *args: Any) -> Any:
     method = getattr(multiworld.worlds[player], method_name)
     try:
-        ret = _timed_call(method, *args, multiworld=multiworld, player=player)
+        with profile_call(multiworld.worlds[player].game, method_name, player):
+            ret = _timed_call(method, *args, multiworld=multiworld, player=player)
     except Exception as e:
         message = f"Exception in {method} for player {player}, named {multiworld.player_name[player]}."
         if sys.version_info >= (3, 11, 0):
@@ -188,20 +190,22 @@ def call_single(multiworld: "MultiWorld", method_name: str, player: int, *args:
 
 
 def call_all(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
-    world_types: Set[AutoWorldRegister] = set()
-    for player in multiworld.player_ids:
-        prev_item_count = len(multiworld.itempool)
-        world_types.add(multiworld.worlds[player].__class__)
-        call_single(multiworld, method_name, player, *args)
-        if __debug__:
-            new_items = multiworld.itempool[prev_item_count:]
-            for i, item in enumerate(new_items):
-                for other in new_items[i+1:]:
-                    assert item is not other, (
+    with profile_stage(method_name):
+        world_types: Set[AutoWorldRegister] = set()
+        for player in multiworld.player_ids:
+            prev_item_count = len(multiworld.itempool)
+            world_types.add(multiworld.worlds[player].__class__)
+            call_single(multiworld, method_name, player, *args)
+            if __debug__:
+                new_items = multiworld.itempool[prev_item_count:]
+                seen_items: Set[int] = set()
+                for item in new_items:
+                    assert id(item) not in seen_items, (
                         f"Duplicate item reference of \"{item.name}\" in \"{multiworld.worlds[player].game}\" "
                         f"of player \"{multiworld.player_name[player]}\". Please make a copy instead.")
+                    seen_items.add(id(item))
 
-    call_stage(multiworld, method_name, *args)
+        call_stage(multiworld, method_name, *args)
 
 
 def call_stage(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
@@ -209,7 +213,8 @@ def call_stage(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
     for world_type in sorted(world_types, key=lambda world: world.__name__):
         stage_callable = getattr(world_type, f"stage_{method_name}", None)
         if stage_callable:
-            _timed_call(stage_callable, multiworld, *args)
+            with profile_call(world_type.game, f"stage_{method_name}"):
+                _timed_call(stage_callable, multiworld, *args)
 
 
 class WebWorld(metaclass=WebWorldRegister):
@@ -314,6 +319,21 @@ class World(metaclass=AutoWorldRegister):
     If False, everything is rechecked at every step, which is slower computationally, 
     but may be desirable in complex/dynamic worlds."""
 
+    incremental_reachability: bool = False
+    """If True, after items are collected only blocked entrances whose access rule looked up one of the changed items
+    by name are checked again, instead of all blocked entrances. This requires explicit_indirect_conditions and entrance
+    access rules that only depend on state.prog_items and on regions registered as indirect conditions."""
+
+    generate_early_in_process: bool = False
+    """If True, generate_early may run in a forked worker process, while the other worlds are set up. Afterwards the
+    attributes of the world are pickled and copied back, so they have to be picklable and not be referred to from
+    anywhere else. It must only change the world itself and its options, not the multiworld or other worlds."""
+
+    output_in_process: bool = False
+    """If True, generate_output may run in a forked worker process. Changes it makes to the world or multiworld are not
+    seen by the generating process, so it must only write its output files and not hand data to later steps, such as
+    fill_slot_data or modify_multidata, or wait on anything set by them."""
+
     multiworld: "MultiWorld"
     """autoset on creation. The MultiWorld object for the currently generating multiworld."""
     player: int
@@ -87,6 +87,7 @@ class Factorio(World):
     tech_mix: int = 0
     skip_silo: bool = False
     origin_region_name = "Nauvis"
+    output_in_process = True
     science_locations: typing.List[FactorioScienceLocation]
     removed_technologies: typing.Set[str]
     settings: typing.ClassVar[FactorioSettings]
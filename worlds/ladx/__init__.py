@@ -140,6 +140,8 @@ class LinksAwakeningWorld(World):
     options: LinksAwakeningOptions
     settings: typing.ClassVar[LinksAwakeningSettings]
     topology_present = True  # show path to required location checks in spoiler
+    # entrance rules only look up items by name, through state.has and the LADXR inventory adapter
+    incremental_reachability = True
 
     # ID of first item and location, could be hard-coded but code may be easier
     # to read with this as a propery.
@@ -58,6 +58,9 @@ class YachtDiceWorld(World):
 
     ap_world_version = "2.1.4"
 
+    # generate_early only builds the item pool of this world, using its own random
+    generate_early_in_process = True
+
     def _get_yachtdice_data(self):
         return {
             # "world_seed": self.multiworld.per_slot_randoms[self.player].getrandbits(32),